@@ -22,6 +22,7 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         extmodels.create_query_model(self.get_models())
+        from . import signals
 
     def run_cron(self):
         from .utils import cron
@@ -0,0 +1,38 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from ..utils.cache import LocalCache, user_tag
+from .. import models
+import copy
+
+# Users are loaded together with their person profile and kept in process
+# memory until invalidated by signals.user_changed()
+_local_users = LocalCache(settings.USER_LOCAL_CACHE_SIZE)
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user, version = _local_users.get(user_id, user_tag(user_id))
+        if user is None:
+            qs = models.User.objects.select_related('person')
+            user = qs.filter(models.User.query_model.pk == user_id).first()
+            if user is None:
+                return None
+            _local_users.set(user_id, version, user)
+        # Each request gets its own copy
+        user = copy.deepcopy(user)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,365 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+import atexit
+import logging
+import os
+import threading
+import time
+
+# PostgreSQL backend which keeps a bounded pool of open connections in each
+# process. Django still opens and closes the connection around each request
+# (CONN_MAX_AGE must stay 0), closing merely returns it to the pool.
+#
+# Options in DATABASES[alias]['OPTIONS']:
+# pool_size: maximum number of open connections per process
+# pool_timeout: seconds to wait for a free connection before failing
+# pool_max_age: seconds after which a connection gets replaced
+# pool_check_idle: connections idle longer than this many seconds get
+#     checked with a test query before reuse
+# pool_stats_interval: seconds between statistics log messages, 0 disables
+#
+# Each alias gets a separate pool for each set of connection parameters
+# so that changing settings_dict (e.g. NAME when the test database gets
+# created) never hands out connections to the old database.
+
+Database = base.Database
+logger = logging.getLogger('sciswarm.db')
+
+POOL_DEFAULTS = dict(pool_size=10, pool_timeout=10, pool_max_age=3600,
+    pool_check_idle=30, pool_stats_interval=300)
+
+_pools = dict()
+_pools_lock = threading.Lock()
+# Pools inherited from the parent process. Connections in them must not
+# be closed or garbage collected by the child, it would disconnect
+# the parent as well.
+_inherited_pools = []
+
+class ConnectionPool(object):
+    def __init__(self, alias, database, pool_size, pool_timeout, pool_max_age,
+        pool_check_idle, pool_stats_interval):
+        self.alias = alias
+        self.database = database
+        self.pid = os.getpid()
+        self.size = pool_size
+        self.timeout = pool_timeout
+        self.max_age = pool_max_age
+        self.check_idle = pool_check_idle
+        self.stats_interval = pool_stats_interval
+        self._cond = threading.Condition()
+        # Idle connections as (connection, time of return), LIFO order
+        self._idle = []
+        # Connection creation time and default isolation level
+        self._info = dict()
+        self._open = 0
+        self._last_log = time.monotonic()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.expired = 0
+        self.discarded = 0
+        self.health_failures = 0
+
+    def checkout(self, conn_params):
+        deadline = None
+        while True:
+            conn = None
+            with self._cond:
+                if not self._idle and self._open >= self.size:
+                    wait_start = time.monotonic()
+                    if deadline is None:
+                        deadline = wait_start + self.timeout
+                        self.waits += 1
+                    while not self._idle and self._open >= self.size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            self.wait_time += time.monotonic() - wait_start
+                            msg = 'No free connection in pool %s after %gs'
+                            raise Database.OperationalError(msg %
+                                (self.alias, self.timeout))
+                        self._cond.wait(remaining)
+                    self.wait_time += time.monotonic() - wait_start
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    # Reserve slot for new connection
+                    self._open += 1
+            if conn is None:
+                return self._connect(conn_params)
+            if self._is_healthy(conn, last_used):
+                with self._cond:
+                    self.checkouts += 1
+                return conn
+            self._discard(conn)
+
+    def _connect(self, conn_params):
+        conn = None
+        try:
+            conn = Database.connect(**conn_params)
+        finally:
+            if conn is None:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+        with self._cond:
+            self._info[id(conn)] = (time.monotonic(), conn.isolation_level)
+            self.created += 1
+            self.checkouts += 1
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            self._count('health_failures')
+            return False
+        now = time.monotonic()
+        if self._expired(conn, now):
+            self._count('expired')
+            return False
+        if now - last_used < self.check_idle:
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except Database.Error:
+            self._count('health_failures')
+            return False
+        return True
+
+    def _count(self, name):
+        with self._cond:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _expired(self, conn, now):
+        created = self._info[id(conn)][0]
+        return self.max_age is not None and now - created >= self.max_age
+
+    def _discard(self, conn):
+        with self._cond:
+            self._info.pop(id(conn), None)
+            self._open -= 1
+            self.discarded += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Database.Error:
+            pass
+
+    def _reset(self, conn, reset_session):
+        """Roll back unfinished transaction and restore autocommit.
+        Returns False if the connection cannot be reused."""
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            # Health check query must not leave a transaction open
+            if not conn.autocommit:
+                conn.autocommit = True
+            if reset_session:
+                # Release session-level locks and settings
+                cursor = conn.cursor()
+                try:
+                    cursor.execute('DISCARD ALL')
+                finally:
+                    cursor.close()
+        except Database.Error:
+            return False
+        return True
+
+    def checkin(self, conn, reset_session=False):
+        if self._reset(conn, reset_session) and not self._expired(conn, time.monotonic()):
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        else:
+            self._discard(conn)
+        self._log_stats()
+
+    def isolation_level(self, conn):
+        """Isolation level of the connection right after connecting"""
+        return self._info[id(conn)][1]
+
+    def close_idle(self):
+        with self._cond:
+            conn_list = [x[0] for x in self._idle]
+            self._idle = []
+        for conn in conn_list:
+            self._discard(conn)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            ages = [now - x[0] for x in self._info.values()]
+            return dict(pid=self.pid, size=self._open, idle=len(self._idle),
+                checkouts=self.checkouts, waits=self.waits,
+                wait_time=self.wait_time, timeouts=self.timeouts,
+                created=self.created, expired=self.expired,
+                discarded=self.discarded,
+                health_failures=self.health_failures,
+                max_age=max(ages) if ages else 0.0,
+                mean_age=sum(ages) / len(ages) if ages else 0.0)
+
+    def log_stats(self):
+        msg = ('DB pool %(alias)s (%(database)s) pid %(pid)d: %(size)d open, '
+            '%(idle)d idle, '
+            '%(checkouts)d checkouts, %(waits)d waits (%(wait_time).3fs), '
+            '%(timeouts)d timeouts, %(created)d created, %(expired)d expired, '
+            '%(discarded)d discarded, %(health_failures)d failed checks, '
+            'connection age max %(max_age).0fs mean %(mean_age).0fs')
+        data = self.stats()
+        data['alias'] = self.alias
+        data['database'] = self.database
+        logger.info(msg, data)
+
+    def _log_stats(self):
+        if not self.stats_interval:
+            return
+        now = time.monotonic()
+        with self._cond:
+            if now - self._last_log < self.stats_interval:
+                return
+            self._last_log = now
+        self.log_stats()
+
+def _pool_key(alias, conn_params):
+    return (alias,) + tuple(sorted(((k, str(v))
+        for k, v in conn_params.items())))
+
+def get_pool(alias, conn_params, options):
+    pid = os.getpid()
+    key = _pool_key(alias, conn_params)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.pid != pid:
+            _inherited_pools.append(pool)
+            pool = None
+        if pool is None:
+            kwargs = dict(POOL_DEFAULTS)
+            kwargs.update(((k, v) for k, v in options.items() if k in kwargs))
+            pool = ConnectionPool(alias, conn_params.get('database'),
+                **kwargs)
+            _pools[key] = pool
+        return pool
+
+def _process_pools():
+    pid = os.getpid()
+    with _pools_lock:
+        return [x for x in _pools.values() if x.pid == pid]
+
+def close_pools(alias=None, database=None):
+    """Close idle connections in pools of this process, optionally only
+    pools of the given alias or connected to the given database"""
+    for pool in _process_pools():
+        if ((alias is None or pool.alias == alias) and
+            (database is None or pool.database == database)):
+            pool.close_idle()
+
+def pool_stats():
+    """Connection pool counters of this process,
+    {(alias, database name): dict}"""
+    return dict((((x.alias, x.database), x.stats())
+        for x in _process_pools()))
+
+@atexit.register
+def _log_pool_stats():
+    pid = os.getpid()
+    for pool in list(_pools.values()):
+        if pool.pid == pid and pool.checkouts:
+            pool.log_stats()
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # Idle pooled connections to the test database would make
+    # DROP DATABASE fail
+    def _create_test_db(self, verbosity, autoclobber, keepdb=False):
+        close_pools(database=self._get_test_db_name())
+        return super(DatabaseCreation, self)._create_test_db(verbosity,
+            autoclobber, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(database=test_database_name)
+        super(DatabaseCreation, self)._destroy_test_db(test_database_name,
+            verbosity)
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Set when the session acquired state which must not leak to the next
+    # user of the connection, e.g. session-level advisory locks
+    needs_session_reset = False
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        # Django 1.10 does not use creation_class yet
+        self.creation = DatabaseCreation(self)
+        # Pool of the current connection, settings_dict may change while
+        # the connection is open
+        self.connection_pool = None
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.get_connection_params(),
+            self.settings_dict['OPTIONS'])
+
+    def get_connection_params(self):
+        ret = super(DatabaseWrapper, self).get_connection_params()
+        for key in POOL_DEFAULTS:
+            ret.pop(key, None)
+        return ret
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, conn_params, self.settings_dict['OPTIONS'])
+        connection = pool.checkout(conn_params)
+        self.connection_pool = pool
+        options = self.settings_dict['OPTIONS']
+        # Reused connection may report autocommit instead of the database
+        # default so use the value recorded by the pool on connect
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = pool.isolation_level(connection)
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reset_session = self.needs_session_reset
+        self.needs_session_reset = False
+        pool = self.connection_pool
+        # Connection closed inside atomic block stays referenced by
+        # the wrapper until the next connect(), it must not be shared.
+        if self.in_atomic_block:
+            pool._discard(self.connection)
+        else:
+            pool.checkin(self.connection, reset_session)
+
+    def close_pool(self):
+        """Close idle pooled connections of this alias, e.g. before
+        forking"""
+        close_pools(alias=self.alias)
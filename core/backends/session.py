@@ -0,0 +1,161 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.contrib.sessions.backends import db
+from django.db import connection
+from django.core.exceptions import SuspiciousOperation
+from django.utils import timezone
+from django.utils.encoding import force_text
+from ..utils.cache import LocalCache, invalidate_tags, session_tag
+import atexit
+import datetime
+import logging
+import threading
+
+# Session engine with per-process read cache and batched expiry updates.
+# The default cache backend must be shared by all server processes, it holds
+# the version stamps which invalidate local copies.
+
+_local_sessions = LocalCache(settings.SESSION_LOCAL_CACHE_SIZE)
+
+class _TouchQueue(object):
+    """Collect sessions which need expiry refresh and update them in one
+    query per batch. Queued updates get written at most
+    SESSION_TOUCH_FLUSH_INTERVAL seconds later even if the process receives
+    no more requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+
+    def _take(self):
+        key_list = list(self._pending)
+        self._pending = set()
+        return key_list
+
+    def add(self, session_key):
+        with self._lock:
+            self._pending.add(session_key)
+            if len(self._pending) < settings.SESSION_TOUCH_BATCH_SIZE:
+                if self._timer is None:
+                    self._timer = threading.Timer(
+                        settings.SESSION_TOUCH_FLUSH_INTERVAL,
+                        self._timer_flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            key_list = self._take()
+        _touch_sessions(key_list)
+
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+            key_list = self._take()
+        try:
+            _touch_sessions(key_list)
+        finally:
+            # Database connections are per thread
+            connection.close()
+
+    def flush(self):
+        with self._lock:
+            key_list = self._take()
+        _touch_sessions(key_list)
+
+def _touch_sessions(key_list):
+    if not key_list:
+        return
+    now = timezone.now()
+    expire_date = now + datetime.timedelta(seconds=settings.SESSION_COOKIE_AGE)
+    qs = SessionStore.get_model_class().objects.filter(
+        session_key__in=key_list, expire_date__gt=now)
+    qs.update(expire_date=expire_date)
+
+_touch_queue = _TouchQueue()
+atexit.register(_touch_queue.flush)
+
+class SessionStore(db.SessionStore):
+    def _load_entry(self, key, now):
+        entry, version = _local_sessions.get(key, session_tag(key))
+        # Expiry may have been refreshed by another process
+        if entry is not None and entry[1] > now:
+            return entry, version
+        try:
+            obj = self.model.objects.get(session_key=key, expire_date__gt=now)
+        except self.model.DoesNotExist:
+            _local_sessions.discard(key)
+            return None, version
+        entry = (obj.session_data, obj.expire_date)
+        _local_sessions.set(key, version, entry)
+        return entry, version
+
+    def load(self):
+        self._expire_date = None
+        key = self.session_key
+        if key is None:
+            return {}
+        entry, self._version = self._load_entry(key, timezone.now())
+        if entry is None:
+            self._session_key = None
+            return {}
+        session_data, self._expire_date = entry
+        try:
+            # Decode each time so that requests never share mutable data
+            return self.decode(session_data)
+        except SuspiciousOperation as e:
+            logger = logging.getLogger('django.security.%s' %
+                e.__class__.__name__)
+            logger.warning(force_text(e))
+            self._session_key = None
+            return {}
+
+    def _written(self, session_key):
+        invalidate_tags(session_tag(session_key))
+        _local_sessions.discard(session_key)
+
+    def save(self, must_create=False):
+        # Unmodified sessions get saved only to refresh expiry with
+        # SESSION_SAVE_EVERY_REQUEST, do that in batches
+        if (not must_create and not self.modified and
+            self.session_key is not None and
+            self.get('_session_expiry') is None):
+            expire_date = getattr(self, '_expire_date', None)
+            new_date = timezone.now() + datetime.timedelta(
+                seconds=settings.SESSION_COOKIE_AGE)
+            if (expire_date is not None and
+                new_date - expire_date < settings.SESSION_REFRESH_INTERVAL):
+                return
+            # Sessions close to expiry cannot wait for the queue flush
+            margin = datetime.timedelta(
+                seconds=2 * settings.SESSION_TOUCH_FLUSH_INTERVAL)
+            if (expire_date is not None and
+                expire_date - timezone.now() > margin):
+                _touch_queue.add(self.session_key)
+                self._expire_date = new_date
+                entry = (self.encode(self._session), new_date)
+                _local_sessions.set(self.session_key, self._version, entry)
+                return
+        super(SessionStore, self).save(must_create)
+        self._written(self.session_key)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        super(SessionStore, self).delete(session_key)
+        if session_key is not None:
+            self._written(session_key)
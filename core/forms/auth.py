@@ -25,6 +25,7 @@ from .base import HelpTextMixin, ModelForm
 from .. import models
 from ..models import const
 from ..utils.l10n import timezone_choices
+from ..utils import throttle
 from ..utils.transaction import lock_record
 from ..utils.utils import generate_token
 import datetime
@@ -34,14 +35,16 @@ class LoginForm(auth.AuthenticationForm):
     def clean(self):
         username = self.cleaned_data.get('username')
         password = self.cleaned_data.get('password')
-        if username and models.BruteBlock.username_blocked(username):
+        if username and throttle.username_blocked(username):
             msg = _('This account has been temporarily blocked due to high number of login failures. Please try again later.')
             raise ValidationError(msg, code='temporary_block')
         try:
-            return super(LoginForm, self).clean()
+            ret = super(LoginForm, self).clean()
         except ValidationError:
-            models.BruteBlock.login_failure(self.request, username)
+            throttle.login_failure(self.request, username)
             raise
+        throttle.login_success(self.request, username)
+        return ret
 
     def confirm_login_allowed(self, user):
         super(LoginForm, self).confirm_login_allowed(user)
@@ -104,7 +107,8 @@ class UserProfileUpdateForm(ModelForm):
     class Meta:
         model = models.User
         fields = ['password_check', 'email', 'title_before', 'first_name',
-            'last_name', 'title_after', 'language', 'timezone', 'bio']
+            'last_name', 'title_after', 'language', 'timezone', 'bio',
+            'digest_frequency']
     title_before = models.Person._meta.get_field('title_before').formfield()
     title_after = models.Person._meta.get_field('title_after').formfield()
     bio = models.Person._meta.get_field('bio').formfield()
@@ -17,28 +17,36 @@
 from django import forms
 from django.core.exceptions import ImproperlyConfigured
 from django.forms import fields, modelformset_factory, widgets, ValidationError
-from django.urls import reverse
+from django.urls import reverse, reverse_lazy
 from django.utils.html import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from .base import Form, ModelForm, BaseAliasForm
-from .widgets import SubmitButton
+from .widgets import AutocompleteWidget, SubmitButton
 from ..models import const
 from ..utils import pgsql, sql
+from ..utils.keywords import canonical_keyword, set_paper_keywords
 from ..utils.transaction import lock_record
 from ..utils.utils import fold_and, fold_or
 from ..utils.validators import validate_paper_alias, validate_person_alias
 from .. import models
 import re
 
+def _autocomplete_widget(source):
+    url = reverse_lazy('core:ajax_autocomplete', kwargs=dict(source=source))
+    return AutocompleteWidget(url)
+
 class PaperSearchForm(Form):
-    title = forms.CharField(label=_('Title'), required=False)
+    title = forms.CharField(label=_('Title'), required=False,
+        widget=_autocomplete_widget('papers'))
     year_published = forms.IntegerField(label=_('Year published'),
         required=False)
     author = forms.CharField(label=_('Author'), required=False,
-        help_text=_('Author name or identifier.'))
+        help_text=_('Author name or identifier.'),
+        widget=_autocomplete_widget('people'))
     identifier = forms.CharField(label=_('Identifier'), required=False)
     keywords = forms.CharField(label=_('Keywords'), required=False,
-        help_text=_('Comma-separated list of keywords.'))
+        help_text=_('Comma-separated list of keywords.'),
+        widget=_autocomplete_widget('keywords'))
 
     def __init__(self, *args, **kwargs):
         queryset = kwargs.pop('queryset', None)
@@ -70,41 +78,18 @@ class PaperSearchForm(Form):
         # Author name/identifier
         author = self.cleaned_data.get('author')
         if author:
-            reftab = sql.Table(models.PaperAuthorReference)
-            # aliastab: author identifier referenced by the paper
-            # (may be unlinked)
-            aliastab = sql.Table(models.PersonAlias)
-            # extaliastab: all identifiers of the linked author whether or not
-            # they're referenced by the paper itself
-            extaliastab = sql.Table(models.PersonAlias)
-            cond = (reftab.author_alias_id == aliastab.pk)
-            subjoin = reftab.inner_join(aliastab, cond)
-            cond = (aliastab.target_id == extaliastab.target_id)
-            subjoin = subjoin.left_join(extaliastab, cond)
-
             if ':' in author:
                 # Scheme prefix in input, search only identifiers
                 try:
-                    scheme, identifier = validate_person_alias('', author)
-                    cond = (((papertab.pk == reftab.paper_id) &
-                        (((aliastab.scheme == scheme) &
-                        (aliastab.identifier == identifier)) |
-                        ((extaliastab.scheme == scheme) &
-                        (extaliastab.identifier == identifier)))) &
-                        ((reftab.confirmed==True) | reftab.confirmed.isnull()))
-                    join = join.inner_join(subjoin, cond)
+                    id_list = [validate_person_alias('', author)]
+                    cond_list.append(self._author_query(papertab, author,
+                        id_list, False))
                     self.filter = True
                 except ValidationError as err:
                     self.add_error('author', err)
             else:
-                persontab = sql.Table(models.Person)
-                nametab = sql.Table(models.PaperAuthorName)
-                cond = (aliastab.target_id == persontab.pk)
-                subjoin = subjoin.left_join(persontab, cond)
-
-                # Search author aliases and linked users
-                tokens = author.split()
-                id_list = []
+                # Search author aliases, linked users and plain author names
+                id_list = [(None, author)]
                 # Normalize known identifiers
                 for scheme in const.person_alias_schemes:
                     try:
@@ -113,26 +98,8 @@ class PaperSearchForm(Form):
                             id_list.append((scheme, tmp_id))
                     except ValidationError:
                         pass
-                tmplist = [(persontab.first_name.icontains(x) |
-                    persontab.last_name.icontains(x)) for x in tokens]
-                tmp1 = (aliastab.identifier == author)
-                tmp2 = (extaliastab.identifier == author)
-                if id_list:
-                    tmp1 |= fold_or((((aliastab.scheme == s) &
-                        (aliastab.identifier == i)) for s,i in id_list))
-                    tmp2 |= fold_or((((extaliastab.scheme == s) &
-                        (extaliastab.identifier == i)) for s,i in id_list))
-                tmplist.append(tmp1)
-                tmplist.append(tmp2)
-                cond = ((papertab.pk == reftab.paper_id) &
-                    ((reftab.confirmed==True) | reftab.confirmed.isnull()))
-                join = join.left_join(subjoin, cond & fold_or(tmplist))
-
-                # Search plain author names
-                cond = ((papertab.pk == nametab.paper_id) &
-                    nametab.author_name.tsplain(author))
-                join = join.left_join(nametab, cond)
-                cond_list.append(aliastab.pk.notnull() | nametab.pk.notnull())
+                cond_list.append(self._author_query(papertab, author, id_list,
+                    True))
                 self.filter = True
 
         # Paper identifier
@@ -161,17 +128,22 @@ class PaperSearchForm(Form):
                 join = join.inner_join(aliastab, cond)
                 self.filter = True
 
-        # Paper keywords (multiple)
+        # Paper keywords (multiple), papers must have all of them
         keywords = self.cleaned_data.get('keywords')
         if keywords:
-            kw_list = [x.strip() for x in keywords.split(',')]
-            for kw in kw_list:
-                if not kw:
-                    continue
+            kw_set = set(map(canonical_keyword, keywords.split(',')))
+            kw_set.discard('')
+            if kw_set:
                 kwtab = sql.Table(models.PaperKeyword)
-                cond = ((papertab.pk == kwtab.paper_id) &
-                    (sql.upper(kwtab.keyword) == kw.upper()))
-                join = join.inner_join(kwtab, cond)
+                dicttab = sql.Table(models.Keyword)
+                entry_sub = dicttab.select(dicttab.pk,
+                    where=dicttab.canonical.belongs(list(kw_set)))
+                having = (sql.count(kwtab.entry_id, distinct=True) ==
+                    len(kw_set))
+                sub = kwtab.select(kwtab.paper_id,
+                    where=kwtab.entry_id.belongs(entry_sub),
+                    group_by=[kwtab.paper_id], having=having)
+                cond_list.append(papertab.pk.belongs(sub))
                 self.filter = True
 
         # Filter queryset
@@ -180,6 +152,44 @@ class PaperSearchForm(Form):
             query = models.Paper.query_model.pk.belongs(sub)
             self.queryset = self.queryset.filter(query)
 
+    def _author_query(self, papertab, author, id_list, search_names):
+        """Match papers by author. Each branch is a separate subquery so that
+        it can use its own index instead of ORing conditions over joins."""
+        def id_match(table):
+            return fold_or([(table.identifier == i) if s is None else
+                ((table.scheme == s) & (table.identifier == i))
+                for s, i in id_list])
+
+        # aliastab: author identifier referenced by the paper (may be unlinked)
+        # or any other identifier of the same linked author
+        aliastab = sql.Table(models.PersonAlias)
+        linktab = sql.Table(models.PersonAlias)
+        cond = id_match(linktab) & linktab.target_id.notnull()
+        alias_cond = (id_match(aliastab) |
+            aliastab.target_id.belongs(linktab.select(linktab.target_id,
+            where=cond)))
+        if search_names:
+            # People whose name contains any of the tokens
+            persontab = sql.Table(models.Person)
+            cond = fold_or([(persontab.first_name.icontains(x) |
+                persontab.last_name.icontains(x)) for x in author.split()])
+            alias_cond |= aliastab.target_id.belongs(persontab.select(
+                persontab.pk, where=cond))
+        reftab = sql.Table(models.PaperAuthorReference)
+        cond = (reftab.author_alias_id.belongs(aliastab.select(aliastab.pk,
+            where=alias_cond)) &
+            ((reftab.confirmed == True) | reftab.confirmed.isnull()))
+        ret = papertab.pk.belongs(reftab.select(reftab.paper_id, where=cond))
+
+        if search_names:
+            # Plain author names
+            nametab = sql.Table(models.PaperAuthorName)
+            cond = (nametab.author_name.tsplain(author) |
+                nametab.author_name.icontains(author))
+            ret |= papertab.pk.belongs(nametab.select(nametab.paper_id,
+                where=cond))
+        return ret
+
 class PaperForm(ModelForm):
     class Meta:
         model = models.Paper
@@ -200,12 +210,18 @@ class PaperForm(ModelForm):
             qs = self.instance.paperkeyword_set.all()
             keyword_list = [x.keyword for x in qs]
             self.initial['keywords'] = ', '.join(keyword_list)
-        self.keyword_set = set()
 
     def clean_keywords(self):
         text = self.cleaned_data.get('keywords', '')
         kwlist = re.split('[,\n]+', text, flags=re.MULTILINE)
-        ret = set((x for x in map(lambda y: y.strip(), kwlist) if x))
+        ret = []
+        key_set = set()
+        for item in kwlist:
+            item = ' '.join(item.split())
+            key = canonical_keyword(item)
+            if key and key not in key_set:
+                key_set.add(key)
+                ret.append(item)
         mfield = models.PaperKeyword._meta.get_field('keyword')
         if ret and max((len(x) for x in ret)) > mfield.max_length:
             msg=_('Some keywords are longer than %(limit_value)s characters.')
@@ -220,8 +236,6 @@ class PaperForm(ModelForm):
                 msg = _('Database error, please try again later.')
                 raise ValidationError(msg, 'lock')
             self.instance = tmp
-            qs = self.instance.paperkeyword_set.all()
-            self.keyword_set = set((x.keyword for x in qs))
 
     def save(self):
         # Find poster's main alias if needed
@@ -232,17 +246,7 @@ class PaperForm(ModelForm):
         ret = super(PaperForm, self).save()
 
         # Update keywords
-        new_keywords = self.cleaned_data.get('keywords', set())
-        if new_keywords != self.keyword_set:
-            del_keywords = list(self.keyword_set - new_keywords)
-            add_keywords = [models.PaperKeyword(paper=ret, keyword=x)
-                for x in (new_keywords - self.keyword_set)]
-            if del_keywords:
-                kwtab = models.PaperKeyword.query_model
-                query = kwtab.keyword.belongs(del_keywords)
-                ret.paperkeyword_set.filter(query).delete()
-            if add_keywords:
-                models.PaperKeyword.objects.bulk_create(add_keywords)
+        set_paper_keywords(ret, self.cleaned_data.get('keywords', []))
 
         # Create permanent identifier and add poster as author if appropriate
         if new_paper:
@@ -373,6 +377,9 @@ class ScienceSubfieldForm(ModelForm):
         widget.attrs['data-reload-select'] = self.add_prefix('subfield')
         widget.attrs['data-callback'] = reverse('core:ajax_science_subfields')
         self.fields['name'].required = False
+        url = reverse('core:ajax_autocomplete', kwargs=dict(source='subfields'))
+        widget = self.fields['name'].widget
+        self.fields['name'].widget = AutocompleteWidget(url, widget.attrs)
         if self.data is not None:
             value = self.data.get(self.add_prefix('field'))
             if value is not None:
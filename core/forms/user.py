@@ -17,15 +17,90 @@
 from django import forms
 from django.core.exceptions import ImproperlyConfigured
 from django.forms import modelformset_factory, ValidationError
+from django.urls import reverse_lazy
 from django.utils.html import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from .base import Form, ModelForm, BaseAliasForm
-from .widgets import SubmitButton
+from .widgets import AutocompleteWidget, SubmitButton
 from ..models import const
+from ..utils.cache import invalidate_papers
+from ..utils.feed import schedule_indexing
+from ..utils.follow import followed_posters, set_subscriptions
+from ..utils import sql
 from ..utils.transaction import lock_record
-from ..utils.utils import logger, update_diff
+from ..utils.utils import fold_and, fold_or, logger
 from ..utils.validators import validate_person_alias
 from .. import models
+import unicodedata
+
+class PersonSearchForm(Form):
+    name = forms.CharField(label=_('Name'), required=False,
+        help_text=_('Name or part of an identifier.'),
+        widget=AutocompleteWidget(reverse_lazy('core:ajax_autocomplete',
+            kwargs=dict(source='people'))))
+
+    def __init__(self, *args, **kwargs):
+        queryset = kwargs.pop('queryset', None)
+        if queryset is None:
+            msg = '"queryset" keyword argument is required'
+            raise ImproperlyConfigured(msg)
+        super(PersonSearchForm, self).__init__(*args, **kwargs)
+        self.queryset = queryset
+        self.filter = False
+
+    def clean(self):
+        name = self.cleaned_data.get('name', '').strip()
+        if not name:
+            return
+        # Every word must appear in the name or be similar to it
+        persontab = sql.Table(models.Person)
+        cond_list = [(persontab.first_name.icontains(x) |
+            persontab.last_name.icontains(x) |
+            persontab.first_name.trigram_similar(x) |
+            persontab.last_name.trigram_similar(x)) for x in name.split()]
+        sub = persontab.select(persontab.pk, where=fold_and(cond_list))
+        # Or the whole input is part of a linked identifier
+        aliastab = sql.Table(models.PersonAlias)
+        cond = (aliastab.identifier.icontains(name) &
+            aliastab.target_id.notnull())
+        sub2 = aliastab.select(aliastab.target_id, where=cond)
+        table = models.Person.query_model
+        query = table.pk.belongs(sub) | table.pk.belongs(sub2)
+        rank = (table.last_name.similarity(name) +
+            table.first_name.similarity(name))
+        qs = self.queryset.filter(query).annotate(rank=rank)
+        self.queryset = qs.order_by('-rank', 'last_name', 'first_name')
+        self.filter = True
+
+# Fallback for papers missed by authorship suggestions
+class AuthorNameSearchForm(Form):
+    name = forms.CharField(label=_('Author name'), required=False,
+        help_text=_('Search papers by author name.'))
+
+    def __init__(self, *args, **kwargs):
+        queryset = kwargs.pop('queryset', None)
+        if queryset is None:
+            msg = '"queryset" keyword argument is required'
+            raise ImproperlyConfigured(msg)
+        super(AuthorNameSearchForm, self).__init__(*args, **kwargs)
+        self.queryset = queryset
+        self.filter = False
+
+    def clean(self):
+        name = ' '.join(self.cleaned_data.get('name', '').replace(',',
+            ' ').split())
+        if not name:
+            return
+        search_names = set([name, name.casefold()])
+        tmp = [unicodedata.normalize('NFKD', x).encode('ascii',
+            'ignore').decode('ascii') for x in search_names]
+        search_names.update((x for x in tmp if x))
+        nametab = models.Paper.query_model.paperauthorname
+        query = fold_or([nametab.author_name.tsphrase(x)
+            for x in search_names])
+        qs = self.queryset.filter(query).distinct()
+        self.queryset = qs.order_by('pk')
+        self.filter = True
 
 class PersonAliasForm(BaseAliasForm):
     class Meta:
@@ -154,6 +229,7 @@ class BaseAuthorshipConfirmationForm(Form):
             create_list = [models.FeedEvent(person=self.person, paper=x,
                 event_type=event_type) for x in qs]
             models.FeedEvent.objects.bulk_create(create_list)
+            schedule_indexing(create_list)
         elif '_reject_authorship' in self.data:
             qs.update(confirmed=False)
             partab = evtab.paper.paperauthorreference
@@ -162,6 +238,7 @@ class BaseAuthorshipConfirmationForm(Form):
                 (partab.confirmed == False) & (evtab.person == self.person)&
                 (evtab.event_type == event_type))
             models.FeedEvent.objects.filter(query).delete()
+        invalidate_papers([x.pk for x in self.selected_papers])
 
     save.alters_data = True
 
@@ -281,11 +358,8 @@ class FeedSubscriptionForm(Form):
             self.fields[fname] = field
 
     def _load_subscriptions(self):
-        subtab = models.FeedSubscription.query_model
-        query = ((subtab.poster == self.poster) &
-            (subtab.follower == self.follower))
-        qs = models.FeedSubscription.objects.filter(query)
-        return set((x.subscription_type for x in qs))
+        follows = followed_posters(self.follower.pk)
+        return set((k for k, v in follows.items() if self.poster.pk in v))
 
     def clean(self):
         lock_record(self.follower)
@@ -296,19 +370,7 @@ class FeedSubscriptionForm(Form):
         for subtype in const.feed_subscription_types:
             if self.cleaned_data.get(fname_tpl % subtype):
                 new_set.add(subtype)
-        del_set, create_set = update_diff(self._load_subscriptions(), new_set)
-        if del_set:
-            subtab = models.FeedSubscription.query_model
-            query = ((subtab.poster == self.poster) &
-                (subtab.follower == self.follower) &
-                subtab.subscription_type.belongs(list(del_set)))
-            models.FeedSubscription.objects.filter(query).delete()
-        if create_set:
-            create_list = []
-            for subtype in create_set:
-                create_list.append(models.FeedSubscription(poster=self.poster,
-                    follower=self.follower, subscription_type=subtype))
-            models.FeedSubscription.objects.bulk_create(create_list)
+        set_subscriptions(self.follower, self.poster, new_set)
 
     save.alters_data = True
 
@@ -19,6 +19,10 @@ from django.forms.utils import flatatt
 from django.utils.html import format_html, mark_safe
 
 class AutocompleteWidget(widgets.TextInput):
+    def __init__(self, callback_url, attrs=None):
+        super(AutocompleteWidget, self).__init__(attrs)
+        self.callback_url = callback_url
+
     def build_attrs(self, *args, **kwargs):
         ret = super(AutocompleteWidget, self).build_attrs(*args, **kwargs)
         cls = ret.get('class') or ''
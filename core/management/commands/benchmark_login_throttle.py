@@ -0,0 +1,62 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from core.utils import throttle
+import random
+import time
+
+class Command(BaseCommand):
+    help = 'Measure login throttle throughput under simulated credential stuffing attack'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=100000,
+            help='Number of failed login attempts')
+        parser.add_argument('--clients', type=int, default=1000,
+            help='Number of attacking IP addresses')
+        parser.add_argument('--accounts', type=int, default=5000,
+            help='Number of targeted usernames')
+
+    def handle(self, *args, **options):
+        # Counters are left in the cache, random usernames keep separate
+        # runs independent
+        factory = RequestFactory()
+        rng = random.Random(0)
+        run_id = '%x.' % random.getrandbits(32)
+        requests = [factory.post('/login',
+            REMOTE_ADDR='10.%d.%d.%d' % (x >> 16 & 255, x >> 8 & 255, x & 255))
+            for x in range(options['clients'])]
+        usernames = [run_id + 'user%d' % x for x in range(options['accounts'])]
+        blocked = 0
+        with CaptureQueriesContext(connection) as queries:
+            start = time.monotonic()
+            for i in range(options['attempts']):
+                request = rng.choice(requests)
+                username = rng.choice(usernames)
+                if (throttle.client_blocked(request) or
+                    throttle.username_blocked(username)):
+                    blocked += 1
+                    continue
+                throttle.login_failure(request, username)
+            elapsed = time.monotonic() - start
+        msg = '%(attempts)d attempts in %(time).2fs (%(rate).0f/s), %(blocked)d blocked, %(queries)d database queries'
+        args = dict(attempts=options['attempts'], time=elapsed,
+            rate=options['attempts'] / max(elapsed, 1e-9), blocked=blocked,
+            queries=len(queries))
+        self.stdout.write(msg % args)
@@ -0,0 +1,81 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand
+from core import models
+import random
+import time
+
+def _legacy_active(qs):
+    # filter_active() before Person.is_active was introduced
+    subq = models.User.objects.filter_active().values_list('person_id')
+    return qs.filter(models.Person.query_model.pk.belongs(subq)).distinct()
+
+def _person_page(username, legacy):
+    qs = models.Person.objects.filter_username(username)
+    qs = _legacy_active(qs) if legacy else qs.filter_active()
+    return list(qs)
+
+def _timeline(person_id, legacy):
+    stab = models.FeedSubscription.query_model
+    feedtab = models.FeedEvent.query_model
+    subq = models.FeedSubscription.objects.filter(stab.follower.pk ==
+        person_id).values_list('poster_id')
+    query = feedtab.person.pk.belongs(subq)
+    if legacy:
+        poster_subq = _legacy_active(models.Person.objects.all())
+        query &= feedtab.person.pk.belongs(poster_subq.values_list('pk'))
+    else:
+        query &= (feedtab.person.is_active == True)
+    qs = models.FeedEvent.objects.filter(query).select_related('person',
+        'paper').order_by('-pk')
+    return list(qs[:50])
+
+class Command(BaseCommand):
+    help = 'Compare person page and timeline queries with and without the denormalized active flag'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=200,
+            help='Number of people queried by each test')
+
+    def measure(self, func, args, legacy):
+        start = time.monotonic()
+        for item in args:
+            func(item, legacy)
+        return time.monotonic() - start
+
+    def handle(self, *args, **options):
+        qs = models.User.objects.filter_active().order_by('pk')
+        user_list = list(qs.values_list('username', 'person_id'))
+        if not user_list:
+            self.stderr.write('No active users in database')
+            return
+        rng = random.Random(0)
+        sample = [rng.choice(user_list) for x in range(options['samples'])]
+        tests = [
+            ('Person page', _person_page, [x[0] for x in sample]),
+            ('Timeline', _timeline, [x[1] for x in sample]),
+        ]
+        msg = '%(name)s: %(legacy).3fs subquery, %(flag).3fs flag (%(speedup).1fx)'
+        for name, func, arg_list in tests:
+            # Warm up caches so that neither variant gets an advantage
+            self.measure(func, arg_list[:10], True)
+            self.measure(func, arg_list[:10], False)
+            legacy = self.measure(func, arg_list, True)
+            flag = self.measure(func, arg_list, False)
+            args = dict(name=name, legacy=legacy, flag=flag,
+                speedup=legacy / max(flag, 1e-9))
+            self.stdout.write(msg % args)
@@ -0,0 +1,43 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand, CommandError
+from harvest.dump import DUMP_FORMATS, import_dump
+import os
+
+class Command(BaseCommand):
+    help = 'Import papers from local (optionally gzipped) JSON-lines metadata dumps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('format', choices=sorted(DUMP_FORMATS),
+            help='Dump format')
+        parser.add_argument('files', nargs='+', metavar='file',
+            help='Dump files, always pass them in the same order to resume interrupted import')
+        parser.add_argument('--workers', type=int, default=None,
+            help='Number of parser processes (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+            help='Number of papers saved in one transaction')
+        parser.add_argument('--defer-indexes', action='store_true',
+            help='Drop search indexes during import and rebuild them at the end')
+
+    def handle(self, *args, **options):
+        for path in options['files']:
+            if not os.path.isfile(path):
+                raise CommandError('File not found: %s' % path)
+        count = import_dump(options['format'], options['files'],
+            options['workers'], options['batch_size'],
+            options['defer_indexes'])
+        self.stdout.write('Imported %d papers' % count)
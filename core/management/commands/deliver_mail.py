@@ -0,0 +1,43 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.utils.mail import deliver_mail
+import time
+
+class Command(BaseCommand):
+    help = 'Send e-mails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+            help='Number of e-mails sent over one connection (default: MAIL_BATCH_SIZE)')
+        parser.add_argument('--once', action='store_true',
+            help='Exit when the outbox is empty')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                count = deliver_mail(options['batch_size'])
+                if count:
+                    self.stdout.write('Sent %d e-mails' % count)
+                if options['once']:
+                    return
+                time.sleep(settings.JOB_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            pass
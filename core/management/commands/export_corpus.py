@@ -0,0 +1,43 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand, CommandError
+from ...utils.export import DATASETS, export_all, parse_since
+import os
+
+class Command(BaseCommand):
+    help = 'Export papers, aliases, authors and citation graph into gzip-compressed JSON-lines and CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Output directory')
+        parser.add_argument('--since', default=None,
+            help='Export only papers changed since given date or datetime')
+        parser.add_argument('--dataset', action='append',
+            choices=sorted(DATASETS), dest='datasets',
+            help='Dataset to export, may be repeated (default: all)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_since(options['since'])
+            if since is None:
+                raise CommandError('Invalid date: %s' % options['since'])
+        if not os.path.isdir(options['directory']):
+            msg = 'Output directory does not exist: %s'
+            raise CommandError(msg % options['directory'])
+        for path in export_all(options['directory'], options['datasets'],
+            since):
+            self.stdout.write(path)
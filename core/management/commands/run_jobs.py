@@ -0,0 +1,33 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand, CommandError
+from core.utils.jobs import run_workers
+
+class Command(BaseCommand):
+    help = 'Run background job workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+            help='Number of worker threads (default: JOB_WORKER_CONCURRENCY)')
+        parser.add_argument('--once', action='store_true',
+            help='Exit when there are no more runnable jobs')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if concurrency is not None and concurrency < 1:
+            raise CommandError('Concurrency must be at least 1')
+        run_workers(concurrency, options['once'])
@@ -0,0 +1,39 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from harvest.sciswarm import pull_peer
+
+class Command(BaseCommand):
+    help = 'Pull changes from other Sciswarm servers listed in SYNC_PEERS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('peers', nargs='*', metavar='peer',
+            help='Peer codes to synchronize (default: all)')
+        parser.add_argument('--max-batches', type=int, default=None,
+            help='Stop after applying given number of change batches')
+
+    def handle(self, *args, **options):
+        peers = getattr(settings, 'SYNC_PEERS', {})
+        peer_list = options['peers'] or list(peers)
+        for code in peer_list:
+            if code not in peers:
+                raise CommandError('Unknown sync peer: %s' % code)
+        for code in peer_list:
+            cursor = pull_peer(code, peers[code], options['max_batches'])
+            self.stdout.write('%s: synchronized up to change %s' % (code,
+                cursor))
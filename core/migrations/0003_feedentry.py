@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_paper_public_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(editable=False, max_length=64, verbose_name='channel')),
+                ('event', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='core.FeedEvent', verbose_name='event')),
+            ],
+            options={
+                'ordering': ('-event',),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedentry',
+            unique_together=set([('channel', 'event')]),
+        ),
+    ]
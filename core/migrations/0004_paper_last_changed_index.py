@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_feedentry'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='paper',
+            index_together=set([('last_changed', 'id')]),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Trigger arguments: change kind, column with logged object ID
+_log_function = '''
+CREATE FUNCTION core_log_change() RETURNS trigger AS $$
+DECLARE
+    old_id integer;
+    new_id integer;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_id := (to_jsonb(OLD) ->> TG_ARGV[1])::integer;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_id := (to_jsonb(NEW) ->> TG_ARGV[1])::integer;
+    END IF;
+    IF old_id IS NOT NULL AND old_id IS DISTINCT FROM new_id THEN
+        INSERT INTO core_changelogentry (kind, object_id, change_date)
+            VALUES (TG_ARGV[0], old_id, clock_timestamp());
+    END IF;
+    IF new_id IS NOT NULL THEN
+        INSERT INTO core_changelogentry (kind, object_id, change_date)
+            VALUES (TG_ARGV[0], new_id, clock_timestamp());
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+_trigger_tpl = '''
+CREATE TRIGGER core_log_change AFTER INSERT OR UPDATE OR DELETE ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE core_log_change('{kind}', '{column}');
+'''
+
+# Changes of paper metadata and aliases are logged as changes of the paper
+_logged_tables = [
+    ('core_paper', 'paper', 'id'),
+    ('core_paper_fields', 'paper', 'paper_id'),
+    ('core_paper_bibliography', 'paper', 'paper_id'),
+    ('core_paperalias', 'paper', 'target_id'),
+    ('core_paperauthorreference', 'paper', 'paper_id'),
+    ('core_paperauthorname', 'paper', 'paper_id'),
+    ('core_paperkeyword', 'paper', 'paper_id'),
+    ('core_paperreview', 'review', 'id'),
+    ('core_feedevent', 'event', 'id'),
+]
+
+_create_sql = [_log_function] + [_trigger_tpl.format(table=t, kind=k,
+    column=c) for t, k, c in _logged_tables]
+_drop_sql = ['DROP TRIGGER core_log_change ON {0};'.format(t)
+    for t, k, c in _logged_tables] + ['DROP FUNCTION core_log_change();']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_paper_last_changed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(editable=False, max_length=16, verbose_name='kind')),
+                ('object_id', models.IntegerField(editable=False, verbose_name='object ID')),
+                ('change_date', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='change date')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='changelogentry',
+            index_together=set([('kind', 'object_id')]),
+        ),
+        migrations.RunSQL(_create_sql, _drop_sql),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_changelogentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrossrefCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doi', models.CharField(editable=False, max_length=256, unique=True, verbose_name='DOI')),
+                ('failed', models.BooleanField(default=False, editable=False, verbose_name='failed')),
+                ('data', models.BinaryField(editable=False, null=True, verbose_name='data')),
+                ('fetch_date', models.DateTimeField(db_index=True, editable=False, verbose_name='fetch date')),
+            ],
+        ),
+    ]
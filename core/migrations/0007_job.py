@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0006_crossrefcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(editable=False, max_length=64, verbose_name='task')),
+                ('arguments', models.TextField(editable=False, verbose_name='arguments')),
+                ('token', models.CharField(editable=False, max_length=64, unique=True, verbose_name='token')),
+                ('status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Finished'), (3, 'Failed')], default=0, editable=False, verbose_name='status')),
+                ('attempts', models.IntegerField(default=0, editable=False, verbose_name='attempts')),
+                ('max_attempts', models.IntegerField(editable=False, verbose_name='max attempts')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='run after')),
+                ('date_created', models.DateTimeField(auto_now_add=True, verbose_name='date created')),
+                ('date_started', models.DateTimeField(editable=False, null=True, verbose_name='date started')),
+                ('date_finished', models.DateTimeField(db_index=True, editable=False, null=True, verbose_name='date finished')),
+                ('result', models.TextField(blank=True, editable=False, verbose_name='result')),
+                ('error', models.TextField(blank=True, editable=False, verbose_name='error')),
+                ('owner', models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='owner')),
+            ],
+            options={
+                'ordering': ('-pk',),
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together=set([('status', 'run_after')]),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(editable=False, max_length=255, verbose_name='subject')),
+                ('body', models.TextField(editable=False, verbose_name='body')),
+                ('html_body', models.TextField(blank=True, editable=False, verbose_name='HTML body')),
+                ('from_email', models.CharField(editable=False, max_length=255, verbose_name='sender')),
+                ('recipients', models.TextField(editable=False, verbose_name='recipients')),
+                ('status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Sending'), (2, 'Sent'), (3, 'Failed')], default=0, editable=False, verbose_name='status')),
+                ('attempts', models.IntegerField(default=0, editable=False, verbose_name='attempts')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='next attempt')),
+                ('date_created', models.DateTimeField(auto_now_add=True, verbose_name='date created')),
+                ('date_sent', models.DateTimeField(db_index=True, editable=False, null=True, verbose_name='date sent')),
+                ('error', models.TextField(blank=True, editable=False, verbose_name='error')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='mailmessage',
+            index_together=set([('status', 'next_attempt')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_mailmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='digest_frequency',
+            field=models.IntegerField(choices=[(0, 'Never'), (1, 'Daily'), (7, 'Weekly')], default=0, verbose_name='e-mail digest'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_digest_date',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='last digest date'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_digest_event',
+            field=models.IntegerField(editable=False, null=True, verbose_name='last digest event'),
+        ),
+    ]
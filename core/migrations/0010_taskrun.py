@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_user_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(editable=False, max_length=128, verbose_name='task')),
+                ('status', models.IntegerField(choices=[(0, 'Running'), (1, 'Finished'), (2, 'Interrupted'), (3, 'Failed')], default=0, editable=False, verbose_name='status')),
+                ('date_started', models.DateTimeField(editable=False, verbose_name='date started')),
+                ('date_finished', models.DateTimeField(editable=False, null=True, verbose_name='date finished')),
+                ('items_processed', models.IntegerField(editable=False, null=True, verbose_name='items processed')),
+                ('error', models.TextField(blank=True, editable=False, verbose_name='error')),
+            ],
+            options={
+                'ordering': ('-pk',),
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='taskrun',
+            index_together=set([('task', 'date_started')]),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_taskrun'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='BruteBlock',
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_delete_bruteblock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='is_active',
+            field=models.BooleanField(default=False, editable=False, verbose_name='active'),
+        ),
+        migrations.RunSQL(
+            sql='UPDATE core_person SET is_active = EXISTS (SELECT 1 FROM core_user u WHERE u.person_id = core_person.id AND u.is_active AND u.verification_key IS NULL AND u.delete_deadline IS NULL)',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_person_active_name_idx ON core_person (last_name, first_name) WHERE is_active',
+            reverse_sql='DROP INDEX core_person_active_name_idx',
+        ),
+    ]
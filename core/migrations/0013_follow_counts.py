@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+_count_sql = '''UPDATE core_person SET
+    follower_count = (SELECT COUNT(DISTINCT s.follower_id)
+        FROM core_feedsubscription s INNER JOIN core_person p ON p.id = s.follower_id
+        WHERE s.poster_id = core_person.id AND p.is_active),
+    following_count = (SELECT COUNT(DISTINCT s.poster_id)
+        FROM core_feedsubscription s INNER JOIN core_person p ON p.id = s.poster_id
+        WHERE s.follower_id = core_person.id AND p.is_active)'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_person_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='follower_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='followers'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='following_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='following'),
+        ),
+        migrations.AlterIndexTogether(
+            name='feedsubscription',
+            index_together=set([('poster', 'follower'), ('follower', 'poster')]),
+        ),
+        migrations.RunSQL(_count_sql, migrations.RunSQL.noop),
+    ]
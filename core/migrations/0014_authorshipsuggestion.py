@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_person_name_keys(apps, schema_editor):
+    from core.utils.suggest import name_key
+    Person = apps.get_model('core', 'Person')
+    for person in Person.objects.all():
+        key = name_key(person.last_name, person.first_name)
+        if key:
+            Person.objects.filter(pk=person.pk).update(name_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_follow_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='name key'),
+        ),
+        migrations.AddField(
+            model_name='paperauthorname',
+            name='name_key',
+            field=models.CharField(db_index=True, editable=False, max_length=128, null=True, verbose_name='name key'),
+        ),
+        migrations.CreateModel(
+            name='AuthorshipSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_type', models.IntegerField(choices=[(0, 'Author name'), (1, 'E-mail')], verbose_name='match type')),
+                ('score', models.FloatField(verbose_name='score')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.Paper', verbose_name='paper')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.Person', verbose_name='person')),
+            ],
+            options={
+                'ordering': ('person', '-score', 'paper'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='authorshipsuggestion',
+            unique_together=set([('person', 'paper')]),
+        ),
+        migrations.RunPython(fill_person_name_keys, migrations.RunPython.noop),
+        # Author names get indexed by the index_pending_papers cron task
+        migrations.RunSQL(
+            sql='CREATE INDEX core_paperauthorname_pending_idx ON core_paperauthorname (id) WHERE name_key IS NULL',
+            reverse_sql='DROP INDEX core_paperauthorname_pending_idx',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_authorshipsuggestion_rank_idx ON core_authorshipsuggestion (person_id, score DESC, paper_id)',
+            reverse_sql='DROP INDEX core_authorshipsuggestion_rank_idx',
+        ),
+        # Case insensitive e-mail lookups
+        migrations.RunSQL(
+            sql='CREATE INDEX core_user_email_upper_idx ON core_user (UPPER(email))',
+            reverse_sql='DROP INDEX core_user_email_upper_idx',
+        ),
+        migrations.RunSQL(
+            sql="CREATE INDEX core_personalias_email_upper_idx ON core_personalias (UPPER(identifier)) WHERE scheme = 'mailto'",
+            reverse_sql='DROP INDEX core_personalias_email_upper_idx',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_authorshipsuggestion'),
+    ]
+
+    operations = [
+        # Requires database superuser unless the extension already exists
+        migrations.RunSQL(
+            sql='CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_person_first_name_trgm ON core_person USING GIN (first_name gin_trgm_ops)',
+            reverse_sql='DROP INDEX core_person_first_name_trgm',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_person_last_name_trgm ON core_person USING GIN (last_name gin_trgm_ops)',
+            reverse_sql='DROP INDEX core_person_last_name_trgm',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_paperauthorname_author_name_trgm ON core_paperauthorname USING GIN (author_name gin_trgm_ops)',
+            reverse_sql='DROP INDEX core_paperauthorname_author_name_trgm',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_personalias_identifier_trgm ON core_personalias USING GIN (identifier gin_trgm_ops)',
+            reverse_sql='DROP INDEX core_personalias_identifier_trgm',
+        ),
+    ]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Must match utils.keywords.canonical_keyword()
+_fill_keywords_sql = r'''
+INSERT INTO core_keyword (canonical, name, paper_count)
+SELECT upper(regexp_replace(btrim(keyword), '\s+', ' ', 'g')),
+    MIN(regexp_replace(btrim(keyword), '\s+', ' ', 'g')),
+    COUNT(DISTINCT paper_id)
+FROM core_paperkeyword
+GROUP BY 1
+'''
+
+_fill_entries_sql = r'''
+UPDATE core_paperkeyword pk SET entry_id = k.id
+FROM core_keyword k
+WHERE k.canonical = upper(regexp_replace(btrim(pk.keyword), '\s+', ' ', 'g'))
+'''
+
+_fill_frequencies_sql = '''
+INSERT INTO core_keywordfrequency (subfield_id, keyword_id, paper_count)
+SELECT pf.sciencesubfield_id, pk.entry_id, COUNT(DISTINCT pk.paper_id)
+FROM core_paperkeyword pk
+    INNER JOIN core_paper_fields pf ON pf.paper_id = pk.paper_id
+GROUP BY pf.sciencesubfield_id, pk.entry_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Keyword',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canonical', models.CharField(max_length=32, unique=True, verbose_name='keyword')),
+                ('name', models.CharField(max_length=32, verbose_name='name')),
+                ('paper_count', models.IntegerField(default=0, editable=False, verbose_name='papers')),
+            ],
+            options={
+                'ordering': ('canonical',),
+            },
+        ),
+        migrations.AddField(
+            model_name='paperkeyword',
+            name='entry',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.Keyword', verbose_name='dictionary entry'),
+        ),
+        migrations.RunSQL(
+            sql=[_fill_keywords_sql, _fill_entries_sql],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='paperkeyword',
+            name='entry',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.Keyword', verbose_name='dictionary entry'),
+        ),
+        migrations.AlterIndexTogether(
+            name='paperkeyword',
+            index_together=set([('entry', 'paper')]),
+        ),
+        migrations.CreateModel(
+            name='KeywordFrequency',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_count', models.IntegerField(default=0, verbose_name='papers')),
+                ('keyword', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.Keyword', verbose_name='keyword')),
+                ('subfield', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.ScienceSubfield', verbose_name='subfield')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='keywordfrequency',
+            unique_together=set([('subfield', 'keyword')]),
+        ),
+        migrations.RunSQL(
+            sql=_fill_frequencies_sql,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Most frequent keywords in a subfield
+        migrations.RunSQL(
+            sql='CREATE INDEX core_keywordfrequency_subfield_count ON core_keywordfrequency (subfield_id, paper_count DESC)',
+            reverse_sql='DROP INDEX core_keywordfrequency_subfield_count',
+        ),
+    ]
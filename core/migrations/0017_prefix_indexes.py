@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_keyword'),
+    ]
+
+    # Case insensitive prefix lookups (istartswith) for autocomplete
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX core_paper_name_upper_prefix ON core_paper (UPPER(name) text_pattern_ops)',
+            reverse_sql='DROP INDEX core_paper_name_upper_prefix',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_person_first_name_upper_prefix ON core_person (UPPER(first_name) text_pattern_ops)',
+            reverse_sql='DROP INDEX core_person_first_name_upper_prefix',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX core_person_last_name_upper_prefix ON core_person (UPPER(last_name) text_pattern_ops)',
+            reverse_sql='DROP INDEX core_person_last_name_upper_prefix',
+        ),
+    ]
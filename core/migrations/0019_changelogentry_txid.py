@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# Same as migration 0005 plus ID of the writing transaction
+_log_function = '''
+CREATE OR REPLACE FUNCTION core_log_change() RETURNS trigger AS $$
+DECLARE
+    old_id integer;
+    new_id integer;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_id := (to_jsonb(OLD) ->> TG_ARGV[1])::integer;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_id := (to_jsonb(NEW) ->> TG_ARGV[1])::integer;
+    END IF;
+    IF old_id IS NOT NULL AND old_id IS DISTINCT FROM new_id THEN
+        INSERT INTO core_changelogentry (kind, object_id, change_date, txid)
+            VALUES (TG_ARGV[0], old_id, clock_timestamp(), txid_current());
+    END IF;
+    IF new_id IS NOT NULL THEN
+        INSERT INTO core_changelogentry (kind, object_id, change_date, txid)
+            VALUES (TG_ARGV[0], new_id, clock_timestamp(), txid_current());
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+_old_log_function = '''
+CREATE OR REPLACE FUNCTION core_log_change() RETURNS trigger AS $$
+DECLARE
+    old_id integer;
+    new_id integer;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_id := (to_jsonb(OLD) ->> TG_ARGV[1])::integer;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_id := (to_jsonb(NEW) ->> TG_ARGV[1])::integer;
+    END IF;
+    IF old_id IS NOT NULL AND old_id IS DISTINCT FROM new_id THEN
+        INSERT INTO core_changelogentry (kind, object_id, change_date)
+            VALUES (TG_ARGV[0], old_id, clock_timestamp());
+    END IF;
+    IF new_id IS NOT NULL THEN
+        INSERT INTO core_changelogentry (kind, object_id, change_date)
+            VALUES (TG_ARGV[0], new_id, clock_timestamp());
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_user_feed_token'),
+    ]
+
+    # Existing entries get transaction ID 0, they are all committed
+    operations = [
+        migrations.AddField(
+            model_name='changelogentry',
+            name='txid',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='transaction ID'),
+        ),
+        migrations.AlterIndexTogether(
+            name='changelogentry',
+            index_together=set([('kind', 'object_id'), ('txid', 'id')]),
+        ),
+        migrations.RunSQL(
+            sql=_log_function,
+            reverse_sql=_old_log_function,
+        ),
+    ]
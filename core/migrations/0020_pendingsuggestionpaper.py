@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+_queue_function = '''
+CREATE FUNCTION core_queue_suggestions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        INSERT INTO core_pendingsuggestionpaper (paper_id)
+            VALUES ((to_jsonb(OLD) ->> TG_ARGV[0])::integer)
+            ON CONFLICT (paper_id) DO NOTHING;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO core_pendingsuggestionpaper (paper_id)
+            VALUES ((to_jsonb(NEW) ->> TG_ARGV[0])::integer)
+            ON CONFLICT (paper_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+_trigger_tpl = '''
+CREATE TRIGGER core_queue_suggestions AFTER {events} ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE core_queue_suggestions('{column}');
+'''
+
+# Indexing fills PaperAuthorName.name_key, that update must not queue
+# the paper again
+_queued_tables = [
+    ('core_paper', 'INSERT', 'id'),
+    ('core_paperauthorname', 'INSERT OR DELETE OR UPDATE OF paper_id, author_name', 'paper_id'),
+    ('core_paperauthorreference', 'INSERT OR DELETE OR UPDATE OF paper_id, author_alias_id', 'paper_id'),
+]
+
+_create_sql = [_queue_function] + [_trigger_tpl.format(table=t, events=e,
+    column=c) for t, e, c in _queued_tables]
+_drop_sql = ['DROP TRIGGER core_queue_suggestions ON {0};'.format(t)
+    for t, e, c in _queued_tables] + ['DROP FUNCTION core_queue_suggestions();']
+
+# Papers missed by the old name_key based queue, including papers with
+# only e-mail author references
+_fill_sql = '''
+INSERT INTO core_pendingsuggestionpaper (paper_id)
+    SELECT paper_id FROM core_paperauthorname WHERE name_key IS NULL
+    UNION
+    SELECT r.paper_id FROM core_paperauthorreference r
+        INNER JOIN core_personalias a ON a.id = r.author_alias_id
+        WHERE a.scheme = 'mailto' AND a.target_id IS NULL
+    ORDER BY 1;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_changelogentry_txid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSuggestionPaper',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_id', models.IntegerField(editable=False, unique=True, verbose_name='paper ID')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+        migrations.RunSQL(
+            sql=_create_sql,
+            reverse_sql=_drop_sql,
+        ),
+        migrations.RunSQL(
+            sql=_fill_sql,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql='DROP INDEX core_paperauthorname_pending_idx',
+            reverse_sql='CREATE INDEX core_paperauthorname_pending_idx ON core_paperauthorname (id) WHERE name_key IS NULL',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# Names without comma were keyed only in the "Last First" order, index them
+# again to fill the alternative key
+_requeue_sql = [
+    '''UPDATE core_paperauthorname SET name_key = NULL
+    WHERE strpos(author_name, ',') = 0 AND name_key IS NOT NULL;''',
+    '''INSERT INTO core_pendingsuggestionpaper (paper_id)
+    SELECT DISTINCT paper_id FROM core_paperauthorname WHERE name_key IS NULL
+    ORDER BY 1 ON CONFLICT (paper_id) DO NOTHING;''',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_pendingsuggestionpaper'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paperauthorname',
+            name='name_key_alt',
+            field=models.CharField(db_index=True, editable=False, max_length=128, null=True, verbose_name='alternative name key'),
+        ),
+        migrations.RunSQL(
+            sql=_requeue_sql,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -14,10 +14,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from .auth import User, BruteBlock, BruteLog
+from .auth import User, BruteLog
 from .paper import (Person, PaperManagementDelegation, PersonAlias,
-    ScienceSubfield, Paper, PaperAlias, PaperKeyword, PaperAuthorReference,
-    PaperAuthorName, PaperSupplementalLink, PaperImportSource)
+    ScienceSubfield, Paper, PaperAlias, Keyword, KeywordFrequency,
+    PaperKeyword, PaperAuthorReference, PaperAuthorName, AuthorshipSuggestion,
+    PendingSuggestionPaper, PaperSupplementalLink, PaperImportSource)
 from .comment import PaperReview, PaperReviewResponse
-from .event import FeedEvent, FeedSubscription
+from .event import FeedEvent, FeedSubscription, FeedEntry
+from .sync import ChangeLogEntry
+from .crossref import CrossrefCacheEntry
+from .job import Job
+from .mail import MailMessage
+from .scheduler import TaskRun
 from . import lookups
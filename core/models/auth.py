@@ -19,12 +19,13 @@ from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
-import datetime
+from . import const
 
 class UserManager(auth_models.UserManager):
     def filter_active(self):
         table = self.model.query_model
-        query = ((table.is_active == True) & table.verification_key.isnull())
+        query = ((table.is_active == True) & table.verification_key.isnull() &
+            table.delete_deadline.isnull())
         return self.filter(query)
 
     def filter_by_person(self, person):
@@ -44,6 +45,17 @@ class User(auth_models.AbstractUser):
     person = models.ForeignKey('Person', verbose_name=_('person'),
         on_delete=models.PROTECT, related_name='+')
     timezone = models.CharField(_('time zone'), max_length=64)
+    digest_frequency = models.IntegerField(_('e-mail digest'),
+        choices=const.digest_frequencies.items(),
+        default=const.digest_frequencies.NEVER)
+    # ID of the last feed event included in e-mail digest, see utils.digest
+    last_digest_event = models.IntegerField(_('last digest event'),
+        null=True, editable=False)
+    last_digest_date = models.DateTimeField(_('last digest date'), null=True,
+        editable=False)
+    # Secret token for timeline feed URLs, see utils.feed.user_feed_token()
+    feed_token = models.CharField(_('feed token'), max_length=64, null=True,
+        unique=True, editable=False)
 
     def __str__(self):
         # This applies only to bots
@@ -66,41 +78,7 @@ class User(auth_models.AbstractUser):
             return ''
         return super(User, self).get_session_auth_hash()
 
-class BruteBlockManager(models.Manager):
-    def purge_stale(self):
-        start = timezone.now() - datetime.timedelta(hours=1)
-        query = (BruteBlock.query_model.log_date < start)
-        self.filter(query).delete()
-
-class BruteBlock(models.Model):
-    objects = BruteBlockManager()
-    log_date = models.DateTimeField(auto_now_add=True, db_index=True)
-    username = models.CharField(max_length=150, db_index=True)
-    ip_address = models.GenericIPAddressField(db_index=True)
-
-    @staticmethod
-    def username_blocked(username):
-        username = username[:BruteBlock._meta.get_field('username').max_length]
-        table = BruteBlock.query_model
-        query = (table.username == username)
-        return BruteBlock.objects.filter(query).count() >= 20
-
-    @staticmethod
-    def client_blocked(request):
-        table = BruteBlock.query_model
-        query = (table.ip_address == request.META['REMOTE_ADDR'])
-        return BruteBlock.objects.filter(query).count() >= 10
-
-    @staticmethod
-    def login_failure(request, username):
-        username = username[:BruteBlock._meta.get_field('username').max_length]
-        ip_address = request.META['REMOTE_ADDR']
-        BruteBlock.objects.create(username=username, ip_address=ip_address)
-        if BruteBlock.username_blocked(username):
-            BruteLog.objects.create(username=username, ip_address=ip_address)
-        elif BruteBlock.client_blocked(request):
-            BruteLog.objects.create(ip_address=ip_address)
-
+# Audit log of temporary login blocks, see utils.throttle
 class BruteLog(models.Model):
     log_date = models.DateTimeField(auto_now_add=True, db_index=True)
     username = models.CharField(max_length=150, null=True)
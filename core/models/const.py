@@ -97,3 +97,37 @@ science_fields = ConstEnum(
     ('PHYSICS', 11, _('Physics')),
     ('SOCIAL', 12, _('Social Science')),
 )
+
+job_statuses = ConstEnum(
+    ('PENDING', 0, _('Pending')),
+    ('RUNNING', 1, _('Running')),
+    ('DONE', 2, _('Finished')),
+    ('FAILED', 3, _('Failed')),
+)
+
+mail_statuses = ConstEnum(
+    ('PENDING', 0, _('Pending')),
+    ('SENDING', 1, _('Sending')),
+    ('SENT', 2, _('Sent')),
+    ('FAILED', 3, _('Failed')),
+)
+
+# Value is the number of days between digests
+digest_frequencies = ConstEnum(
+    ('NEVER', 0, _('Never')),
+    ('DAILY', 1, _('Daily')),
+    ('WEEKLY', 7, _('Weekly')),
+)
+
+authorship_match_types = ConstEnum(
+    ('NAME', 0, _('Author name')),
+    ('EMAIL', 1, _('E-mail')),
+)
+
+task_run_statuses = ConstEnum(
+    ('RUNNING', 0, _('Running')),
+    ('DONE', 1, _('Finished')),
+    # Time budget ran out, the task will continue in the next run
+    ('PARTIAL', 2, _('Interrupted')),
+    ('FAILED', 3, _('Failed')),
+)
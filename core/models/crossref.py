@@ -0,0 +1,42 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+import json
+import zlib
+
+# Persistent cache of Crossref API responses. Failed lookups are cached
+# as well (with empty data) so that bad DOIs don't get queried repeatedly.
+class CrossrefCacheEntry(models.Model):
+    doi = models.CharField(_('DOI'), max_length=256, unique=True,
+        editable=False)
+    failed = models.BooleanField(_('failed'), default=False, editable=False)
+    # zlib-compressed JSON of the work record
+    data = models.BinaryField(_('data'), null=True, editable=False)
+    fetch_date = models.DateTimeField(_('fetch date'), db_index=True,
+        editable=False)
+
+    def __str__(self):
+        return self.doi
+
+    def get_data(self):
+        if self.data is None:
+            return None
+        return json.loads(zlib.decompress(bytes(self.data)).decode('utf-8'))
+
+    def set_data(self, data):
+        self.data = zlib.compress(json.dumps(data).encode('utf-8'))
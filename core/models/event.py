@@ -58,6 +58,8 @@ class FeedSubscription(models.Model):
     class Meta:
         ordering = ('-pk',)
         unique_together = ('follower', 'subscription_type', 'poster')
+        # Keyset pagination of follower lists, see utils.follow
+        index_together = [('poster', 'follower'), ('follower', 'poster')]
     poster = models.ForeignKey(paper.Person, verbose_name=_('person'),
         on_delete=models.CASCADE, editable=False, related_name='follower_set',
         related_query_name='follower')
@@ -66,3 +68,14 @@ class FeedSubscription(models.Model):
     subscription_type = models.IntegerField(_('event type'),
         choices=const.feed_subscription_types.items(), db_index=True,
         editable=False)
+
+# Precomputed index of feed events for syndication. Each event is listed
+# in every channel it belongs to so that feed polling needs just one index
+# lookup. See utils.feed for channel naming.
+class FeedEntry(models.Model):
+    class Meta:
+        ordering = ('-event',)
+        unique_together = ('channel', 'event')
+    event = models.ForeignKey(FeedEvent, verbose_name=_('event'),
+        on_delete=models.CASCADE, editable=False)
+    channel = models.CharField(_('channel'), max_length=64, editable=False)
@@ -0,0 +1,65 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from . import const
+import json
+
+# Background job queue, see utils.jobs
+class Job(models.Model):
+    class Meta:
+        ordering = ('-pk',)
+        index_together = (('status', 'run_after'),)
+    task = models.CharField(_('task'), max_length=64, editable=False)
+    arguments = models.TextField(_('arguments'), editable=False)
+    # Random token for status pages of anonymous users
+    token = models.CharField(_('token'), max_length=64, unique=True,
+        editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL,
+        verbose_name=_('owner'), null=True, on_delete=models.CASCADE,
+        editable=False)
+    status = models.IntegerField(_('status'), choices=const.job_statuses.items(),
+        default=const.job_statuses.PENDING, editable=False)
+    attempts = models.IntegerField(_('attempts'), default=0, editable=False)
+    max_attempts = models.IntegerField(_('max attempts'), editable=False)
+    run_after = models.DateTimeField(_('run after'), default=timezone.now,
+        editable=False)
+    date_created = models.DateTimeField(_('date created'), auto_now_add=True,
+        editable=False)
+    date_started = models.DateTimeField(_('date started'), null=True,
+        editable=False)
+    date_finished = models.DateTimeField(_('date finished'), null=True,
+        db_index=True, editable=False)
+    result = models.TextField(_('result'), blank=True, editable=False)
+    error = models.TextField(_('error'), blank=True, editable=False)
+
+    def __str__(self):
+        return '{0} #{1}'.format(self.task, self.pk)
+
+    def get_arguments(self):
+        return json.loads(self.arguments)
+
+    def get_result(self):
+        if not self.result:
+            return None
+        return json.loads(self.result)
+
+    def is_finished(self):
+        return self.status in (const.job_statuses.DONE,
+            const.job_statuses.FAILED)
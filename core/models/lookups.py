@@ -63,3 +63,13 @@ class TSQuery(models.Lookup):
         params = [conf] + lhs_params + [conf, query]
         sql = 'to_tsvector(%%s, %s) @@ to_tsquery(%%s, %%s)' % lhs
         return sql, params
+
+@models.Field.register_lookup
+class TrigramSimilar(models.Lookup):
+    lookup_name = 'trigram_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        # pg_trgm similarity operator, escaped for parameter substitution
+        return '%s %%%% %s' % (lhs, rhs), lhs_params + rhs_params
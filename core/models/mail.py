@@ -0,0 +1,49 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from . import const
+
+# Outgoing e-mail queue, see utils.mail.deliver_mail()
+class MailMessage(models.Model):
+    class Meta:
+        index_together = (('status', 'next_attempt'),)
+    subject = models.CharField(_('subject'), max_length=255, editable=False)
+    body = models.TextField(_('body'), editable=False)
+    html_body = models.TextField(_('HTML body'), blank=True, editable=False)
+    from_email = models.CharField(_('sender'), max_length=255,
+        editable=False)
+    # One address per line
+    recipients = models.TextField(_('recipients'), editable=False)
+    status = models.IntegerField(_('status'),
+        choices=const.mail_statuses.items(),
+        default=const.mail_statuses.PENDING, editable=False)
+    attempts = models.IntegerField(_('attempts'), default=0, editable=False)
+    next_attempt = models.DateTimeField(_('next attempt'),
+        default=timezone.now, editable=False)
+    date_created = models.DateTimeField(_('date created'), auto_now_add=True,
+        editable=False)
+    date_sent = models.DateTimeField(_('date sent'), null=True, db_index=True,
+        editable=False)
+    error = models.TextField(_('error'), blank=True, editable=False)
+
+    def __str__(self):
+        return self.subject
+
+    def get_recipients(self):
+        return [x for x in self.recipients.split('\n') if x]
@@ -25,9 +25,19 @@ from . import auth, const, fields
 
 class PersonQuerySet(models.QuerySet):
     def filter_active(self):
+        return self.filter(self.model.query_model.is_active == True)
+
+    def refresh_active(self):
+        """Recompute is_active flag of selected people from their user
+        accounts. Returns the number of changed records."""
+        table = self.model.query_model
         subq = auth.User.objects.filter_active().values_list('person_id')
-        query = self.model.query_model.pk.belongs(subq)
-        return self.filter(query).distinct()
+        query = table.pk.belongs(subq)
+        ret = self.filter(query & (table.is_active == False)).update(
+            is_active=True)
+        ret += self.filter(~query & (table.is_active == True)).update(
+            is_active=False)
+        return ret
 
     def filter_alias(self, scheme, alias):
         aliastab = self.model.query_model.personalias
@@ -56,6 +66,20 @@ class Person(models.Model):
     title_after = models.CharField(_('titles after name'), max_length=64,
         blank=True)
     bio = models.TextField(_('about you'), max_length=1024, blank=True)
+    # Copy of auth.User.objects.filter_active() state of the linked account,
+    # maintained by signals.user_changed()
+    is_active = models.BooleanField(_('active'), default=False,
+        editable=False)
+    # Number of distinct active people on each side of FeedSubscription,
+    # maintained by utils.follow
+    follower_count = models.IntegerField(_('followers'), default=0,
+        editable=False)
+    following_count = models.IntegerField(_('following'), default=0,
+        editable=False)
+    # Normalized "last name, first initial" used to look up authorship
+    # suggestions, see utils.suggest
+    name_key = models.CharField(_('name key'), max_length=64, blank=True,
+        db_index=True, editable=False)
     paper_managers = models.ManyToManyField('Person',
         related_name='delegating_authors', through='PaperManagementDelegation',
         symmetrical=False, through_fields=('author', 'delegate'))
@@ -118,6 +142,15 @@ class Person(models.Model):
         kwargs = dict(username=self.username)
         return reverse('core:person_detail', kwargs=kwargs)
 
+    def save(self, *args, **kwargs):
+        from ..utils.suggest import name_key
+        self.name_key = name_key(self.last_name, self.first_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('first_name' in update_fields or
+            'last_name' in update_fields):
+            kwargs['update_fields'] = list(update_fields) + ['name_key']
+        super(Person, self).save(*args, **kwargs)
+
 class PaperManagementDelegation(models.Model):
     class Meta:
         ordering = ('author', 'delegate')
@@ -296,6 +329,7 @@ class PaperManager(models.Manager):
 class Paper(models.Model):
     class Meta:
         ordering = ('name',)
+        index_together = (('last_changed', 'id'),)
     objects = PaperManager()
 
     name = models.CharField(_('title'), max_length=512, db_index=True)
@@ -432,12 +466,41 @@ class PaperAlias(models.Model):
     def is_deletable(self):
         return self.scheme != const.person_alias_schemes.SCISWARM
 
+# Dictionary of distinct keywords, see utils.keywords
+class Keyword(models.Model):
+    class Meta:
+        ordering = ('canonical',)
+    # Upper case keyword with normalized whitespace
+    canonical = models.CharField(_('keyword'), max_length=32, unique=True)
+    # Spelling of the first occurrence
+    name = models.CharField(_('name'), max_length=32)
+    # Number of papers using the keyword, maintained by utils.keywords
+    paper_count = models.IntegerField(_('papers'), default=0,
+        editable=False)
+
+    def __str__(self):
+        return self.name
+
+# Number of papers in each subfield using the keyword
+class KeywordFrequency(models.Model):
+    class Meta:
+        unique_together = (('subfield', 'keyword'),)
+    subfield = models.ForeignKey(ScienceSubfield, verbose_name=_('subfield'),
+        on_delete=models.CASCADE, related_name='+')
+    keyword = models.ForeignKey(Keyword, verbose_name=_('keyword'),
+        on_delete=models.CASCADE, related_name='+')
+    paper_count = models.IntegerField(_('papers'), default=0)
+
+# Link between Paper and Keyword which keeps the paper's own spelling
 class PaperKeyword(models.Model):
     class Meta:
         ordering = ('keyword',)
+        index_together = (('entry', 'paper'),)
     keyword = models.CharField(_('keyword'), max_length=32, db_index=True)
     paper = models.ForeignKey(Paper, verbose_name=_('paper'),
         on_delete=models.CASCADE, editable=False)
+    entry = models.ForeignKey(Keyword, verbose_name=_('dictionary entry'),
+        on_delete=models.PROTECT, related_name='+', editable=False)
 
     def __str__(self):
         return self.keyword
@@ -515,10 +578,40 @@ class PaperAuthorName(models.Model):
         on_delete=models.CASCADE, editable=False)
     author_name = models.CharField(_('author'), max_length=128, db_index=True,
         help_text=_('Additional authors with no unique identifier'))
+    # Normalized form of author_name, NULL until the name gets indexed
+    # by utils.suggest
+    name_key = models.CharField(_('name key'), max_length=128, null=True,
+        db_index=True, editable=False)
+    # Key of the reversed name order for names without comma
+    name_key_alt = models.CharField(_('alternative name key'),
+        max_length=128, null=True, db_index=True, editable=False)
 
     def __str__(self):
         return self.author_name
 
+# Precomputed candidates for MassAuthorshipClaimView, see utils.suggest
+class AuthorshipSuggestion(models.Model):
+    class Meta:
+        ordering = ('person', '-score', 'paper')
+        unique_together = (('person', 'paper'),)
+    person = models.ForeignKey(Person, verbose_name=_('person'),
+        on_delete=models.CASCADE, related_name='+')
+    paper = models.ForeignKey(Paper, verbose_name=_('paper'),
+        on_delete=models.CASCADE, related_name='+')
+    match_type = models.IntegerField(_('match type'),
+        choices=const.authorship_match_types.items())
+    score = models.FloatField(_('score'))
+
+# Papers whose authorship suggestions need recomputing. Rows are inserted
+# by database triggers (see migration 0020) when a paper gets created or its
+# author names or references change, utils.suggest deletes them after
+# indexing. Paper ID is not a foreign key, the triggers also fire while
+# the paper is being deleted.
+class PendingSuggestionPaper(models.Model):
+    class Meta:
+        ordering = ('id',)
+    paper_id = models.IntegerField(_('paper ID'), unique=True, editable=False)
+
 class PaperSupplementalLink(models.Model):
     class Meta:
         ordering = ('paper', 'name')
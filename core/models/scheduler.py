@@ -0,0 +1,44 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+from . import const
+
+# Cron task run history, see utils.scheduler
+class TaskRun(models.Model):
+    class Meta:
+        ordering = ('-pk',)
+        index_together = (('task', 'date_started'),)
+    task = models.CharField(_('task'), max_length=128, editable=False)
+    status = models.IntegerField(_('status'),
+        choices=const.task_run_statuses.items(),
+        default=const.task_run_statuses.RUNNING, editable=False)
+    date_started = models.DateTimeField(_('date started'), editable=False)
+    date_finished = models.DateTimeField(_('date finished'), null=True,
+        editable=False)
+    items_processed = models.IntegerField(_('items processed'), null=True,
+        editable=False)
+    error = models.TextField(_('error'), blank=True, editable=False)
+
+    def __str__(self):
+        return '{0} #{1}'.format(self.task, self.pk)
+
+    @property
+    def duration(self):
+        if self.date_finished is None:
+            return None
+        return self.date_finished - self.date_started
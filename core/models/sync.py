@@ -0,0 +1,36 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+# Log of changed records for server-to-server replication. Rows are inserted
+# by database triggers (see migrations 0005 and 0019) so that bulk operations
+# and QuerySet.update() get logged as well. Primary key is the change
+# sequence number, see utils.sync for the order in which changes are served.
+class ChangeLogEntry(models.Model):
+    class Meta:
+        ordering = ('id',)
+        index_together = (('kind', 'object_id'), ('txid', 'id'))
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(_('kind'), max_length=16, editable=False)
+    object_id = models.IntegerField(_('object ID'), editable=False)
+    change_date = models.DateTimeField(_('change date'), default=timezone.now,
+        editable=False)
+    # ID of the transaction which made the change, from txid_current()
+    txid = models.BigIntegerField(_('transaction ID'), default=0,
+        editable=False)
@@ -0,0 +1,165 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db.models import signals
+from django.dispatch import receiver
+from .utils import cache, feed, follow, keywords, suggest
+from .utils.paper import invalidate_author_pages
+from .models import const
+from . import models
+
+# User fields which affect Person.is_active
+_person_active_fields = frozenset(['is_active', 'verification_key',
+    'delete_deadline', 'person'])
+# Person fields displayed on paper pages
+_person_display_fields = ('username', 'title_before', 'first_name',
+    'last_name', 'title_after')
+# User fields which affect authorship suggestions of the linked person
+_person_suggestion_fields = _person_active_fields | frozenset(['email'])
+
+@receiver(signals.post_save, sender=models.Paper)
+@receiver(signals.post_delete, sender=models.Paper)
+def paper_changed(sender, instance, **kwargs):
+    cache.invalidate_papers([instance.pk], cache.PAPER_LIST_TAG,
+        cache.CITATIONS_TAG)
+
+@receiver(signals.pre_delete, sender=models.Paper)
+def paper_deleted(sender, instance, **kwargs):
+    keywords.remove_paper_keywords(instance)
+
+@receiver(signals.post_save, sender=models.PaperAlias)
+@receiver(signals.post_delete, sender=models.PaperAlias)
+def paper_alias_changed(sender, instance, **kwargs):
+    if instance.target_id is not None:
+        cache.invalidate_papers([instance.target_id], cache.CITATIONS_TAG)
+
+@receiver(signals.post_save, sender=models.PaperAuthorReference)
+@receiver(signals.post_delete, sender=models.PaperAuthorReference)
+@receiver(signals.post_save, sender=models.PaperAuthorName)
+@receiver(signals.post_delete, sender=models.PaperAuthorName)
+def paper_author_changed(sender, instance, **kwargs):
+    cache.invalidate_papers([instance.paper_id], cache.PAPER_LIST_TAG,
+        cache.CITATIONS_TAG)
+
+@receiver(signals.post_save, sender=models.PaperKeyword)
+@receiver(signals.post_delete, sender=models.PaperKeyword)
+@receiver(signals.post_save, sender=models.PaperSupplementalLink)
+@receiver(signals.post_delete, sender=models.PaperSupplementalLink)
+@receiver(signals.post_save, sender=models.PaperReview)
+@receiver(signals.post_delete, sender=models.PaperReview)
+def paper_detail_changed(sender, instance, **kwargs):
+    cache.invalidate_papers([instance.paper_id])
+
+@receiver(signals.m2m_changed, sender=models.Paper.bibliography.through)
+@receiver(signals.m2m_changed, sender=models.Paper.fields.through)
+def paper_relation_changed(sender, instance, action, reverse, pk_set,
+    **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # post_clear does not report which papers were affected
+        paper_ids = pk_set or []
+    else:
+        paper_ids = [instance.pk]
+    cache.invalidate_papers(paper_ids, cache.CITATIONS_TAG)
+
+@receiver(signals.m2m_changed, sender=models.Paper.fields.through)
+def paper_fields_changed(sender, instance, action, reverse, pk_set,
+    **kwargs):
+    # Keep per-subfield keyword frequencies in sync
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    # Auto-created through models have no query model
+    if reverse:
+        qs = sender.objects.filter(sciencesubfield_id=instance.pk)
+        if action != 'pre_clear':
+            qs = qs.filter(paper_id__in=pk_set)
+    else:
+        qs = sender.objects.filter(paper_id=instance.pk)
+        if action != 'pre_clear':
+            qs = qs.filter(sciencesubfield_id__in=pk_set)
+    pair_list = list(qs.values_list('paper_id', 'sciencesubfield_id'))
+    delta = 1 if action == 'post_add' else -1
+    keywords.update_subfield_counts(pair_list, delta)
+
+@receiver(signals.post_save, sender=models.ScienceSubfield)
+@receiver(signals.post_delete, sender=models.ScienceSubfield)
+def subfield_changed(sender, instance, **kwargs):
+    cache.invalidate_tags(cache.SUBFIELDS_TAG)
+
+@receiver(signals.pre_save, sender=models.Person)
+def person_saving(sender, instance, update_fields=None, **kwargs):
+    # Remember whether paper pages need to be invalidated after save
+    instance._display_changed = False
+    if instance.pk is None:
+        return
+    if (update_fields and
+        not set(_person_display_fields).intersection(update_fields)):
+        return
+    qs = models.Person.objects.filter(models.Person.query_model.pk ==
+        instance.pk)
+    old = qs.values_list(*_person_display_fields).first()
+    new = tuple((getattr(instance, x) for x in _person_display_fields))
+    instance._display_changed = (old != new)
+
+@receiver(signals.pre_delete, sender=models.Person)
+def person_deleting(sender, instance, **kwargs):
+    # Aliases get unlinked without signals
+    invalidate_author_pages(person_id=instance.pk)
+
+@receiver(signals.post_save, sender=models.Person)
+@receiver(signals.post_delete, sender=models.Person)
+@receiver(signals.post_save, sender=models.PersonAlias)
+@receiver(signals.post_delete, sender=models.PersonAlias)
+def person_changed(sender, instance, **kwargs):
+    # Only the autocomplete index depends on this tag, cached pages
+    # get invalidated selectively
+    cache.invalidate_tags(cache.PEOPLE_TAG)
+    if sender is models.Person:
+        qs = models.User.objects.filter_by_person(instance)
+        user_tags = [cache.user_tag(x) for x in qs.values_list('pk', flat=True)]
+        cache.invalidate_tags(*user_tags)
+        if getattr(instance, '_display_changed', False):
+            invalidate_author_pages(person_id=instance.pk)
+        suggest.schedule_person_refresh(instance.pk)
+        return
+    # Alias target decides which name gets displayed
+    if kwargs.get('signal') is signals.post_save:
+        invalidate_author_pages(alias_id=instance.pk)
+    if (instance.scheme == const.person_alias_schemes.EMAIL and
+        instance.target_id is not None):
+        suggest.schedule_person_refresh(instance.target_id)
+
+@receiver(signals.post_save, sender=models.User)
+@receiver(signals.post_delete, sender=models.User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    cache.invalidate_tags(cache.user_tag(instance.pk))
+    if (update_fields and
+        not _person_suggestion_fields.intersection(update_fields)):
+        return
+    if (not update_fields or
+        _person_active_fields.intersection(update_fields)):
+        qs = models.Person.objects.filter(models.Person.query_model.pk ==
+            instance.person_id)
+        if qs.refresh_active():
+            follow.refresh_neighbor_counts(instance.person_id)
+            cache.invalidate_tags(cache.PEOPLE_TAG)
+    suggest.schedule_person_refresh(instance.person_id)
+
+@receiver(signals.post_save, sender=models.FeedEvent)
+def feed_event_created(sender, instance, created, **kwargs):
+    if created:
+        feed.schedule_indexing([instance])
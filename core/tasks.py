@@ -0,0 +1,76 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db.transaction import atomic
+from .forms.user import MassAuthorshipConfirmationForm, MassAuthorshipClaimForm
+from .models import const
+from .utils.crossref import crossref_fetch, crossref_import_bridge
+from .utils.jobs import task
+from .utils import suggest
+from . import models
+
+# Background job tasks. Arguments and return values must be JSON-serializable.
+
+def find_paper_by_doi(doi):
+    table = models.PaperAlias.query_model
+    query = ((table.scheme == const.paper_alias_schemes.DOI) &
+        (table.identifier == doi))
+    qs = models.PaperAlias.objects.filter(query).select_related('target')
+    alias = qs.first()
+    if alias is not None:
+        return alias.target
+    return None
+
+@task('find_similar_papers', max_attempts=3)
+def find_similar_papers(doi):
+    """Import paper from Crossref. Returns ID of the paper if it is public,
+    otherwise parsed Crossref data for one-off result page."""
+    paper = find_paper_by_doi(doi)
+    if paper is not None and paper.public:
+        return dict(paper_id=paper.pk)
+    data = crossref_fetch(doi)
+    if paper is None and data['name'] is not None:
+        bridge = crossref_import_bridge()
+        paper_list = bridge.import_papers('', [data], query_crossref=False)
+        # The paper may have been created by another process while we were
+        # waiting for Crossref response
+        if paper_list:
+            paper = paper_list[0]
+        else:
+            paper = find_paper_by_doi(doi)
+        if paper is not None and paper.public:
+            return dict(paper_id=paper.pk)
+    return dict(name=data['name'], bibliography=data['bibliography'])
+
+@task('mass_authorship')
+def mass_authorship(person_id, paper_ids, data, claim):
+    form_class = MassAuthorshipConfirmationForm
+    if claim:
+        form_class = MassAuthorshipClaimForm
+    with atomic():
+        person = models.Person.objects.get(pk=person_id)
+        query = models.Paper.query_model.pk.belongs(paper_ids)
+        qs = models.Paper.objects.filter_public().filter(query).order_by('pk')
+        form = form_class(data=data, person=person, paper_list=qs)
+        if not form.is_valid():
+            return dict(errors=dict((k, list(v))
+                for k, v in form.errors.items()))
+        form.save()
+    return dict(count=len(form.selected_papers))
+
+@task(suggest.REFRESH_PERSON_TASK)
+def refresh_person_suggestions(person_id):
+    return suggest.refresh_person(person_id)
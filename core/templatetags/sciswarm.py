@@ -178,10 +178,16 @@ class FullURLNode(template.Node):
 
     def render(self, context):
         url = self.subnode.render(context)
+        # Templates rendered outside requests (e.g. mail digests)
+        request = context.get('request')
+        if request is None:
+            build_uri = html.absolute_url
+        else:
+            build_uri = request.build_absolute_uri
         if not self.subnode.asvar:
-            return context['request'].build_absolute_uri(url)
+            return build_uri(url)
         var = self.subnode.asvar
-        context[var] = context['request'].build_absolute_uri(context[var])
+        context[var] = build_uri(context[var])
         return ''
 
 class LoginURLNode(template.Node):
@@ -16,3 +16,21 @@
 
 from .paper import *
 from .user import *
+from .mail import *
+from .routing import *
+from .pagecache import *
+from .conditional import *
+from .syndication import *
+from .oaipmh import *
+from .replication import *
+from .dataexport import *
+from .dumpimport import *
+from .crossrefcache import *
+from .crossrefclient import *
+from .jobqueue import *
+from .dbpool import *
+from .sessioncache import *
+from .loginthrottle import *
+from .crontasks import *
+from .chunkeddelete import *
+from .emaildigest import *
@@ -0,0 +1,52 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+from unittest import mock
+from ..utils.purge import chunked_delete
+from .. import models
+
+class ChunkedDeleteTestCase(TransactionTestCase):
+    def setUp(self):
+        now = timezone.now()
+        models.TaskRun.objects.bulk_create([models.TaskRun(
+            task='test_task%d' % (i % 2), date_started=now)
+            for i in range(25)])
+        qs = models.TaskRun.objects.order_by('pk')
+        self.id_list = list(qs.values_list('pk', flat=True))
+
+    def test_delete(self):
+        query = (models.TaskRun.query_model.task == 'test_task0')
+        self.assertEqual(chunked_delete(models.TaskRun, query, 5, 0), 13)
+        qs = models.TaskRun.objects.order_by('pk')
+        self.assertEqual(list(qs.values_list('pk', flat=True)),
+            self.id_list[1::2])
+
+    def test_budget(self):
+        query = (models.TaskRun.query_model.pk > 0)
+        path = 'core.utils.purge.budget_exhausted'
+        with mock.patch(path, side_effect=[False, True]) as budget:
+            self.assertEqual(chunked_delete(models.TaskRun, query, 10, 0),
+                20)
+        self.assertEqual(budget.call_count, 2)
+        # Records get deleted in primary key order
+        qs = models.TaskRun.objects.order_by('pk')
+        self.assertEqual(list(qs.values_list('pk', flat=True)),
+            self.id_list[20:])
+        # The next run continues with the rest
+        self.assertEqual(chunked_delete(models.TaskRun, query, 10, 0), 5)
+        self.assertFalse(models.TaskRun.objects.exists())
@@ -0,0 +1,96 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from ..models import const
+from .. import models
+
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class ConditionalGetTestCase(TransactionTestCase):
+    def setUp(self):
+        sciswarm_scheme = const.person_alias_schemes.SCISWARM
+        person_defaults = dict(title_before='', title_after='', bio='',
+            is_active=True)
+        self.person1 = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', **person_defaults)
+        self.person2 = models.Person.objects.create(username='person2',
+            first_name='Test', last_name='User2', **person_defaults)
+        self.alias1 = models.PersonAlias.objects.create(
+            scheme=sciswarm_scheme, identifier='u/person1',
+            target=self.person1)
+        models.PersonAlias.objects.create(scheme=sciswarm_scheme,
+            identifier='u/person2', target=self.person2)
+        self.paper = models.Paper.objects.create(name='Paper1',
+            abstract='Abstract', contents_theory=True, contents_survey=False,
+            contents_observation=False, contents_experiment=False,
+            contents_metaanalysis=False, year_published=2019,
+            posted_by=self.person2, changed_by=self.person2)
+        models.PaperAuthorReference.objects.create(paper=self.paper,
+            author_alias=self.alias1, confirmed=True)
+        models.FeedEvent.objects.create(person=self.person2, paper=self.paper,
+            event_type=const.user_feed_events.PAPER_POSTED)
+
+    def check_etag(self, url, change):
+        c = Client(HTTP_HOST='sciswarm.test')
+        response = c.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = c.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        change()
+        response = c.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_paper_detail(self):
+        url = reverse('core:paper_detail', kwargs=dict(pk=self.paper.pk))
+
+        def rename_author():
+            self.person1.last_name = 'Renamed'
+            self.person1.save()
+
+        def rename_poster():
+            self.person2.first_name = 'Renamed'
+            self.person2.save()
+
+        def change_bio():
+            self.person1.bio = 'Bio'
+            self.person1.save()
+
+        response = self.check_etag(url, rename_author)
+        self.assertContains(response, 'Renamed, Test')
+        response = self.check_etag(url, rename_poster)
+        self.assertContains(response, 'User2, Renamed')
+
+        # Changes not displayed on the page keep the ETag
+        c = Client(HTTP_HOST='sciswarm.test')
+        etag = c.get(url)['ETag']
+        change_bio()
+        response = c.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_person_event_feed(self):
+        url = reverse('core:person_event_feed',
+            kwargs=dict(username=self.person2.username))
+
+        def rename_paper():
+            self.paper.name = 'Renamed paper'
+            self.paper.save()
+
+        response = self.check_etag(url, rename_paper)
+        self.assertContains(response, 'Renamed paper')
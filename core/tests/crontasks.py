@@ -0,0 +1,88 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from ..models import const
+from ..utils import pgsql, scheduler
+from .. import models
+import datetime
+import psycopg2
+
+class CronSchedulerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.calls = []
+
+    def tearDown(self):
+        for name in list(scheduler._task_registry):
+            if name.startswith('test_'):
+                del scheduler._task_registry[name]
+
+    def register(self, name, func):
+        scheduler.register_task(name, func, datetime.timedelta(hours=1))
+
+    def counting_task(self):
+        self.calls.append(scheduler.budget_exhausted())
+        return 5
+
+    def test_locked_task(self):
+        self.register('test_locked', self.counting_task)
+        conn = psycopg2.connect(**connection.get_connection_params())
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT pg_advisory_lock(%s)',
+                [pgsql._advisory_key('cron:test_locked')])
+            self.assertIsNone(scheduler.run_task('test_locked'))
+        finally:
+            conn.close()
+        self.assertEqual(self.calls, [])
+        self.assertFalse(models.TaskRun.objects.exists())
+        self.assertIn('test_locked', scheduler.due_tasks())
+        # The lock is released with the other session
+        run = scheduler.run_task('test_locked')
+        self.assertEqual(run.status, const.task_run_statuses.DONE)
+
+    def test_partial_run(self):
+        self.register('test_partial', self.counting_task)
+        with override_settings(CRON_TIME_BUDGET=datetime.timedelta(0)):
+            run = scheduler.run_task('test_partial')
+        self.assertEqual(self.calls, [True])
+        self.assertEqual(run.status, const.task_run_statuses.PARTIAL)
+        self.assertEqual(run.items_processed, 5)
+        self.assertIsNotNone(run.date_finished)
+        # Interrupted task runs again on the next pass regardless of interval
+        self.assertIn('test_partial', scheduler.due_tasks())
+        run = scheduler.run_task('test_partial')
+        self.assertEqual(self.calls, [True, False])
+        self.assertEqual(run.status, const.task_run_statuses.DONE)
+        self.assertNotIn('test_partial', scheduler.due_tasks())
+        # Budget applies only while the task runs
+        self.assertFalse(scheduler.budget_exhausted())
+
+    def test_failed_run(self):
+        def failing_task():
+            raise RuntimeError('Test failure')
+
+        self.register('test_failed', failing_task)
+        run = scheduler.run_task('test_failed')
+        run = models.TaskRun.objects.get(pk=run.pk)
+        self.assertEqual(run.status, const.task_run_statuses.FAILED)
+        self.assertIn('Traceback', run.error)
+        self.assertIn('RuntimeError: Test failure', run.error)
+        self.assertIsNone(run.items_processed)
+        # The lock gets released after failure
+        self.assertTrue(pgsql.try_advisory_lock('cron:test_failed'))
+        pgsql.advisory_unlock('cron:test_failed')
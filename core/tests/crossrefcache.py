@@ -0,0 +1,139 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.test import TransactionTestCase
+from django.utils import timezone
+from requests.exceptions import HTTPError
+from unittest import mock
+from ..utils.crossref import crossref_fetch, crossref_fetch_list
+from .. import models
+import datetime
+
+def crossref_work(doi):
+    return {'DOI': doi, 'title': ['Paper ' + doi], 'type': 'journal-article',
+        'issued': {'date-parts': [[2019]]}}
+
+class FakeResponse(object):
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or dict()
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError('HTTP %d' % self.status_code)
+
+class FakeCrossrefSession(object):
+    """Work list endpoint serving works with DOIs from given list"""
+    def __init__(self, doi_list):
+        self.doi_list = doi_list
+        self.queries = []
+
+    def get(self, url, params, timeout):
+        dois = [x[len('doi:'):] for x in params['filter'].split(',')]
+        self.queries.append(dois)
+        items = [crossref_work(x) for x in dois if x in self.doi_list]
+        message = {'items': items, 'total-results': len(items),
+            'next-cursor': 'next'}
+        data = {'status': 'ok', 'message-type': 'work-list',
+            'message': message}
+        return FakeResponse(200, data)
+
+class CrossrefCacheTestCase(TransactionTestCase):
+    def cache_entry(self, doi):
+        return models.CrossrefCacheEntry.objects.filter(doi=doi).first()
+
+    def expire(self, doi, ttl):
+        date = timezone.now() - ttl - datetime.timedelta(seconds=1)
+        models.CrossrefCacheEntry.objects.filter(doi=doi).update(
+            fetch_date=date)
+
+    def test_fetch(self):
+        doi = '10.1000/1'
+        data = {'status': 'ok', 'message-type': 'work',
+            'message': crossref_work(doi)}
+        with mock.patch('core.utils.crossref.requests.get',
+            return_value=FakeResponse(200, data)) as get:
+            # Cache miss
+            self.assertEqual(crossref_fetch(doi)['name'], 'Paper 10.1000/1')
+            self.assertEqual(get.call_count, 1)
+            self.assertEqual(self.cache_entry(doi).get_data()['DOI'], doi)
+            # Cache hit, DOIs are case insensitive
+            self.assertEqual(crossref_fetch('10.1000/1'.upper())['name'],
+                'Paper 10.1000/1')
+            self.assertEqual(get.call_count, 1)
+            # Expired entry
+            self.expire(doi, settings.CROSSREF_CACHE_TTL)
+            crossref_fetch(doi)
+            self.assertEqual(get.call_count, 2)
+            self.assertEqual(models.CrossrefCacheEntry.objects.count(), 1)
+
+    def test_fetch_failed(self):
+        doi = '10.1000/missing'
+        with mock.patch('core.utils.crossref.requests.get',
+            return_value=FakeResponse(404)) as get:
+            with self.assertRaises(HTTPError):
+                crossref_fetch(doi)
+            self.assertTrue(self.cache_entry(doi).failed)
+            # Negative cache hit
+            with self.assertRaises(RuntimeError):
+                crossref_fetch(doi)
+            self.assertEqual(get.call_count, 1)
+            # Failed lookups expire sooner
+            self.expire(doi, settings.CROSSREF_NEGATIVE_CACHE_TTL)
+            with self.assertRaises(HTTPError):
+                crossref_fetch(doi)
+            self.assertEqual(get.call_count, 2)
+
+        # Other errors are not cached
+        models.CrossrefCacheEntry.objects.all().delete()
+        with mock.patch('core.utils.crossref.requests.get',
+            return_value=FakeResponse(500)) as get:
+            with self.assertRaises(HTTPError):
+                crossref_fetch(doi)
+        self.assertIsNone(self.cache_entry(doi))
+
+    def test_fetch_list(self):
+        fresh, expired, failed, missing, new = ['10.1000/{0}'.format(x)
+            for x in ('fresh', 'expired', 'failed', 'missing', 'new')]
+        session = FakeCrossrefSession([fresh, expired, failed, new])
+        with mock.patch('core.utils.crossref.requests.Session',
+            return_value=session):
+            crossref_fetch_list([fresh, expired, failed])
+            self.assertEqual(session.queries, [[fresh, expired, failed]])
+            self.expire(expired, settings.CROSSREF_CACHE_TTL)
+            models.CrossrefCacheEntry.objects.filter(doi=failed).update(
+                failed=True, data=None)
+
+            session.queries = []
+            doi_list = [fresh, expired, failed, missing, new]
+            result = crossref_fetch_list(doi_list, delay=0)
+            # Only expired entries and cache misses are queried
+            self.assertEqual(session.queries, [[expired, missing, new]])
+            self.assertEqual(sorted((x['id'] for x in result)),
+                sorted([fresh, expired, new]))
+            # DOIs missing from the response are cached as failed
+            self.assertTrue(self.cache_entry(missing).failed)
+            self.assertFalse(self.cache_entry(new).failed)
+
+            session.queries = []
+            result = crossref_fetch_list(doi_list, delay=0)
+            self.assertEqual(session.queries, [])
+            self.assertEqual(len(result), 3)
@@ -0,0 +1,140 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import SimpleTestCase
+from unittest import mock
+from ..utils.crossref import CrossrefClient, TokenBucket, _parse_interval
+from .crossrefcache import FakeResponse, crossref_work
+import threading
+import time
+
+class StubSession(object):
+    """Crossref work list endpoint with scripted responses.
+
+    responder(dois, cursor) returns FakeResponse."""
+    def __init__(self, responder):
+        self.responder = responder
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def get(self, url, params, timeout):
+        dois = [x[len('doi:'):] for x in params['filter'].split(',')]
+        with self.lock:
+            self.requests.append((dois, params['cursor']))
+        return self.responder(dois, params['cursor'])
+
+def work_list(items, total=None, next_cursor='next', headers=None):
+    message = {'items': items, 'next-cursor': next_cursor,
+        'total-results': len(items) if total is None else total}
+    data = {'status': 'ok', 'message-type': 'work-list', 'message': message}
+    return FakeResponse(200, data, headers)
+
+class CrossrefClientTestCase(SimpleTestCase):
+    def run_client(self, client, session, batch_list):
+        results = []
+
+        def callback(doi_list, works, failed):
+            results.append((sorted(doi_list), sorted((x['DOI']
+                for x in works)), failed))
+
+        with mock.patch('core.utils.crossref.requests.Session',
+            return_value=session):
+            stats = client.fetch_list(batch_list, callback)
+        return sorted(results), stats
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=50.0)
+        start = time.monotonic()
+        for x in range(6):
+            bucket.acquire()
+        # The first token is available immediately
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+        self.assertEqual(_parse_interval('1s'), 1)
+        self.assertEqual(_parse_interval('500ms'), 0.5)
+        self.assertEqual(_parse_interval('2m'), 120)
+        self.assertIsNone(_parse_interval('soon'))
+
+        # Rate follows response headers
+        headers = {'X-Rate-Limit-Limit': '50', 'X-Rate-Limit-Interval': '1s'}
+        session = StubSession(lambda dois, cursor: work_list([], 0,
+            headers=headers))
+        client = CrossrefClient(max_workers=1, rate=1.0)
+        self.run_client(client, session, [['10.1000/1']])
+        self.assertEqual(client.bucket.rate, 50)
+        self.assertEqual(client.bucket.capacity, 50)
+
+    def test_split_batches(self):
+        bad_list = ['10.1000/bad1', '10.1000/bad2']
+
+        def respond(dois, cursor):
+            if any((x in bad_list for x in dois)):
+                return FakeResponse(400)
+            return work_list([crossref_work(x) for x in dois])
+
+        session = StubSession(respond)
+        client = CrossrefClient(max_workers=4, rate=1000.0)
+        good_list = ['10.1000/{0}'.format(x) for x in range(6)]
+        batch = good_list[:3] + bad_list[:1] + good_list[3:] + bad_list[1:]
+        results, stats = self.run_client(client, session, [batch])
+        failed = [x[0] for x in results if x[2]]
+        self.assertEqual(failed, [bad_list[:1], bad_list[1:]])
+        found = sorted(sum((x[1] for x in results if not x[2]), []))
+        self.assertEqual(found, sorted(good_list))
+        self.assertEqual(stats['failed'], 2)
+        self.assertEqual(stats['dois'], 6)
+        self.assertGreater(stats['retries'], 0)
+
+    @mock.patch('core.utils.crossref.time.sleep')
+    def test_rate_limit_retries(self, sleep):
+        doi = '10.1000/1'
+        responses = [FakeResponse(429, headers={'Retry-After': '3'}),
+            FakeResponse(503), work_list([crossref_work(doi)])]
+        session = StubSession(lambda dois, cursor: responses.pop(0))
+        client = CrossrefClient(max_workers=1, rate=1000.0)
+        results, stats = self.run_client(client, session, [[doi]])
+        self.assertEqual(results, [([doi], [doi], False)])
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['retries'], 2)
+        # Retry-After is respected, exponential backoff otherwise
+        sleep.assert_any_call(3)
+        sleep.assert_any_call(2)
+
+        # Retries are limited
+        session = StubSession(lambda dois, cursor: FakeResponse(503))
+        client = CrossrefClient(max_workers=1, rate=1000.0)
+        results, stats = self.run_client(client, session, [[doi]])
+        self.assertEqual(results, [([doi], [], True)])
+        self.assertEqual(stats['requests'], client.max_retries)
+
+    def test_deep_paging(self):
+        # Each DOI may match multiple works
+        work_list_all = [crossref_work('10.1000/{0}'.format(x))
+            for x in range(5)]
+        cursors = ['*', 'c1', 'c2']
+
+        def respond(dois, cursor):
+            idx = cursors.index(cursor)
+            items = work_list_all[idx * 2:idx * 2 + 2]
+            next_cursor = cursors[idx + 1] if idx + 1 < len(cursors) else 'x'
+            return work_list(items, len(work_list_all), next_cursor)
+
+        session = StubSession(respond)
+        client = CrossrefClient(max_workers=1, rate=1000.0)
+        client.page_size = 2
+        results, stats = self.run_client(client, session, [['10.1000/0']])
+        self.assertEqual(results[0][1], [x['DOI'] for x in work_list_all])
+        self.assertEqual([x[1] for x in session.requests], cursors)
@@ -0,0 +1,137 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from unittest import mock
+from ..models import const
+from ..utils.export import export_all
+from ..utils.keywords import add_paper_keywords
+from .. import models
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class ExportTestCase(TransactionTestCase):
+    def setUp(self):
+        person = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', title_before='',
+            title_after='', bio='', is_active=True)
+        self.user = models.User.objects.create(username='person1',
+            person=person, password='*', language='en', timezone='UTC',
+            is_active=True, is_superuser=False)
+        paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019, posted_by=person, changed_by=person)
+        # Not a multiple of the chunk size
+        self.paper_list = [models.Paper.objects.create(
+            name='Paper "{0}", ščř'.format(x), **paper_defaults)
+            for x in range(5)]
+        for idx, paper in enumerate(self.paper_list):
+            models.PaperAlias.objects.create(target=paper,
+                scheme=const.paper_alias_schemes.DOI,
+                identifier='10.1000/{0}'.format(idx))
+            models.PaperAuthorName.objects.create(paper=paper,
+                author_name='Author, {0}'.format(idx))
+            add_paper_keywords(paper, ['keyword', 'word {0}'.format(idx)])
+        alias = models.PersonAlias.objects.create(
+            scheme=const.person_alias_schemes.SCISWARM,
+            identifier=person.base_identifier, target=person)
+        models.PaperAuthorReference.objects.create(paper=self.paper_list[0],
+            author_alias=alias, confirmed=True)
+        hidden = models.Paper.objects.create(name='Hidden', public=False,
+            **paper_defaults)
+        models.PaperAlias.objects.create(target=hidden,
+            scheme=const.paper_alias_schemes.DOI, identifier='10.1000/x')
+
+    def download(self, dataset, **kwargs):
+        c = Client(HTTP_HOST='sciswarm.test')
+        c.force_login(self.user)
+        url = reverse('core:export_dataset', kwargs=dict(dataset=dataset))
+        response = c.get(url, kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        data = gzip.decompress(b''.join(response.streaming_content))
+        return data.decode('utf-8')
+
+    def check_papers(self, text, paper_list):
+        rows = [json.loads(x) for x in text.splitlines()]
+        self.assertEqual([(x['id'], x['name']) for x in rows],
+            [(x.pk, x.name) for x in paper_list])
+        for idx, row in enumerate(rows):
+            self.assertEqual(row['keywords'], ['keyword',
+                'word {0}'.format(idx)])
+            self.assertEqual(row['author_names'],
+                ['Author, {0}'.format(idx)])
+
+    def check_aliases(self, text, paper_list):
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], ['paper_id', 'scheme', 'identifier'])
+        expected = [[str(x.pk), const.paper_alias_schemes.DOI,
+            '10.1000/{0}'.format(idx)] for idx, x in enumerate(paper_list)]
+        self.assertEqual(rows[1:], expected)
+
+    @mock.patch('core.utils.export.EXPORT_CHUNK_SIZE', 2)
+    def test_streamed_export(self):
+        self.check_papers(self.download('papers'), self.paper_list)
+        self.check_aliases(self.download('aliases'), self.paper_list)
+
+        # Incremental export
+        paper = self.paper_list[0]
+        paper.name = 'Renamed'
+        paper.save()
+        text = self.download('papers', since=paper.last_changed.isoformat())
+        self.check_papers(text, [paper])
+
+        c = Client(HTTP_HOST='sciswarm.test')
+        c.force_login(self.user)
+        url = reverse('core:export_dataset', kwargs=dict(dataset='papers'))
+        response = c.get(url, dict(since='invalid'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_file_export(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path_list = export_all(tmpdir, ['aliases', 'papers', 'authors'])
+            self.assertEqual([os.path.basename(x) for x in path_list],
+                ['aliases.csv.gz', 'papers.jsonl.gz', 'authors.csv.gz'])
+            # CSV datasets are written by COPY
+            with gzip.open(path_list[0], 'rt', encoding='utf-8',
+                newline='') as f:
+                text = f.read()
+            self.check_aliases(text, self.paper_list)
+            # File and streamed output must be identical
+            self.assertEqual(text, self.download('aliases'))
+            with gzip.open(path_list[1], 'rt', encoding='utf-8') as f:
+                text = f.read()
+            self.check_papers(text, self.paper_list)
+            self.assertEqual(text, self.download('papers'))
+            with gzip.open(path_list[2], 'rt', encoding='utf-8',
+                newline='') as f:
+                text = f.read()
+            self.assertEqual(text, self.download('authors'))
+            row = [str(self.paper_list[0].pk),
+                const.person_alias_schemes.SCISWARM, 'u/person1', 'person1',
+                't']
+            self.assertEqual(list(csv.reader(io.StringIO(text)))[1:], [row])
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,102 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import connection, OperationalError
+from django.test import TransactionTestCase
+from ..backends.postgresql_pool import base
+import unittest
+
+POOL_ENGINE = 'core.backends.postgresql_pool'
+
+@unittest.skipUnless(connection.settings_dict['ENGINE'] == POOL_ENGINE,
+    'Connection pool backend not configured')
+class ConnectionPoolTestCase(TransactionTestCase):
+    def setUp(self):
+        # Pools live for the whole process, separate alias for each test
+        self.alias = 'pooltest_' + self._testMethodName
+
+    def tearDown(self):
+        base.close_pools(alias=self.alias)
+
+    def make_wrapper(self, name=None, **options):
+        settings_dict = dict(connection.settings_dict)
+        settings_dict['NAME'] = name or connection.settings_dict['NAME']
+        settings_dict['OPTIONS'] = dict(settings_dict['OPTIONS'], **options)
+        return base.DatabaseWrapper(settings_dict, self.alias)
+
+    def current_database(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT current_database()')
+            return cursor.fetchone()[0]
+
+    def test_pool_per_database(self):
+        test_db = connection.settings_dict['NAME']
+        wrapper = self.make_wrapper()
+        self.assertEqual(self.current_database(wrapper), test_db)
+        wrapper.close()
+        # Changed NAME must not reuse idle connection to the old database
+        wrapper.settings_dict['NAME'] = 'postgres'
+        self.assertEqual(self.current_database(wrapper), 'postgres')
+        wrapper.close()
+        stats = base.pool_stats()
+        self.assertEqual(stats[(self.alias, test_db)]['idle'], 1)
+        self.assertEqual(stats[(self.alias, 'postgres')]['idle'], 1)
+
+    def test_reuse(self):
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+        conn = wrapper.connection
+        wrapper.close()
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, conn)
+        wrapper.close()
+        stats = wrapper.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+
+    def test_checkin_reset(self):
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+        conn = wrapper.connection
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        wrapper.close()
+        self.assertTrue(conn.autocommit)
+        self.assertEqual(conn.get_transaction_status(),
+            base.extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_timeout(self):
+        wrapper1 = self.make_wrapper(pool_size=1, pool_timeout=0.1)
+        wrapper2 = self.make_wrapper(pool_size=1, pool_timeout=0.1)
+        wrapper1.ensure_connection()
+        with self.assertRaises(OperationalError):
+            wrapper2.ensure_connection()
+        wrapper1.close()
+        wrapper2.ensure_connection()
+        wrapper2.close()
+        self.assertEqual(wrapper2.pool.stats()['timeouts'], 1)
+
+    def test_close_pools(self):
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+        conn = wrapper.connection
+        wrapper.close()
+        base.close_pools(database=connection.settings_dict['NAME'])
+        self.assertTrue(conn.closed)
+        stats = wrapper.pool.stats()
+        self.assertEqual(stats['size'], 0)
+        self.assertEqual(stats['idle'], 0)
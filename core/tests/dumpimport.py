@@ -0,0 +1,70 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import TransactionTestCase
+from harvest.dump import import_dump
+from unittest import mock
+from ..models import const
+from .. import models
+import json
+import os
+import shutil
+import tempfile
+
+class DumpImportTestCase(TransactionTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_dump(self, name, id_list):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            for arxiv_id in id_list:
+                data = dict(id=arxiv_id, title='Paper ' + arxiv_id,
+                    abstract='Abstract', categories='cs.DB',
+                    authors_parsed=[['User', 'Test', '']])
+                f.write(json.dumps(data) + '\n')
+        return path
+
+    def imported_ids(self):
+        aliastab = models.PaperAlias.query_model
+        qs = models.PaperAlias.objects.filter(aliastab.target.notnull() &
+            (aliastab.scheme == const.paper_alias_schemes.ARXIV))
+        return sorted(qs.values_list('identifier', flat=True))
+
+    @mock.patch('harvest.dump.PARSE_CHUNK_SIZE', 2)
+    def test_import_dump(self):
+        # Neither the line count nor the chunk count is a multiple
+        # of the batch size
+        id_list1 = ['1901.{0:05d}'.format(x) for x in range(7)]
+        id_list2 = ['1902.{0:05d}'.format(x) for x in range(3)]
+        file_list = [self.write_dump('dump1.json', id_list1),
+            self.write_dump('dump2.json', id_list2)]
+        total = import_dump('arxiv', file_list, workers=2, batch_size=4)
+        self.assertEqual(total, 10)
+        self.assertEqual(self.imported_ids(), id_list1 + id_list2)
+        source = models.PaperImportSource.objects.get(code='arxiv-dump')
+        self.assertEqual(source.import_cursor, 'dump2.json:3')
+
+        # Interrupted import continues after the cursor
+        source.import_cursor = 'dump1.json:5'
+        source.save()
+        models.Paper.objects.all().delete()
+        total = import_dump('arxiv', file_list, workers=1, batch_size=4)
+        self.assertEqual(total, 5)
+        self.assertEqual(self.imported_ids(), id_list1[5:] + id_list2)
@@ -0,0 +1,115 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core import mail as django_mail
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from ..models import const
+from ..utils.digest import send_digests
+from ..utils.mail import deliver_mail
+from .. import models
+import datetime
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    SYSTEM_EMAIL_FROM='no-reply@sciswarm.test')
+class DigestTestCase(TransactionTestCase):
+    def setUp(self):
+        person_defaults = dict(title_before='', title_after='', bio='',
+            is_active=True)
+        user_defaults = dict(password='*', language='en', timezone='UTC',
+            is_active=True, is_superuser=False)
+        self.poster = models.Person.objects.create(username='poster',
+            first_name='Test', last_name='Poster', **person_defaults)
+        models.User.objects.create(username='poster', person=self.poster,
+            email='poster@sciswarm.test', **user_defaults)
+        frequencies = const.digest_frequencies
+        self.users = dict()
+        for name, frequency in (('daily', frequencies.DAILY),
+            ('weekly', frequencies.WEEKLY), ('never', frequencies.NEVER)):
+            person = models.Person.objects.create(username=name,
+                first_name='Test', last_name=name, **person_defaults)
+            self.users[name] = models.User.objects.create(username=name,
+                person=person, email=name + '@sciswarm.test',
+                digest_frequency=frequency, **user_defaults)
+            models.FeedSubscription.objects.create(follower=person,
+                poster=self.poster,
+                subscription_type=const.feed_subscription_types.PAPERS)
+        self.paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019, posted_by=self.poster,
+            changed_by=self.poster)
+
+    def post_paper(self, name):
+        paper = models.Paper.objects.create(name=name, **self.paper_defaults)
+        event = models.FeedEvent.objects.create(person=self.poster,
+            paper=paper, event_type=const.user_feed_events.PAPER_POSTED)
+        # Events newer than the settle delay wait for the next digest
+        event_date = timezone.now() - datetime.timedelta(minutes=10)
+        models.FeedEvent.objects.filter(pk=event.pk).update(
+            event_date=event_date)
+        return event
+
+    def set_last_digest(self, name, days):
+        date = timezone.now() - datetime.timedelta(days=days)
+        models.User.objects.filter(pk=self.users[name].pk).update(
+            last_digest_date=date)
+
+    def send(self):
+        del django_mail.outbox[:]
+        ret = send_digests()
+        deliver_mail()
+        return ret, sorted(((x.to[0], x.body) for x in django_mail.outbox))
+
+    def user(self, name):
+        return models.User.objects.get(pk=self.users[name].pk)
+
+    def test_digest(self):
+        old_event = self.post_paper('Old paper')
+        # New subscribers start from the current event
+        self.assertEqual(self.send(), (0, []))
+        for name in ('daily', 'weekly'):
+            user = self.user(name)
+            self.assertEqual(user.last_digest_event, old_event.pk)
+            self.assertIsNotNone(user.last_digest_date)
+        self.assertIsNone(self.user('never').last_digest_date)
+
+        new_event = self.post_paper('New paper')
+        # Digests are not sent before the period passes
+        self.assertEqual(self.send(), (0, []))
+        self.set_last_digest('daily', 1)
+        self.set_last_digest('weekly', 1)
+        count, mail_list = self.send()
+        self.assertEqual(count, 1)
+        self.assertEqual([x[0] for x in mail_list], ['daily@sciswarm.test'])
+        self.assertIn('New paper', mail_list[0][1])
+        self.assertNotIn('Old paper', mail_list[0][1])
+        self.assertEqual(self.user('daily').last_digest_event, new_event.pk)
+        self.assertEqual(self.user('weekly').last_digest_event, old_event.pk)
+
+        self.set_last_digest('daily', 1)
+        self.set_last_digest('weekly', 7)
+        count, mail_list = self.send()
+        # Daily digest has no new events
+        self.assertEqual(count, 1)
+        self.assertEqual([x[0] for x in mail_list], ['weekly@sciswarm.test'])
+        self.assertIn('New paper', mail_list[0][1])
+        for name in ('daily', 'weekly'):
+            user = self.user(name)
+            self.assertEqual(user.last_digest_event, new_event.pk)
+            self.assertGreater(user.last_digest_date,
+                timezone.now() - datetime.timedelta(hours=1))
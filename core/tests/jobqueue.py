@@ -0,0 +1,130 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+from ..models import const
+from ..utils.jobs import (task, enqueue, claim_jobs, retry_delay, run_job,
+    run_workers)
+from .. import models
+import datetime
+import psycopg2
+
+@task('test_add')
+def _test_add(a, b):
+    return a + b
+
+@task('test_fail', max_attempts=3)
+def _test_fail():
+    raise RuntimeError('Test failure')
+
+class JobQueueTestCase(TransactionTestCase):
+    def reload(self, job):
+        return models.Job.objects.get(pk=job.pk)
+
+    def make_runnable(self, job):
+        models.Job.objects.filter(pk=job.pk).update(
+            run_after=timezone.now() - datetime.timedelta(seconds=1))
+
+    def test_run_job(self):
+        job = enqueue('test_add', a=1, b=2)
+        self.assertEqual(job.max_attempts, settings.JOB_MAX_ATTEMPTS)
+        self.assertEqual([x.pk for x in claim_jobs(5)], [job.pk])
+        # Running jobs are not claimed again
+        self.assertEqual(claim_jobs(5), [])
+        job = self.reload(job)
+        self.assertEqual(job.status, const.job_statuses.RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(run_job(job))
+        job = self.reload(job)
+        self.assertEqual(job.status, const.job_statuses.DONE)
+        self.assertEqual(job.get_result(), 3)
+        self.assertIsNotNone(job.date_finished)
+
+        with self.assertRaises(ValueError):
+            enqueue('test_unknown')
+        # Delayed jobs wait
+        job = enqueue('test_add', delay=datetime.timedelta(hours=1), a=1, b=1)
+        self.assertEqual(claim_jobs(5), [])
+
+    def test_skip_locked(self):
+        job1 = enqueue('test_add', a=1, b=2)
+        job2 = enqueue('test_add', a=2, b=3)
+        other = psycopg2.connect(**connection.get_connection_params())
+        try:
+            cursor = other.cursor()
+            cursor.execute('SELECT id FROM core_job WHERE id = %s FOR UPDATE',
+                [job1.pk])
+            # Locked job is skipped instead of waiting for the lock
+            self.assertEqual([x.pk for x in claim_jobs(5)], [job2.pk])
+            other.rollback()
+        finally:
+            other.close()
+        self.assertEqual([x.pk for x in claim_jobs(5)], [job1.pk])
+
+    def test_retry(self):
+        self.assertEqual(retry_delay(1), settings.JOB_RETRY_DELAY)
+        self.assertEqual(retry_delay(3), settings.JOB_RETRY_DELAY * 4)
+        job = enqueue('test_fail')
+        self.assertEqual(job.max_attempts, 3)
+        for attempt in range(1, 3):
+            job = claim_jobs()[0]
+            self.assertEqual(job.attempts, attempt)
+            start = timezone.now()
+            self.assertFalse(run_job(job))
+            job = self.reload(job)
+            self.assertEqual(job.status, const.job_statuses.PENDING)
+            self.assertIn('Test failure', job.error)
+            # Exponential backoff
+            self.assertGreaterEqual(job.run_after,
+                start + retry_delay(attempt))
+            self.assertLess(job.run_after, start + retry_delay(attempt + 1))
+            self.assertEqual(claim_jobs(), [])
+            self.make_runnable(job)
+
+        # Last attempt
+        job = claim_jobs()[0]
+        self.assertFalse(run_job(job))
+        job = self.reload(job)
+        self.assertEqual(job.status, const.job_statuses.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.make_runnable(job)
+        self.assertEqual(claim_jobs(), [])
+
+    def test_stale_jobs(self):
+        job = enqueue('test_add', a=1, b=2)
+        claim_jobs()
+        self.assertEqual(claim_jobs(), [])
+        # Job of a crashed worker gets reclaimed after timeout
+        started = timezone.now() - settings.JOB_TIMEOUT
+        models.Job.objects.filter(pk=job.pk).update(
+            date_started=started + datetime.timedelta(minutes=1))
+        self.assertEqual(claim_jobs(), [])
+        models.Job.objects.filter(pk=job.pk).update(
+            date_started=started - datetime.timedelta(minutes=1))
+        job_list = claim_jobs()
+        self.assertEqual([x.pk for x in job_list], [job.pk])
+        self.assertEqual(job_list[0].attempts, 2)
+
+    def test_run_workers(self):
+        job_list = [enqueue('test_add', a=x, b=1) for x in range(5)]
+        run_workers(concurrency=2, once=True)
+        for idx, job in enumerate(job_list):
+            job = self.reload(job)
+            self.assertEqual(job.status, const.job_statuses.DONE)
+            self.assertEqual(job.get_result(), idx + 1)
@@ -0,0 +1,117 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from ..forms.auth import LoginForm
+from ..utils.throttle import SlidingWindowThrottle, username_throttle
+from .. import models
+
+_throttle_caches = dict(settings.CACHES, throttle=dict(
+    BACKEND='django.core.cache.backends.locmem.LocMemCache',
+    LOCATION='sciswarm-throttle-test'))
+
+class EvictingCache(object):
+    """Cache which loses keys right after add()"""
+    def add(self, key, value, timeout=None):
+        return False
+
+    def incr(self, key, delta=1):
+        raise ValueError('Key not found')
+
+    def set(self, key, value, timeout=None):
+        self.value = value
+
+    def get(self, key, default=None):
+        return default
+
+class EvictingThrottle(SlidingWindowThrottle):
+    cache = EvictingCache()
+
+@override_settings(THROTTLE_CACHE='throttle', CACHES=_throttle_caches)
+class LoginThrottleTestCase(TransactionTestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+
+    def test_window_rollover(self):
+        throttle = SlidingWindowThrottle('test', 10, 100)
+        start = 1000 * 100
+        for i in range(4):
+            throttle.hit('ident', start + 10)
+        self.assertEqual(throttle.count('ident', start + 90), 4)
+        # Previous bucket counts by its overlap with the sliding window
+        self.assertEqual(throttle.count('ident', start + 125), 3)
+        self.assertEqual(throttle.hit('ident', start + 175), 2)
+        # Other identifiers have separate counters
+        self.assertEqual(throttle.count('other', start + 90), 0)
+        self.assertEqual(throttle.count('ident', start + 300), 0)
+
+    def test_threshold(self):
+        throttle = SlidingWindowThrottle('test', 3, 100)
+        start = 1000 * 100
+        throttle.hit('ident', start)
+        throttle.hit('ident', start)
+        self.assertFalse(throttle.blocked('ident', start))
+        throttle.hit('ident', start)
+        self.assertTrue(throttle.blocked('ident', start))
+        self.assertFalse(throttle.blocked('ident', start + 200))
+
+    def test_missing_key(self):
+        throttle = SlidingWindowThrottle('test', 3, 100)
+        self.assertEqual(throttle.count('ident'), 0)
+        throttle.reset('ident')
+        # Counter evicted between add() and incr() starts over
+        throttle = EvictingThrottle('test', 3, 100)
+        self.assertEqual(throttle.hit('ident', 1000 * 100), 1)
+        self.assertEqual(throttle.cache.value, 1)
+
+    def login(self, username, password, ip_address='192.0.2.1'):
+        request = RequestFactory().post('/login')
+        request.META['REMOTE_ADDR'] = ip_address
+        form = LoginForm(request, data=dict(username=username,
+            password=password))
+        return form.is_valid(), form
+
+    def test_login(self):
+        person = models.Person.objects.create(username='person1',
+            title_before='', first_name='Test', last_name='User1',
+            title_after='', bio='', is_active=True)
+        user = models.User.objects.create(username='person1', person=person,
+            language='en', timezone='UTC', is_active=True,
+            is_superuser=False)
+        user.set_password('password')
+        user.save()
+
+        # Successful login resets the account counter
+        for i in range(5):
+            self.assertFalse(self.login('person1', 'invalid')[0])
+        self.assertEqual(round(username_throttle.count('person1')), 5)
+        self.assertTrue(self.login('person1', 'password')[0])
+        self.assertEqual(username_throttle.count('person1'), 0)
+
+        # Attack from many addresses blocks the account
+        limit = username_throttle.limit
+        for i in range(limit):
+            ip_address = '192.0.2.{0}'.format(i + 10)
+            self.assertFalse(self.login('person1', 'invalid', ip_address)[0])
+        valid, form = self.login('person1', 'password')
+        self.assertFalse(valid)
+        self.assertTrue(form.has_error('__all__', 'temporary_block'))
+        # Only the start of the block gets logged
+        qs = models.BruteLog.objects.all()
+        self.assertEqual(list(qs.values_list('username', flat=True)),
+            ['person1'])
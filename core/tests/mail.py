@@ -0,0 +1,70 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core import mail as django_mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from ..models import const
+from ..utils.mail import send_mail, deliver_mail
+from .. import models
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise IOError('Connection refused')
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    SYSTEM_EMAIL_FROM='no-reply@sciswarm.test')
+class MailTestCase(TransactionTestCase):
+    def test_deliver_mail(self):
+        for i in range(3):
+            send_mail('Subject %d' % i, 'Body', ['user%d@sciswarm.test' % i],
+                html_message='<p>Body</p>')
+        self.assertEqual(len(django_mail.outbox), 0)
+        self.assertEqual(deliver_mail(batch_size=2), 3)
+        self.assertEqual(len(django_mail.outbox), 3)
+        self.assertEqual(sorted(x.subject for x in django_mail.outbox),
+            ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(django_mail.outbox[0].from_email, 'no-reply@sciswarm.test')
+        self.assertEqual(len(django_mail.outbox[0].alternatives), 1)
+        sent = const.mail_statuses.SENT
+        qs = models.MailMessage.objects.all()
+        self.assertTrue(all(x.status == sent for x in qs))
+        # Sent messages are not delivered again
+        self.assertEqual(deliver_mail(), 0)
+        self.assertEqual(len(django_mail.outbox), 3)
+
+    @override_settings(EMAIL_BACKEND='core.tests.mail.FailingEmailBackend',
+        MAIL_MAX_ATTEMPTS=2)
+    def test_deliver_mail_retry(self):
+        obj = send_mail('Subject', 'Body', ['user@sciswarm.test'])
+        self.assertEqual(deliver_mail(), 0)
+        obj.refresh_from_db()
+        self.assertEqual(obj.status, const.mail_statuses.PENDING)
+        self.assertEqual(obj.attempts, 1)
+        self.assertTrue(obj.next_attempt > timezone.now())
+        self.assertIn('Connection refused', obj.error)
+        # Retry is not attempted before the backoff delay expires
+        self.assertEqual(deliver_mail(), 0)
+        obj.refresh_from_db()
+        self.assertEqual(obj.attempts, 1)
+        obj.next_attempt = timezone.now()
+        obj.save(update_fields=['next_attempt'])
+        self.assertEqual(deliver_mail(), 0)
+        obj.refresh_from_db()
+        self.assertEqual(obj.status, const.mail_statuses.FAILED)
+        self.assertEqual(obj.attempts, 2)
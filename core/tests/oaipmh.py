@@ -0,0 +1,126 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from unittest import mock
+from xml.etree import ElementTree
+from .. import models
+
+OAI_NS = '{http://www.openarchives.org/OAI/2.0/}'
+
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class OaiPmhTestCase(TransactionTestCase):
+    def setUp(self):
+        person = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', title_before='',
+            title_after='', bio='', is_active=True)
+        paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019, posted_by=person, changed_by=person)
+        self.paper_list = [models.Paper.objects.create(
+            name='Paper{0}'.format(x), **paper_defaults) for x in range(5)]
+        self.deleted = self.paper_list[2]
+        self.deleted.public = False
+        self.deleted.save()
+        # Deleted paper is now the last one changed
+        self.paper_list.remove(self.deleted)
+        self.paper_list.append(self.deleted)
+
+    def oai_request(self, **kwargs):
+        c = Client(HTTP_HOST='sciswarm.test')
+        response = c.get(reverse('core:oai_pmh'), kwargs)
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        return ElementTree.fromstring(content)
+
+    def identifier(self, paper):
+        return 'oai:sciswarm.test:p/{0}'.format(paper.pk)
+
+    def test_identify(self):
+        root = self.oai_request(verb='Identify')
+        node = root.find(OAI_NS + 'Identify')
+        self.assertIsNotNone(node)
+        self.assertEqual(node.findtext(OAI_NS + 'protocolVersion'), '2.0')
+        self.assertEqual(node.findtext(OAI_NS + 'deletedRecord'), 'transient')
+        self.assertTrue(node.findtext(OAI_NS + 'baseURL').endswith(
+            reverse('core:oai_pmh')))
+
+    def test_errors(self):
+        root = self.oai_request(verb='Invalid')
+        self.assertEqual(root.find(OAI_NS + 'error').get('code'), 'badVerb')
+        root = self.oai_request(verb='ListRecords', resumptionToken='bad')
+        self.assertEqual(root.find(OAI_NS + 'error').get('code'),
+            'badResumptionToken')
+        root = self.oai_request(verb='ListRecords', metadataPrefix='marc')
+        self.assertEqual(root.find(OAI_NS + 'error').get('code'),
+            'cannotDisseminateFormat')
+
+    @mock.patch('core.views.oai.OAI_CHUNK_SIZE', 1)
+    @mock.patch('core.views.oai.OAI_PAGE_SIZE', 2)
+    def test_list_records(self):
+        records = []
+        cursors = []
+        args = dict(metadataPrefix='oai_dc')
+        while True:
+            root = self.oai_request(verb='ListRecords', **args)
+            node = root.find(OAI_NS + 'ListRecords')
+            records.extend(node.findall(OAI_NS + 'record'))
+            token = node.find(OAI_NS + 'resumptionToken')
+            if token is None or not token.text:
+                break
+            cursors.append(token.get('cursor'))
+            args = dict(resumptionToken=token.text)
+        self.assertEqual(cursors, ['0', '2'])
+        # The last page of incomplete list has empty token
+        self.assertEqual(token.get('cursor'), '4')
+        identifiers = [x.findtext(OAI_NS + 'header/' + OAI_NS + 'identifier')
+            for x in records]
+        self.assertEqual(identifiers,
+            [self.identifier(x) for x in self.paper_list])
+
+        # Deleted records have only the header
+        for record in records[:-1]:
+            self.assertIsNone(record.find(OAI_NS + 'header').get('status'))
+            self.assertIsNotNone(record.find(OAI_NS + 'metadata'))
+        self.assertEqual(records[-1].find(OAI_NS + 'header').get('status'),
+            'deleted')
+        self.assertIsNone(records[-1].find(OAI_NS + 'metadata'))
+
+    def test_list_identifiers(self):
+        root = self.oai_request(verb='ListIdentifiers',
+            metadataPrefix='oai_dc')
+        node = root.find(OAI_NS + 'ListIdentifiers')
+        headers = node.findall(OAI_NS + 'header')
+        self.assertEqual([x.findtext(OAI_NS + 'identifier') for x in headers],
+            [self.identifier(x) for x in self.paper_list])
+        self.assertEqual(headers[-1].get('status'), 'deleted')
+        # Complete list fits into one response
+        self.assertIsNone(node.find(OAI_NS + 'resumptionToken'))
+
+    def test_get_record(self):
+        paper = self.paper_list[0]
+        root = self.oai_request(verb='GetRecord', metadataPrefix='oai_dc',
+            identifier=self.identifier(paper))
+        record = root.find(OAI_NS + 'GetRecord/' + OAI_NS + 'record')
+        dc = '{http://purl.org/dc/elements/1.1/}'
+        self.assertEqual(record.findtext('.//' + dc + 'title'), paper.name)
+        self.assertEqual(record.findtext('.//' + dc + 'identifier'),
+            'http://sciswarm.test' + paper.get_absolute_url())
@@ -0,0 +1,106 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from ..models import const
+from ..utils import cache
+from ..utils.harvest import ImportBridge
+from .. import models
+
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class CacheTestCase(TransactionTestCase):
+    def test_person_invalidation(self):
+        sciswarm_scheme = const.person_alias_schemes.SCISWARM
+        person_defaults = dict(title_before='', title_after='', bio='')
+        person1 = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', **person_defaults)
+        person2 = models.Person.objects.create(username='person2',
+            first_name='Test', last_name='User2', **person_defaults)
+        alias1 = models.PersonAlias.objects.create(scheme=sciswarm_scheme,
+            identifier='u/person1', target=person1)
+        alias2 = models.PersonAlias.objects.create_alias(
+            const.person_alias_schemes.EMAIL, 'other@example.com')
+        paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019)
+        paper1 = models.Paper.objects.create(name='Paper1', posted_by=person2,
+            changed_by=person2, **paper_defaults)
+        paper2 = models.Paper.objects.create(name='Paper2', posted_by=person2,
+            changed_by=person2, **paper_defaults)
+        paper3 = models.Paper.objects.create(name='Paper3', posted_by=person2,
+            changed_by=person2, **paper_defaults)
+        models.PaperAuthorReference.objects.create(paper=paper1,
+            author_alias=alias1, confirmed=True)
+        models.PaperAuthorReference.objects.create(paper=paper2,
+            author_alias=alias2, confirmed=None)
+        tag_list = [cache.paper_tag(x.pk) for x in (paper1, paper2, paper3)]
+        tag_list.append(cache.PAPER_LIST_TAG)
+
+        def changed_tags():
+            new = cache.tag_versions(tag_list)
+            ret = [t for t, a, b in zip(tag_list, old, new) if a != b]
+            old[:] = new
+            return ret
+
+        old = cache.tag_versions(tag_list)
+        # Profile changes not displayed on paper pages
+        person1.bio = 'Bio'
+        person1.save()
+        person2.save(update_fields=['bio'])
+        self.assertEqual(changed_tags(), [])
+        # Renamed author
+        person1.last_name = 'Renamed'
+        person1.save()
+        self.assertEqual(changed_tags(), [tag_list[0], tag_list[3]])
+        # Renamed poster
+        person2.first_name = 'Renamed'
+        person2.save(update_fields=['first_name'])
+        self.assertEqual(changed_tags(), tag_list)
+        # Linked author alias
+        alias2.target = person1
+        alias2.save()
+        self.assertEqual(changed_tags(), [tag_list[1], tag_list[3]])
+
+    def test_import_invalidation(self):
+        c = Client(HTTP_HOST='sciswarm.test')
+        url = reverse('core:paper_list')
+        bridge = ImportBridge('test', 'Test', 'Test Bot')
+        paper_data = dict(id='1', name='Imported paper', abstract='Abstract',
+            identifiers=[(const.paper_alias_schemes.DOI, '10.1234/test')],
+            authors=[], author_names=['Doe, John'], keywords=['Test'],
+            bibliography=[], subfields=[])
+
+        # Anonymous paper list is served from cache until it gets
+        # invalidated
+        response = c.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, paper_data['name'])
+        old = cache.tag_versions([cache.PAPER_LIST_TAG])
+        bridge.import_papers('1', [paper_data])
+        self.assertNotEqual(cache.tag_versions([cache.PAPER_LIST_TAG]), old)
+        response = c.get(url)
+        self.assertContains(response, paper_data['name'])
+
+        # Updated papers get invalidated too
+        paper = models.Paper.objects.get()
+        old = cache.tag_versions([cache.paper_tag(paper.pk)])
+        paper_data['identifiers'].append((const.paper_alias_schemes.ARXIV,
+            '1901.00001'))
+        bridge.import_papers('2', [paper_data])
+        self.assertNotEqual(cache.tag_versions([cache.paper_tag(paper.pk)]),
+            old)
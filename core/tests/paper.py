@@ -18,8 +18,12 @@ from django.core.exceptions import NON_FIELD_ERRORS
 from django.http import QueryDict
 from django.test import Client, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from ..forms.paper import PaperSearchForm
 from ..models import const
+from ..utils import autocomplete, keywords
 from .. import models
+import time
 
 @override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
 class PaperTestCase(TransactionTestCase):
@@ -281,3 +285,115 @@ class PaperTestCase(TransactionTestCase):
             self.assertEqual(test_set, event_set)
             self.assertEqual(models.PersonAlias.objects.count(), alias_count)
             self.assertEqual(parobj.count(), par_count)
+
+    def test_keyword_dictionary(self):
+        person_defaults = dict(title_before='', title_after='', bio='')
+        person1 = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', **person_defaults)
+        paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019, posted_by=person1, changed_by=person1)
+        paper1 = models.Paper.objects.create(name='Paper1', **paper_defaults)
+        paper2 = models.Paper.objects.create(name='Paper2', **paper_defaults)
+        field1 = models.ScienceSubfield.objects.create(name='Field1',
+            field=const.science_fields.COMPSCI)
+        kwtab = models.Keyword.query_model
+        freqtab = models.KeywordFrequency.query_model
+
+        def paper_counts():
+            qs = models.Keyword.objects.filter(kwtab.paper_count > 0)
+            return dict(qs.values_list('canonical', 'paper_count'))
+
+        def field_counts():
+            qs = models.KeywordFrequency.objects.filter(
+                freqtab.subfield == field1).select_related('keyword')
+            return dict(((x.keyword.canonical, x.paper_count) for x in qs))
+
+        def search(text):
+            qs = models.Paper.objects.all()
+            form = PaperSearchForm(data=dict(keywords=text), queryset=qs)
+            self.assertTrue(form.is_valid())
+            return sorted((x.name for x in form.queryset))
+
+        keywords.set_paper_keywords(paper1, ['Graph  theory', 'Algebra'])
+        keywords.set_paper_keywords(paper2, ['graph theory', 'Topology'])
+        self.assertEqual(paper_counts(), {'GRAPH THEORY': 2, 'ALGEBRA': 1,
+            'TOPOLOGY': 1})
+        entry = models.Keyword.objects.get(kwtab.canonical == 'GRAPH THEORY')
+        self.assertEqual(entry.name, 'Graph theory')
+        self.assertEqual(search('GRAPH theory'), ['Paper1', 'Paper2'])
+        self.assertEqual(search('graph theory, algebra'), ['Paper1'])
+        self.assertEqual(search('algebra, topology'), [])
+
+        paper1.fields.add(field1)
+        self.assertEqual(field_counts(), {'GRAPH THEORY': 1, 'ALGEBRA': 1})
+        keywords.set_paper_keywords(paper1, ['graph theory', 'Topology'])
+        qs = paper1.paperkeyword_set.all()
+        self.assertEqual(set((x.keyword for x in qs)),
+            set(['graph theory', 'Topology']))
+        self.assertEqual(paper_counts(), {'GRAPH THEORY': 2, 'TOPOLOGY': 2})
+        self.assertEqual(field_counts(), {'GRAPH THEORY': 1, 'TOPOLOGY': 1})
+        field1.paper_set.add(paper2)
+        self.assertEqual(field_counts(), {'GRAPH THEORY': 2, 'TOPOLOGY': 2})
+        paper1.fields.clear()
+        self.assertEqual(field_counts(), {'GRAPH THEORY': 1, 'TOPOLOGY': 1})
+        paper2.delete()
+        self.assertEqual(paper_counts(), {'GRAPH THEORY': 1, 'TOPOLOGY': 1})
+        self.assertEqual(field_counts(), {})
+
+    def test_autocomplete(self):
+        person_defaults = dict(title_before='', title_after='', bio='',
+            is_active=True)
+        person1 = models.Person.objects.create(username='person1',
+            first_name='Jan', last_name='Dvořák', follower_count=1,
+            **person_defaults)
+        person2 = models.Person.objects.create(username='person2',
+            first_name='Jana', last_name='Nováková', follower_count=2,
+            **person_defaults)
+        paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019, posted_by=person1, changed_by=person1)
+        paper1 = models.Paper.objects.create(name='Graph colouring',
+            **paper_defaults)
+        keywords.set_paper_keywords(paper1, ['Graph theory', 'Graphs'])
+        paper2 = models.Paper.objects.create(name='Graph minors',
+            **paper_defaults)
+        keywords.set_paper_keywords(paper2, ['graph theory'])
+
+        test_data = [
+            ('keywords', 'gra', ['Graph theory', 'Graphs']),
+            ('keywords', 'algebra, graphs', ['algebra, Graphs']),
+            ('people', 'jan', ['Jana Nováková', 'Jan Dvořák']),
+            ('people', 'nov', ['Jana Nováková']),
+            ('papers', 'graph m', ['Graph minors']),
+            ('papers', 'minors', []),
+        ]
+
+        # Database fallback
+        with self.settings(AUTOCOMPLETE_MEMORY_SOURCES=()):
+            for source, text, result in test_data:
+                self.assertEqual(autocomplete.autocomplete(source, text),
+                    result)
+
+        # In-memory index, the folded keys also ignore accents. Pretend that
+        # it was just refreshed so that no background refresh gets started.
+        autocomplete._state.last_check = time.monotonic()
+        for name, source in autocomplete.SOURCES.items():
+            index = autocomplete.PrefixIndex(source.load())
+            autocomplete._state.indexes[name] = (index, None, timezone.now())
+        test_data.append(('people', 'dvor', ['Jan Dvořák']))
+        try:
+            for source, text, result in test_data:
+                self.assertEqual(autocomplete.autocomplete(source, text),
+                    result)
+        finally:
+            autocomplete._state.indexes.clear()
+
+        index = autocomplete.PrefixIndex(autocomplete.SOURCES['papers'].load())
+        paper2.name = 'Graph minor theorem'
+        paper2.save()
+        index = autocomplete.SOURCES['papers'].refresh(index,
+            paper2.last_changed)
+        self.assertEqual(index.lookup('graph m', 10), ['Graph minor theorem'])
@@ -0,0 +1,130 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import connection
+from django.db.transaction import atomic
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from harvest.sciswarm import pull_peer
+from unittest import mock
+from ..models import const
+from .. import models
+import json
+import psycopg2
+
+class _PeerResponse(object):
+    def __init__(self, response):
+        self.response = response
+        self.text = response.content.decode('utf-8')
+        self.headers = dict(((k, v) for k, v in response.items()))
+
+    def raise_for_status(self):
+        if self.response.status_code != 200:
+            raise RuntimeError('HTTP %d' % self.response.status_code)
+
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class ChangeFeedTestCase(TransactionTestCase):
+    def setUp(self):
+        self.person = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', title_before='',
+            title_after='', bio='', is_active=True)
+        self.paper1 = self.create_paper('Paper1')
+
+    def create_paper(self, name):
+        return models.Paper.objects.create(name=name, abstract='Abstract',
+            contents_theory=True, contents_survey=False,
+            contents_observation=False, contents_experiment=False,
+            contents_metaanalysis=False, year_published=2019,
+            posted_by=self.person, changed_by=self.person)
+
+    def fetch_changes(self, since):
+        c = Client(HTTP_HOST='sciswarm.test')
+        response = c.get(reverse('core:sync_changes'), dict(since=since))
+        self.assertEqual(response.status_code, 200)
+        record_list = [json.loads(x) for x in
+            response.content.decode('utf-8').splitlines()]
+        papers = dict(((x['id'], x['data']['name']) for x in record_list
+            if x['kind'] == 'paper'))
+        return response['X-Sync-Cursor'], papers
+
+    def paper_url(self, paper):
+        return 'http://sciswarm.test' + paper.get_absolute_url()
+
+    def test_uncommitted_changes(self):
+        cursor, papers = self.fetch_changes('0')
+        self.assertEqual(papers, {self.paper_url(self.paper1): 'Paper1'})
+
+        # Transaction which started writing later commits its changes
+        # with lower sequence numbers than a finished transaction
+        other = psycopg2.connect(**connection.get_connection_params())
+        try:
+            with atomic():
+                cur = connection.cursor()
+                cur.execute('SELECT txid_current()')
+                cur.close()
+                cur = other.cursor()
+                cur.execute('UPDATE core_paper SET name = %s WHERE id = %s',
+                    ['Renamed', self.paper1.pk])
+                cur.close()
+                paper2 = self.create_paper('Paper2')
+            cursor, papers = self.fetch_changes(cursor)
+            self.assertEqual(papers, {self.paper_url(paper2): 'Paper2'})
+            cursor, papers = self.fetch_changes(cursor)
+            self.assertEqual(papers, {})
+            other.commit()
+        finally:
+            other.close()
+        cursor, papers = self.fetch_changes(cursor)
+        self.assertEqual(papers, {self.paper_url(self.paper1): 'Renamed'})
+        cursor, papers = self.fetch_changes(cursor)
+        self.assertEqual(papers, {})
+
+    def test_bad_cursor(self):
+        c = Client(HTTP_HOST='sciswarm.test')
+        response = c.get(reverse('core:sync_changes'), dict(since='1.x'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_pull_peer(self):
+        # This server acts as the remote peer for itself
+        client = Client(HTTP_HOST='sciswarm.test')
+
+        def peer_get(url, params, timeout):
+            path = url[len('http://sciswarm.test'):]
+            return _PeerResponse(client.get(path, params))
+
+        models.PaperAlias.objects.create(target=self.paper1,
+            scheme=const.paper_alias_schemes.DOI, identifier='10.1000/1')
+        with mock.patch('harvest.sciswarm.requests.get', peer_get):
+            pull_peer('test', 'http://sciswarm.test/')
+        # Paper with known DOI gets linked to the remote record
+        self.assertEqual(self.find_remote(self.paper1).pk, self.paper1.pk)
+
+        # Next pull continues from the saved cursor and creates new papers
+        paper2 = self.create_paper('Paper2')
+        with mock.patch('harvest.sciswarm.requests.get', peer_get):
+            pull_peer('test', 'http://sciswarm.test/')
+        copy = self.find_remote(paper2)
+        self.assertNotEqual(copy.pk, paper2.pk)
+        self.assertEqual(copy.name, 'Paper2')
+        self.assertEqual(self.find_remote(self.paper1).pk, self.paper1.pk)
+        source = models.PaperImportSource.objects.get(code='sync-test')
+        self.assertEqual(source.bot_profile_id, copy.posted_by_id)
+
+    def find_remote(self, paper):
+        aliastab = models.PaperAlias.query_model
+        query = ((aliastab.scheme == const.paper_alias_schemes.URL) &
+            (aliastab.identifier == self.paper_url(paper)))
+        return models.PaperAlias.objects.filter(query).get().target
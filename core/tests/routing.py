@@ -0,0 +1,102 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import (Client, RequestFactory, TransactionTestCase,
+    override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest import skipUnless
+from ..utils import sql
+from ..utils.routing import (read_from_replica, primary_pinned,
+    PRIMARY_UNTIL_SESSION_KEY, PRIMARY_UNTIL_COOKIE, REPLICA_DB_ALIAS)
+from .. import models
+
+# Configure DATABASES['replica'] with TEST={'MIRROR': 'default'} to run these
+@skipUnless(REPLICA_DB_ALIAS in settings.DATABASES, 'Replica not configured')
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class RoutingTestCase(TransactionTestCase):
+    multi_db = True
+
+    def test_router(self):
+        self.assertEqual(models.Paper.objects.all().db, DEFAULT_DB_ALIAS)
+        with read_from_replica():
+            self.assertEqual(models.Paper.objects.all().db, REPLICA_DB_ALIAS)
+            # Cached models always come from the primary database
+            self.assertEqual(models.User.objects.all().db, DEFAULT_DB_ALIAS)
+            tab = sql.Table(models.Paper)
+            result = tab.select(tab.pk).execute()
+            self.assertEqual(result.db, REPLICA_DB_ALIAS)
+            # Reads after a write must see it
+            models.Paper.objects.filter(pk=0).update(name='Test')
+            self.assertEqual(models.Paper.objects.all().db, DEFAULT_DB_ALIAS)
+            self.assertEqual(tab.select(tab.pk).execute().db,
+                DEFAULT_DB_ALIAS)
+        self.assertEqual(models.Paper.objects.all().db, DEFAULT_DB_ALIAS)
+
+    def test_primary_stickiness(self):
+        # Client.session would create a session, check only cookies
+        client = Client(HTTP_HOST='sciswarm.test')
+        client.get(reverse('core:paper_list'))
+        self.assertNotIn(PRIMARY_UNTIL_COOKIE, client.cookies)
+        # Anonymous POST without session gets pinned by a signed cookie
+        client.post(reverse('core:login'), dict(username='nobody',
+            password='invalid'))
+        self.assertIn(PRIMARY_UNTIL_COOKIE, client.cookies)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, client.cookies)
+        self.assertFalse(Session.objects.exists())
+        request = RequestFactory().get('/')
+        request.COOKIES = dict(((k, v.value)
+            for k, v in client.cookies.items()))
+        self.assertTrue(primary_pinned(request))
+        request.COOKIES[PRIMARY_UNTIL_COOKIE] = '9999999999.0'
+        self.assertFalse(primary_pinned(request))
+
+        # Logged in users are pinned through the session
+        person = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', title_before='',
+            title_after='', bio='', is_active=True)
+        user = models.User.objects.create(username='person1', person=person,
+            language='en', timezone='UTC', is_active=True,
+            is_superuser=False)
+        client = Client(HTTP_HOST='sciswarm.test')
+        client.force_login(user)
+        self.assertNotIn(PRIMARY_UNTIL_SESSION_KEY, client.session)
+        client.post(reverse('core:paper_list'))
+        self.assertIn(PRIMARY_UNTIL_SESSION_KEY, client.session)
+
+    def test_streamed_response(self):
+        person = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', title_before='',
+            title_after='', bio='', is_active=True)
+        models.Paper.objects.create(name='Paper1', abstract='Abstract',
+            contents_theory=True, contents_survey=False,
+            contents_observation=False, contents_experiment=False,
+            contents_metaanalysis=False, year_published=2019,
+            posted_by=person, changed_by=person)
+        client = Client(HTTP_HOST='sciswarm.test')
+        response = client.get(reverse('core:oai_pmh'),
+            dict(verb='ListRecords', metadataPrefix='oai_dc'))
+        # OAI records fetch related data while the body is generated
+        primary = CaptureQueriesContext(connections[DEFAULT_DB_ALIAS])
+        replica = CaptureQueriesContext(connections[REPLICA_DB_ALIAS])
+        with primary, replica:
+            content = b''.join(response.streaming_content)
+        self.assertIn(b'Paper1', content)
+        self.assertEqual(len(primary), 0)
+        self.assertNotEqual(len(replica), 0)
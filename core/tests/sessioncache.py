@@ -0,0 +1,120 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from ..backends.auth import CachedModelBackend
+from ..backends.session import SessionStore, _touch_queue
+from ..utils.feed import user_feed_token
+from .. import models
+import datetime
+import time
+
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class CachedSessionTestCase(TransactionTestCase):
+    def setUp(self):
+        self.person = models.Person.objects.create(username='person1',
+            title_before='', first_name='Test', last_name='User1',
+            title_after='', bio='', is_active=True)
+        self.user = models.User.objects.create(username='person1',
+            person=self.person, language='en', timezone='UTC',
+            is_active=True, is_superuser=False)
+        self.user.set_password('password')
+        self.user.save()
+
+    def tearDown(self):
+        _touch_queue.flush()
+
+    def request_user(self, client):
+        response = client.get(reverse('core:homepage'))
+        return response.wsgi_request.user
+
+    def login_session(self):
+        session = SessionStore()
+        session[SESSION_KEY] = str(self.user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+    def set_expiry(self, session_key, expire_date):
+        qs = Session.objects.filter(session_key=session_key)
+        qs.update(expire_date=expire_date)
+        # Drop the local copy
+        SessionStore(session_key)._written(session_key)
+
+    def get_expiry(self, session_key):
+        return Session.objects.get(session_key=session_key).expire_date
+
+    def test_logout(self):
+        client = Client(HTTP_HOST='sciswarm.test')
+        self.assertTrue(client.login(username='person1', password='password'))
+        session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertTrue(self.request_user(client).is_authenticated)
+        # Session is cached in process memory now
+        self.assertEqual(SessionStore(session_key).get(SESSION_KEY),
+            str(self.user.pk))
+        client.post(reverse('core:logout'))
+        self.assertIsNone(SessionStore(session_key).get(SESSION_KEY))
+        self.assertFalse(SessionStore().exists(session_key))
+
+    def test_password_change(self):
+        client = Client(HTTP_HOST='sciswarm.test')
+        self.assertTrue(client.login(username='person1', password='password'))
+        self.assertTrue(self.request_user(client).is_authenticated)
+        user = models.User.objects.get(pk=self.user.pk)
+        user.set_password('changed')
+        user.save()
+        # Cached user with the old password hash must not be used
+        self.assertFalse(self.request_user(client).is_authenticated)
+
+    @override_settings(SESSION_TOUCH_FLUSH_INTERVAL=0.2)
+    def test_touch_queue(self):
+        session_key = self.login_session()
+        old_date = (timezone.now() + datetime.timedelta(
+            seconds=settings.SESSION_COOKIE_AGE) -
+            2 * settings.SESSION_REFRESH_INTERVAL)
+        self.set_expiry(session_key, old_date)
+        session = SessionStore(session_key)
+        session.load()
+        session.save()
+        # Expiry update is queued...
+        self.assertEqual(self.get_expiry(session_key), old_date)
+        # ...and written without further requests
+        time.sleep(0.5)
+        self.assertGreater(self.get_expiry(session_key), old_date)
+
+    @override_settings(SESSION_TOUCH_FLUSH_INTERVAL=60)
+    def test_touch_near_expiry(self):
+        session_key = self.login_session()
+        old_date = timezone.now() + datetime.timedelta(seconds=60)
+        self.set_expiry(session_key, old_date)
+        session = SessionStore(session_key)
+        session.load()
+        session.save()
+        # Session would expire before the queue gets flushed
+        self.assertGreater(self.get_expiry(session_key), old_date)
+
+    def test_stale_user(self):
+        backend = CachedModelBackend()
+        self.assertIsNone(backend.get_user(self.user.pk).feed_token)
+        # Token is set by QuerySet.update()
+        token = user_feed_token(self.user)
+        self.assertEqual(backend.get_user(self.user.pk).feed_token, token)
@@ -0,0 +1,173 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from ..models import const
+from ..utils.feed import index_events, user_feed_token
+from .. import models
+import json
+
+@override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
+class SyndicationTestCase(TransactionTestCase):
+    def setUp(self):
+        person_defaults = dict(title_before='', title_after='', bio='',
+            is_active=True)
+        user_defaults = dict(password='*', language='en', timezone='UTC',
+            is_active=True, is_superuser=False)
+        self.person1 = models.Person.objects.create(username='person1',
+            first_name='Test', last_name='User1', **person_defaults)
+        self.user1 = models.User.objects.create(username='person1',
+            person=self.person1, **user_defaults)
+        self.person2 = models.Person.objects.create(username='person2',
+            first_name='Test', last_name='User2', **person_defaults)
+        self.user2 = models.User.objects.create(username='person2',
+            person=self.person2, **user_defaults)
+        for person in (self.person1, self.person2):
+            models.PersonAlias.objects.create(
+                scheme=const.person_alias_schemes.SCISWARM,
+                identifier=person.base_identifier, target=person)
+
+        paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019, posted_by=self.person2,
+            changed_by=self.person2)
+        self.paper1 = models.Paper.objects.create(name='Paper1',
+            **paper_defaults)
+        self.paper2 = models.Paper.objects.create(name='Paper2',
+            **paper_defaults)
+        evtypes = const.user_feed_events
+        self.posted = models.FeedEvent.objects.create(person=self.person2,
+            paper=self.paper1, event_type=evtypes.PAPER_POSTED)
+        self.recommended = models.FeedEvent.objects.create(
+            person=self.person2, paper=self.paper2,
+            event_type=evtypes.PAPER_RECOMMENDATION)
+        index_events([self.posted.pk, self.recommended.pk])
+        models.FeedSubscription.objects.create(follower=self.person1,
+            poster=self.person2,
+            subscription_type=const.feed_subscription_types.PAPERS)
+
+    def timeline_url(self, user, fmt):
+        kwargs = dict(token=user_feed_token(user), format=fmt)
+        return reverse('core:timeline_syndication', kwargs=kwargs)
+
+    def test_feed_token(self):
+        token = user_feed_token(self.user1)
+        self.assertTrue(token)
+        # The token stays the same once generated
+        user = models.User.objects.get(pk=self.user1.pk)
+        self.assertEqual(user.feed_token, token)
+        self.assertEqual(user_feed_token(user), token)
+        self.assertNotEqual(user_feed_token(self.user2), token)
+
+        # The timeline page links to the feed
+        c = Client(HTTP_HOST='sciswarm.test')
+        c.force_login(self.user1)
+        response = c.get(reverse('core:homepage'))
+        self.assertContains(response, self.timeline_url(user, 'atom'))
+
+    def test_timeline_feed(self):
+        # Feed readers have no session, the token authenticates them
+        c = Client(HTTP_HOST='sciswarm.test')
+        response = c.get(self.timeline_url(self.user1, 'atom'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Paper1')
+        # Only events matching the subscription type get delivered
+        self.assertNotContains(response, 'Paper2')
+
+        models.FeedSubscription.objects.create(follower=self.person1,
+            poster=self.person2,
+            subscription_type=const.feed_subscription_types.RECOMMENDATIONS)
+        response = c.get(self.timeline_url(self.user1, 'json'))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([x['id'] for x in data['items']],
+            [str(self.recommended.pk), str(self.posted.pk)])
+
+        url = self.timeline_url(self.user1, 'json')
+        response = c.get(url, dict(since_id=self.posted.pk))
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([x['id'] for x in data['items']],
+            [str(self.recommended.pk)])
+
+        response = c.get(self.timeline_url(self.user1, 'rss'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Paper2')
+
+        # The timeline includes all of the user's own events
+        response = c.get(self.timeline_url(self.user2, 'atom'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Paper1')
+        self.assertContains(response, 'Paper2')
+
+    def test_bad_token(self):
+        c = Client(HTTP_HOST='sciswarm.test')
+        kwargs = dict(token='invalid', format='atom')
+        url = reverse('core:timeline_syndication', kwargs=kwargs)
+        response = c.get(url)
+        self.assertEqual(response.status_code, 404)
+
+        url = self.timeline_url(self.user1, 'atom')
+        self.user1.is_active = False
+        self.user1.save()
+        response = c.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get(self):
+        c = Client(HTTP_HOST='sciswarm.test')
+        url = self.timeline_url(self.user1, 'atom')
+        response = c.get(url)
+        etag = response['ETag']
+        response = c.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        event = models.FeedEvent.objects.create(person=self.person2,
+            paper=self.paper2, event_type=const.user_feed_events.PAPER_POSTED)
+        index_events([event.pk])
+        response = c.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Paper2')
+
+    def test_person_feed(self):
+        c = Client(HTTP_HOST='sciswarm.test')
+        kwargs = dict(username='person2', format='atom')
+        response = c.get(reverse('core:person_syndication', kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Paper1')
+        self.assertContains(response, 'Paper2')
+
+    def test_subfield_feed(self):
+        field = models.ScienceSubfield.objects.create(name='Field1',
+            field=const.science_fields.COMPSCI)
+        self.paper1.fields.add(field)
+        self.paper2.fields.add(field)
+        # Person without user account is inactive
+        person3 = models.Person.objects.create(username='person3',
+            title_before='', first_name='Test', last_name='User3',
+            title_after='', bio='')
+        event = models.FeedEvent.objects.create(person=person3,
+            paper=self.paper2, event_type=const.user_feed_events.PAPER_POSTED)
+        models.FeedEntry.objects.filter(
+            models.FeedEntry.query_model.event == self.posted).delete()
+        index_events([self.posted.pk, event.pk])
+        c = Client(HTTP_HOST='sciswarm.test')
+        url = reverse('core:subfield_syndication',
+            kwargs=dict(pk=field.pk, format='json'))
+        response = c.get(url)
+        self.assertEqual(response.status_code, 200)
+        items = json.loads(response.content.decode('utf-8'))['items']
+        self.assertEqual([x['id'] for x in items], [str(self.posted.pk)])
@@ -15,10 +15,15 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from django.core.exceptions import NON_FIELD_ERRORS
+from django.db.transaction import atomic
 from django.http import QueryDict
 from django.test import Client, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from ..forms.user import PersonSearchForm
 from ..models import const
+from ..utils import follow, suggest
+from ..utils.jobs import run_workers
 from .. import models
 
 @override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=['sciswarm.test'])
@@ -500,6 +505,8 @@ class UserTestCase(TransactionTestCase):
             c.force_login(user)
             response = c.post(url, post_data)
             self.assertRedirects(response, url, fetch_redirect_response=False)
+            # Mass changes are saved by a background job
+            run_workers(concurrency=1, once=True)
             exp_map = dict(zip((x.pk for x in paper_list), exp_status))
             confirmed_set = set((k for k,v in exp_map.items() if v))
             query = (partab.author_alias.target == user.person)
@@ -635,3 +642,187 @@ class UserTestCase(TransactionTestCase):
 
         self.assertFalse(paper6.paperauthorreference_set.exists())
         self.assertEqual(models.FeedEvent.objects.count(), event_count)
+
+    def test_person_active_flag(self):
+        def is_active(person):
+            person.refresh_from_db()
+            return person.is_active
+
+        person = models.Person.objects.create(username='person1',
+            title_before='', first_name='Test', last_name='User1',
+            title_after='', bio='')
+        self.assertFalse(person.is_active)
+        user = models.User.objects.create(username=person.username,
+            person=person, password='*', language='en', timezone='UTC',
+            is_active=True, is_superuser=False, verification_key='key')
+        self.assertFalse(is_active(person))
+        user.verification_key = None
+        user.save(update_fields=['verification_key'])
+        self.assertTrue(is_active(person))
+        self.assertTrue(models.Person.objects.filter_active().exists())
+        user.delete_deadline = timezone.now()
+        user.save()
+        self.assertFalse(is_active(person))
+        self.assertFalse(models.Person.objects.filter_active().exists())
+        user.delete_deadline = None
+        user.save()
+        self.assertTrue(is_active(person))
+        user.delete()
+        self.assertFalse(is_active(person))
+
+    def test_follow_graph(self):
+        person_list = []
+        for i in range(4):
+            person = models.Person.objects.create(username='person%d' % i,
+                title_before='', first_name='Test', last_name='User%d' % i,
+                title_after='', bio='')
+            models.User.objects.create(username=person.username,
+                person=person, password='*', language='en', timezone='UTC',
+                is_active=True, is_superuser=False)
+            models.PersonAlias.objects.create(
+                scheme=const.person_alias_schemes.SCISWARM,
+                identifier=person.base_identifier, target=person)
+            person_list.append(person)
+        poster = person_list[0]
+        papers = const.feed_subscription_types.PAPERS
+        reviews = const.feed_subscription_types.REVIEWS
+        for follower in person_list[1:]:
+            with atomic():
+                follow.set_subscriptions(follower, poster, [papers, reviews])
+        with atomic():
+            follow.set_subscriptions(person_list[1], person_list[2], [papers])
+        poster.refresh_from_db()
+        self.assertEqual(poster.follower_count, 3)
+        self.assertEqual(poster.following_count, 0)
+        person_list[1].refresh_from_db()
+        self.assertEqual(person_list[1].following_count, 2)
+
+        follows = follow.followed_posters(person_list[1].pk)
+        self.assertEqual(follows[papers], set([poster.pk, person_list[2].pk]))
+        self.assertEqual(follows[reviews], set([poster.pk]))
+
+        page, next_key = follow.followers_page(poster.pk, limit=2)
+        self.assertEqual(page, person_list[1:3])
+        self.assertEqual(next_key, person_list[2].pk)
+        page, next_key = follow.followers_page(poster.pk, next_key, limit=2)
+        self.assertEqual(page, person_list[3:])
+        self.assertIsNone(next_key)
+
+        c = Client(HTTP_HOST='sciswarm.test')
+        kwargs = dict(username=poster.username)
+        response = c.get(reverse('core:person_follower_list', kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['object_list']),
+            person_list[1:])
+        kwargs = dict(username=person_list[1].username)
+        response = c.get(reverse('core:person_subscription_list',
+            kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['object_list']),
+            person_list[:3:2])
+
+        # Unsubscribing from all event types removes the follower
+        with atomic():
+            follow.set_subscriptions(person_list[1], poster, [])
+        poster.refresh_from_db()
+        self.assertEqual(poster.follower_count, 2)
+        follows = follow.followed_posters(person_list[1].pk)
+        self.assertEqual(follows[reviews], set())
+
+        # Deactivated accounts are not counted
+        models.User.objects.filter_by_person(person_list[2]).first().delete()
+        poster.refresh_from_db()
+        self.assertEqual(poster.follower_count, 1)
+        self.assertEqual(follow.following_page(person_list[1].pk)[0], [])
+
+    def test_authorship_suggestions(self):
+        email_scheme = const.person_alias_schemes.EMAIL
+        stab = models.AuthorshipSuggestion.query_model
+        person = models.Person.objects.create(username='person1',
+            title_before='', first_name='Martin', last_name='Doucha',
+            title_after='', bio='')
+        self.assertEqual(person.name_key, 'doucha m')
+        user = models.User.objects.create(username=person.username,
+            person=person, password='*', language='en', timezone='UTC',
+            is_active=True, is_superuser=False, email='martin@example.com')
+
+        paper_defaults = dict(abstract='Abstract', contents_theory=True,
+            contents_survey=False, contents_observation=False,
+            contents_experiment=False, contents_metaanalysis=False,
+            year_published=2019, posted_by=person, changed_by=person)
+        paper_list = [models.Paper.objects.create(name='Paper%d' % i,
+            **paper_defaults) for i in range(6)]
+        name_list = ['Doucha, Martin', 'Douchá, M.', 'Doucha, Jan', None,
+            'Martin Doucha', 'Doucha-Novak, Martin']
+        models.PaperAuthorName.objects.bulk_create([
+            models.PaperAuthorName(paper=p, author_name=n)
+            for p, n in zip(paper_list, name_list) if n is not None])
+        alias = models.PersonAlias.objects.create_alias(email_scheme,
+            'Martin@Example.com')
+        models.PaperAuthorReference.objects.create(paper=paper_list[3],
+            author_alias=alias)
+
+        queue = models.PendingSuggestionPaper.objects
+        self.assertEqual(set(queue.values_list('paper_id', flat=True)),
+            set((x.pk for x in paper_list)))
+        suggest.index_pending_papers()
+        # Filling name keys does not queue the papers again
+        self.assertFalse(queue.exists())
+        qs = models.AuthorshipSuggestion.objects.filter(stab.person == person)
+        qs = qs.order_by('-score', 'paper_id')
+        # Names without comma match in the "First Last" order, too
+        self.assertEqual([x.paper_id for x in qs],
+            [paper_list[i].pk for i in (3, 0, 4, 1)])
+        self.assertEqual(qs[0].match_type, const.authorship_match_types.EMAIL)
+
+        # Person refresh finds the same papers
+        self.assertEqual(suggest.refresh_person(person.pk), 4)
+
+        # Claim page lists suggestions, name search finds the missed papers
+        c = Client(HTTP_HOST='sciswarm.test')
+        c.force_login(user)
+        url = reverse('core:mass_claim_authorship')
+        response = c.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([x[0].pk for x in response.context['object_list']],
+            [paper_list[i].pk for i in (3, 0, 4, 1)])
+        response = c.get(url, dict(name='Doucha'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([x[0].pk for x in response.context['object_list']],
+            [paper_list[i].pk for i in (0, 2, 4, 5)])
+
+        # Renamed person no longer matches the author names, reload the active
+        # flag set when the user account got created
+        person.refresh_from_db()
+        person.last_name = 'Novak'
+        person.save()
+        # Person refresh runs in background job, one per person
+        jobtab = models.Job.query_model
+        query = ((jobtab.task == suggest.REFRESH_PERSON_TASK) &
+            (jobtab.status == const.job_statuses.PENDING))
+        self.assertEqual(models.Job.objects.filter(query).count(), 1)
+        self.assertEqual(qs.all().count(), 4)
+        run_workers(concurrency=1, once=True)
+        self.assertEqual([x.paper_id for x in qs.all()], [paper_list[3].pk])
+
+    def test_person_search(self):
+        name_list = [('Martin', 'Doucha'), ('Jan', 'Novak'), ('Jana', 'Dvorak')]
+        for i, (first_name, last_name) in enumerate(name_list):
+            person = models.Person.objects.create(username='person%d' % i,
+                title_before='', first_name=first_name, last_name=last_name,
+                title_after='', bio='')
+            models.User.objects.create(username=person.username,
+                person=person, password='*', language='en', timezone='UTC',
+                is_active=True, is_superuser=False)
+
+        def search(name):
+            qs = models.Person.objects.filter_active()
+            form = PersonSearchForm(data=dict(name=name), queryset=qs)
+            self.assertTrue(form.is_valid())
+            return [x.last_name for x in form.queryset]
+
+        self.assertEqual(search('OUCH'), ['Doucha'])
+        self.assertEqual(search('jan'), ['Novak', 'Dvorak'])
+        self.assertEqual(search('jan dvo'), ['Dvorak'])
+        # Misspelled name
+        self.assertEqual(search('Doucah'), ['Doucha'])
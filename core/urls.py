@@ -16,7 +16,8 @@
 
 from django.conf.urls import include, url
 from django.contrib.auth import views as auth
-from .views import ajax, account, comment, event, main, paper, user
+from .views import (ajax, account, comment, event, export, main, oai, paper,
+    sync, user)
 
 account_patterns = [
     url(r'^login/?\Z', account.login, name='login'),
@@ -58,6 +59,20 @@ account_patterns = [
 ajax_patterns = [
     url(r'^science_fields/?\Z', ajax.science_subfields,
         name='ajax_science_subfields'),
+    url(r'^job/(?P<token>[^/]+)/?\Z', ajax.job_status, name='ajax_job_status'),
+    url(r'^autocomplete/(?P<source>[a-z]+)/?\Z', ajax.autocomplete_values,
+        name='ajax_autocomplete'),
+]
+
+feed_patterns = [
+    url(r'^timeline/(?P<token>[0-9A-Za-z_-]+)\.(?P<format>atom|rss|json)\Z',
+        event.TimelineSyndicationFeed.as_view(), name='timeline_syndication'),
+    url(r'^u/(?P<username>[^/]+)\.(?P<format>atom|rss|json)\Z',
+        event.PersonSyndicationFeed.as_view(), name='person_syndication'),
+    url(r'^field/(?P<pk>[0-9]+)\.(?P<format>atom|rss|json)\Z',
+        event.SubfieldSyndicationFeed.as_view(), name='subfield_syndication'),
+    url(r'^keyword/(?P<keyword>[^/]+)\.(?P<format>atom|rss|json)\Z',
+        event.KeywordSyndicationFeed.as_view(), name='keyword_syndication'),
 ]
 
 person_patterns = [
@@ -90,6 +105,9 @@ paper_patterns = [
     url(r'^new/?\Z', paper.CreatePaperView.as_view(), name='create_paper'),
     url(r'^find_similar/?\Z', paper.FindSimilarPapersView.as_view(),
         name='find_similar_papers'),
+    url(r'^find_similar/(?P<token>[^/]+)/?\Z',
+        paper.FindSimilarPapersResultView.as_view(),
+        name='find_similar_papers_result'),
     url(r'^delete_identifier/(?P<pk>[0-9]+)/?\Z',
         paper.UnlinkPaperAliasView.as_view(), name='unlink_paper_identifier'),
     url(r'^delete_author/(?P<pk>[0-9]+)/?\Z',
@@ -158,7 +176,13 @@ review_patterns = [
 urlpatterns = [
     url(r'^\Z', main.homepage, name='homepage'),
     url(r'^ajax/', include(ajax_patterns)),
+    url(r'^feeds/', include(feed_patterns)),
+    url(r'^oai/?\Z', oai.oai_pmh, name='oai_pmh'),
+    url(r'^sync/changes/?\Z', sync.change_feed, name='sync_changes'),
+    url(r'^export/(?P<dataset>[a-z]+)/?\Z', export.export_dataset,
+        name='export_dataset'),
     url(r'^p/?\Z', paper.PaperListView.as_view(), name='paper_list'),
+    url(r'^u/?\Z', user.PersonListView.as_view(), name='person_list'),
     url(r'^u/', include(person_patterns)),
     url(r'^p/', include(paper_patterns)),
     url(r'^r/', include(review_patterns)),
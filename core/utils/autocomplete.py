@@ -0,0 +1,258 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import aggregates
+from django.utils import timezone
+from .keywords import canonical_keyword
+from .suggest import fold_name
+from .utils import logger
+from . import cache
+from .. import models
+import bisect
+import datetime
+import heapq
+import threading
+import time
+
+# Papers may get committed out of order, recheck changes this far back
+REFRESH_OVERLAP = 300
+
+class PrefixIndex(object):
+    """Immutable sorted array of (key, object ID, weight, value) entries.
+
+    Keys are folded with suggest.fold_name(). Updates build a new index so
+    lookups never need locking.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = sorted(entries)
+        self.keys = [x[0] for x in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, prefix, limit):
+        """Return up to limit values with the highest weight whose key
+        starts with prefix"""
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        hi = min(hi, lo + settings.AUTOCOMPLETE_SCAN_LIMIT)
+        ret = []
+        seen = set()
+        for key, pk, weight, value in sorted(self.entries[lo:hi],
+            key=lambda x: (-x[2], x[0])):
+            if value not in seen:
+                seen.add(value)
+                ret.append(value)
+                if len(ret) >= limit:
+                    break
+        return ret
+
+    def replace(self, id_set, entries):
+        """Return new index without objects in id_set and with new entries"""
+        old = (x for x in self.entries if x[1] not in id_set)
+        ret = PrefixIndex()
+        ret.entries = list(heapq.merge(old, sorted(entries)))
+        ret.keys = [x[0] for x in ret.entries]
+        return ret
+
+class Source(object):
+    """Autocomplete data source.
+
+    Subclasses implement load() which returns all index entries and
+    sql_lookup() for queries while the index is not built yet. Sources
+    with a cache tag get reloaded whenever the tag gets invalidated.
+    """
+    name = None
+    tag = None
+    # Suggest only the part of input after the last separator
+    separator = None
+
+    def load(self):
+        raise NotImplementedError()
+
+    def sql_lookup(self, text, limit):
+        raise NotImplementedError()
+
+    def refresh(self, index, since):
+        """Return updated index or None if full reload is needed"""
+        return None
+
+class KeywordSource(Source):
+    name = 'keywords'
+    tag = cache.KEYWORDS_TAG
+    separator = ','
+
+    def load(self):
+        table = models.Keyword.query_model
+        qs = models.Keyword.objects.filter(table.paper_count > 0)
+        return [(fold_name(n), pk, c, n)
+            for pk, n, c in qs.values_list('pk', 'name', 'paper_count')]
+
+    def sql_lookup(self, text, limit):
+        table = models.Keyword.query_model
+        query = (table.canonical.startswith(canonical_keyword(text)) &
+            (table.paper_count > 0))
+        qs = models.Keyword.objects.filter(query).order_by('-paper_count',
+            'canonical')
+        return list(qs.values_list('name', flat=True)[:limit])
+
+class SubfieldSource(Source):
+    name = 'subfields'
+    tag = cache.SUBFIELDS_TAG
+
+    def load(self):
+        qs = models.ScienceSubfield.objects.values_list('pk', 'name')
+        return [(fold_name(n), pk, 0, n) for pk, n in qs]
+
+    def sql_lookup(self, text, limit):
+        table = models.ScienceSubfield.query_model
+        qs = models.ScienceSubfield.objects.filter(table.name.istartswith(text))
+        return list(qs.order_by('name').values_list('name', flat=True)[:limit])
+
+class PersonSource(Source):
+    name = 'people'
+    tag = cache.PEOPLE_TAG
+
+    def load(self):
+        qs = models.Person.objects.filter(models.Person.query_model.is_active
+            == True).only('pk', 'first_name', 'last_name', 'follower_count')
+        ret = []
+        for item in qs.iterator():
+            value = item.plain_name
+            # Match both "first last" and "last first"
+            for key in set([fold_name(value), fold_name(item.last_name + ' ' +
+                item.first_name)]):
+                ret.append((key, item.pk, item.follower_count, value))
+        return ret
+
+    def sql_lookup(self, text, limit):
+        table = models.Person.query_model
+        query = (table.first_name.istartswith(text) |
+            table.last_name.istartswith(text))
+        query &= (table.is_active == True)
+        qs = models.Person.objects.filter(query).order_by('-follower_count',
+            'last_name', 'first_name')
+        return [x.plain_name for x in qs[:limit]]
+
+class PaperSource(Source):
+    name = 'papers'
+
+    def _entries(self, qs):
+        qs = qs.filter(models.Paper.query_model.public == True)
+        return [(fold_name(n), pk, 0, n)
+            for pk, n in qs.values_list('pk', 'name').iterator()]
+
+    def load(self):
+        return self._entries(models.Paper.objects.all())
+
+    def refresh(self, index, since):
+        table = models.Paper.query_model
+        qs = models.Paper.objects.filter(table.last_changed >= since)
+        id_set = set(qs.values_list('pk', flat=True))
+        if not id_set:
+            return index
+        qs = models.Paper.objects.filter(table.pk.belongs(id_set))
+        return index.replace(id_set, self._entries(qs))
+
+    def sql_lookup(self, text, limit):
+        table = models.Paper.query_model
+        query = (table.name.istartswith(text) & (table.public == True))
+        qs = models.Paper.objects.filter(query).order_by('name')
+        return list(qs.values_list('name', flat=True)[:limit])
+
+SOURCES = dict(((x.name, x) for x in [KeywordSource(), SubfieldSource(),
+    PersonSource(), PaperSource()]))
+
+class _IndexState(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {source name: (PrefixIndex, tag version, build time)}
+        self.indexes = dict()
+        self.last_check = None
+        self.since = None
+        self.worker = None
+
+_state = _IndexState()
+
+def _refresh_indexes():
+    try:
+        now = timezone.now()
+        result = models.Paper.objects.aggregate(
+            last=aggregates.Max(models.Paper.query_model.last_changed.f()))
+        since = result['last'] or now
+        since -= datetime.timedelta(seconds=REFRESH_OVERLAP)
+        sources = [SOURCES[x] for x in settings.AUTOCOMPLETE_MEMORY_SOURCES]
+        tags = [x.tag for x in sources if x.tag is not None]
+        versions = dict(zip(tags, cache.tag_versions(tags)))
+        for source in sources:
+            old = _state.indexes.get(source.name)
+            version = versions.get(source.tag)
+            index = None
+            if (old is not None and old[1] == version and
+                now - old[2] < settings.AUTOCOMPLETE_REBUILD_INTERVAL):
+                if source.tag is not None:
+                    continue
+                index = source.refresh(old[0], _state.since)
+                build_time = old[2]
+            if index is None:
+                index = PrefixIndex(source.load())
+                build_time = now
+            _state.indexes[source.name] = (index, version, build_time)
+        _state.since = since
+    except Exception:
+        logger.exception('Autocomplete index refresh failed')
+    finally:
+        # Database connections are per thread
+        connections.close_all()
+
+def _schedule_refresh():
+    now = time.monotonic()
+    with _state.lock:
+        if (_state.last_check is not None and
+            now - _state.last_check < settings.AUTOCOMPLETE_REFRESH_INTERVAL):
+            return
+        if _state.worker is not None and _state.worker.is_alive():
+            return
+        _state.last_check = now
+        _state.worker = threading.Thread(target=_refresh_indexes, daemon=True)
+        _state.worker.start()
+
+def autocomplete(source_name, text, limit=10):
+    """Return list of suggested values for the last word of text.
+
+    Answers from the per-process prefix index which gets built and
+    refreshed in a background thread. Falls back to database lookup
+    until the index is ready.
+    """
+    source = SOURCES[source_name]
+    head = ''
+    if source.separator is not None:
+        head, sep, text = text.rpartition(source.separator)
+        if sep:
+            head += sep + ' '
+    text = text.strip()
+    if not text:
+        return []
+    if source_name in settings.AUTOCOMPLETE_MEMORY_SOURCES:
+        _schedule_refresh()
+        entry = _state.indexes.get(source_name)
+        if entry is not None:
+            ret = entry[0].lookup(fold_name(text), limit)
+            return [head + x for x in ret]
+    return [head + x for x in source.sql_lookup(text, limit)]
@@ -0,0 +1,161 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone, translation
+from django.utils.encoding import force_bytes
+from collections import OrderedDict
+from .routing import replica_active
+import hashlib
+import threading
+import time
+
+TAG_KEY_PREFIX = 'sciswarm.tag.'
+PAGE_KEY_PREFIX = 'sciswarm.page.'
+
+# Global tags
+PAPER_LIST_TAG = 'paper_list'
+CITATIONS_TAG = 'citations'
+PEOPLE_TAG = 'people'
+KEYWORDS_TAG = 'keywords'
+SUBFIELDS_TAG = 'subfields'
+
+def paper_tag(paper_id):
+    return 'paper:{0}'.format(paper_id)
+
+def user_tag(user_id):
+    return 'user:{0}'.format(user_id)
+
+def session_tag(session_key):
+    return 'session:{0}'.format(session_key)
+
+def follow_tag(person_id):
+    return 'follow:{0}'.format(person_id)
+
+def _new_version():
+    # Evicted tags must never restart from a version that might still be
+    # part of a cached page key
+    return int(time.time() * 1000)
+
+def tag_versions(tag_list):
+    """Return current version numbers of given cache tags"""
+    key_list = [TAG_KEY_PREFIX + x for x in tag_list]
+    data = cache.get_many(key_list)
+    missing = dict(((x, _new_version()) for x in key_list if x not in data))
+    if missing:
+        cache.set_many(missing, None)
+        data.update(missing)
+    return [data[x] for x in key_list]
+
+def tag_version_string(tag_list):
+    return '.'.join((str(x) for x in tag_versions(tag_list)))
+
+def invalidate_tags(*tag_list):
+    for tag in tag_list:
+        key = TAG_KEY_PREFIX + tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+class LocalCache(object):
+    """Per-process LRU cache validated by shared cache tag versions.
+
+    Values are served from process memory for as long as their tag version
+    matches, which costs one shared cache lookup instead of a database query.
+    Invalidate the tag to make all processes reload the value.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, tag):
+        """Return (cached value or None, current tag version). Pass the
+        version to set() after loading the value."""
+        version = tag_versions([tag])[0]
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] != version:
+                return None, version
+            self._data.move_to_end(key)
+            return entry[1], version
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+def invalidate_papers(paper_ids, *extra_tags):
+    tag_list = [paper_tag(x) for x in paper_ids]
+    tag_list.extend(extra_tags)
+    invalidate_tags(*tag_list)
+
+def page_cache_key(request, tag_list):
+    tzname = timezone.get_current_timezone_name()
+    key_data = [request.build_absolute_uri(), translation.get_language(),
+        tzname, tag_version_string(tag_list)]
+    digest = hashlib.md5(force_bytes('\n'.join(key_data))).hexdigest()
+    return PAGE_KEY_PREFIX + digest
+
+class AnonymousPageCacheMixin(object):
+    """Serve identical pages to anonymous users from cache.
+
+    The cached page is invalidated whenever any of the tags returned by
+    get_cache_tags() gets invalidated. Timezone and language are always part
+    of the cache key.
+    """
+    cache_timeout = None
+
+    def get_cache_tags(self):
+        return []
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is None:
+            return settings.PAGE_CACHE_TIMEOUT
+        return self.cache_timeout
+
+    def dispatch(self, request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD') or
+            request.user.is_authenticated):
+            return super(AnonymousPageCacheMixin, self).dispatch(request,
+                *args, **kwargs)
+        key = page_cache_key(request, self.get_cache_tags())
+        response = cache.get(key)
+        if response is not None:
+            return response
+        response = super(AnonymousPageCacheMixin, self).dispatch(request,
+            *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+        timeout = self.get_cache_timeout()
+        # Replica may not have seen the change which invalidated the tags yet
+        if replica_active():
+            timeout = min(timeout, settings.DB_PRIMARY_STICKY_TIME)
+        callback = lambda r: cache.set(key, r, timeout)
+        if hasattr(response, 'render') and callable(response.render):
+            response.add_post_render_callback(callback)
+        else:
+            callback(response)
+        return response
@@ -14,17 +14,52 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from django.conf import settings
 from django.utils import timezone
 from importlib import import_module
+from .crossref import purge_crossref_cache
+from .digest import send_digests
+from .feed import refresh_feed_entries
+from .jobs import purge_jobs
+from .mail import deliver_mail, purge_mail
+from .purge import chunked_delete
+from .scheduler import register_task, run_scheduler
+from .suggest import index_pending_papers
+from .sync import compact_change_log
 from .. import models
+import datetime
+
+# Deleting an account cascades to many related records
+ACCOUNT_DELETE_CHUNK_SIZE = 20
 
 def delete_cancelled_accounts():
     query = (models.User.query_model.delete_deadline < timezone.now())
-    models.User.objects.filter(query).delete()
+    return chunked_delete(models.User, query, ACCOUNT_DELETE_CHUNK_SIZE)
 
-def run_tasks():
-    from django.conf import settings
-    delete_cancelled_accounts()
+def purge_task_runs():
+    table = models.TaskRun.query_model
+    query = (table.date_started < timezone.now() - settings.CRON_HISTORY_TTL)
+    return chunked_delete(models.TaskRun, query)
+
+def register_tasks():
+    minute = datetime.timedelta(minutes=1)
+    hour = datetime.timedelta(hours=1)
+    register_task('delete_cancelled_accounts', delete_cancelled_accounts,
+        hour)
+    register_task('refresh_feed_entries', refresh_feed_entries, 10 * minute)
+    register_task('index_pending_papers', index_pending_papers, 10 * minute)
+    register_task('compact_change_log', compact_change_log, hour)
+    register_task('purge_crossref_cache', purge_crossref_cache, 24 * hour)
+    register_task('purge_jobs', purge_jobs, hour)
+    register_task('send_digests', send_digests, hour)
+    # Fallback for servers which do not run the mail delivery worker
+    register_task('deliver_mail', deliver_mail, minute)
+    register_task('purge_mail', purge_mail, 24 * hour)
+    register_task('purge_task_runs', purge_task_runs, 24 * hour)
     for script in settings.HARVEST_SCRIPTS:
         module = import_module(script)
-        module.harvest()
+        register_task(script, module.harvest, hour)
+
+def run_tasks():
+    register_tasks()
+    run_scheduler()
@@ -1,14 +1,21 @@
+from django.conf import settings
+from django.db.transaction import atomic
 from django.forms import ValidationError
 from django.http import QueryDict
+from django.utils import timezone
 from django.utils.html import strip_tags
 from core.models import const
 from core import models
+from . import pgsql
+from .purge import chunked_delete
 from .validators import (doi_validator, filter_wrapper, validate_paper_alias,
     validate_person_alias)
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from html import unescape
 from urllib.parse import quote
 import re
 import requests
+import threading
 import time
 
 def crossref_import_bridge():
@@ -80,93 +87,266 @@ def crossref_parse_work(data):
     ret['bibliography'] = bibliography
     return ret
 
+def _cache_lookup(doi_list):
+    """Return dict of fresh cached works, failed lookups map to None"""
+    if not doi_list:
+        return dict()
+    table = models.CrossrefCacheEntry.query_model
+    now = timezone.now()
+    valid_query = ((table.failed == False) &
+        (table.fetch_date >= now - settings.CROSSREF_CACHE_TTL))
+    failed_query = ((table.failed == True) &
+        (table.fetch_date >= now - settings.CROSSREF_NEGATIVE_CACHE_TTL))
+    query = table.doi.belongs(doi_list) & (valid_query | failed_query)
+    qs = models.CrossrefCacheEntry.objects.filter(query)
+    return dict(((x.doi, x.get_data()) for x in qs))
+
+def _cache_store(work_list=[], failed_list=[]):
+    max_len = models.CrossrefCacheEntry._meta.get_field('doi').max_length
+    now = timezone.now()
+    obj_map = dict()
+    for doi in failed_list:
+        obj_map[doi] = models.CrossrefCacheEntry(doi=doi, failed=True,
+            fetch_date=now)
+    for work in work_list:
+        try:
+            doi = doi_validator(work['DOI'])
+        except (KeyError, ValidationError):
+            continue
+        obj = models.CrossrefCacheEntry(doi=doi, fetch_date=now)
+        obj.set_data(work)
+        obj_map[doi] = obj
+    obj_map = dict(((k, v) for k, v in obj_map.items() if len(k) <= max_len))
+    if not obj_map:
+        return
+    table = models.CrossrefCacheEntry.query_model
+    with atomic():
+        pgsql.lock_table(models.CrossrefCacheEntry,
+            pgsql.LOCK_SHARE_ROW_EXCLUSIVE)
+        query = table.doi.belongs(list(obj_map))
+        models.CrossrefCacheEntry.objects.filter(query).delete()
+        models.CrossrefCacheEntry.objects.bulk_create(obj_map.values())
+
+def purge_crossref_cache():
+    table = models.CrossrefCacheEntry.query_model
+    ttl = max(settings.CROSSREF_CACHE_TTL,
+        settings.CROSSREF_NEGATIVE_CACHE_TTL)
+    query = (table.fetch_date < timezone.now() - ttl)
+    return chunked_delete(models.CrossrefCacheEntry, query)
+
 def crossref_fetch(doi):
+    doi = doi.lower()
+    cached = _cache_lookup([doi])
+    if doi in cached:
+        if cached[doi] is None:
+            raise RuntimeError('Crossref lookup failed recently')
+        return crossref_parse_work(cached[doi])
     baseurl = 'https://api.crossref.org/works/'
     url = baseurl + quote(doi, safe='')
     response = requests.get(url)
+    if response.status_code == 404:
+        _cache_store(failed_list=[doi])
     response.raise_for_status()
     data = response.json()
     if data['status'] != 'ok' or data['message-type'] != 'work':
         raise RuntimeError('Bad response')
+    _cache_store([data['message']])
     return crossref_parse_work(data['message'])
 
-def _crossref_list_url(doi_list):
-    from django.http import QueryDict
-    baseurl = 'https://api.crossref.org/works?'
-    args = QueryDict(mutable=True)
-    args['filter'] = ','.join(('doi:' + x for x in doi_list))
-    args['rows'] = 1000
-    return baseurl + args.urlencode()
+class TokenBucket(object):
+    """Thread-safe token bucket rate limiter"""
+    def __init__(self, rate, capacity=1):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+
+    def update(self, rate, capacity):
+        with self._lock:
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                    self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def _parse_interval(value):
+    match = re.match(r'^\s*([0-9]+)\s*(ms|s|m|h)?\s*$', value)
+    if match is None:
+        return None
+    mult = dict(ms=0.001, s=1, m=60, h=3600)
+    return int(match.group(1)) * mult[match.group(2) or 's']
+
+class CrossrefClient(object):
+    """Parallel Crossref work list client.
+
+    Request rate follows X-Rate-Limit-* response headers. Failed batches
+    are split in half and both halves are retried concurrently until
+    the invalid DOIs are isolated.
+    """
+    baseurl = 'https://api.crossref.org/works'
+    page_size = 1000
+    max_retries = 5
+
+    def __init__(self, max_workers=4, rate=1.0):
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = dict(requests=0, retries=0, failed=0, dois=0)
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _update_rate(self, headers):
+        limit = headers.get('X-Rate-Limit-Limit')
+        interval = headers.get('X-Rate-Limit-Interval')
+        if not limit or not interval or not limit.isdigit():
+            return
+        seconds = _parse_interval(interval)
+        if seconds:
+            self.bucket.update(int(limit) / seconds, int(limit))
 
-def crossref_fetch_list(doi_list, delay=1):
+    def _get(self, params):
+        for attempt in range(self.max_retries):
+            self.bucket.acquire()
+            self._count('requests')
+            response = self._session().get(self.baseurl, params=params,
+                timeout=60)
+            self._update_rate(response.headers)
+            if response.status_code in (429, 503):
+                self._count('retries')
+                delay = response.headers.get('Retry-After', '')
+                time.sleep(int(delay) if delay.isdigit() else 2 ** attempt)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            if data['status']!='ok' or data['message-type']!='work-list':
+                raise RuntimeError('Bad response')
+            return data['message']
+        raise RuntimeError('Crossref rate limit retries exhausted')
+
+    def fetch_batch(self, doi_list):
+        """Fetch all works for given DOIs, following the result cursor"""
+        params = QueryDict(mutable=True)
+        params['filter'] = ','.join(('doi:' + x for x in doi_list))
+        params['rows'] = self.page_size
+        params['cursor'] = '*'
+        ret = []
+        while True:
+            data = self._get(params)
+            ret.extend(data['items'])
+            total = int(data['total-results'])
+            if not data['items'] or len(ret) >= total:
+                return ret
+            params['cursor'] = data['next-cursor']
+
+    def fetch_list(self, batch_list, callback):
+        """Fetch batches of DOIs in parallel.
+
+        callback(doi_list, work_list, failed) is called in the calling thread
+        for each finished batch.
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            pending = dict(((pool.submit(self.fetch_batch, x), x)
+                for x in batch_list))
+            while pending:
+                done, waiting = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    doi_list = pending.pop(future)
+                    try:
+                        work_list = future.result()
+                    except Exception:
+                        if len(doi_list) > 1:
+                            self._count('retries')
+                            half = len(doi_list) // 2
+                            for part in (doi_list[:half], doi_list[half:]):
+                                tmp = pool.submit(self.fetch_batch, part)
+                                pending[tmp] = part
+                            continue
+                        self._count('failed')
+                        callback(doi_list, [], True)
+                        continue
+                    self._count('dois', len(doi_list))
+                    callback(doi_list, work_list, False)
+        self.stats['time'] = time.monotonic() - start
+        return self.stats
+
+def _make_batches(doi_list, batch_size=128, max_url_length=3500):
+    """Split DOI list into batches fitting into the filter URL"""
+    ret = []
+    batch = []
+    url_length = 0
+    for doi in doi_list:
+        size = len(quote('doi:%s,' % doi))
+        if batch and (len(batch) >= batch_size or
+            url_length + size > max_url_length):
+            ret.append(batch)
+            batch = []
+            url_length = 0
+        batch.append(doi)
+        url_length += size
+    if batch:
+        ret.append(batch)
+    return ret
+
+def crossref_fetch_list(doi_list, delay=1, max_workers=4):
     from .harvest import harvest_logger
     check_alias = filter_wrapper(doi_validator)
 
     # Basic input validation
-    doi_list = [x for x in doi_list if check_alias(x)]
+    doi_list = [x.lower() for x in doi_list if check_alias(x)]
+    # Only cache misses are queried
+    cached = _cache_lookup(doi_list)
+    ret = [crossref_parse_work(x) for x in cached.values() if x is not None]
+    doi_list = [x for x in doi_list if x not in cached]
     bad_dois = [x for x in doi_list if ',' in x]
     doi_list = [x for x in doi_list if ',' not in x]
-    size_list = [len(quote('doi:%s,' % x)) for x in doi_list]
-    batch_size = 128
-    max_url_length = 3500
-    pos = 0
-    ret = []
 
-    # Run batch queries
-    while pos < len(doi_list):
-        # Find how many DOIs will fit into the URL
-        arg_count = 1
-        url_length = size_list[pos]
-        while arg_count < batch_size and pos + arg_count < len(size_list):
-            tmp = size_list[pos + arg_count]
-            if url_length + tmp > max_url_length:
-                break
-            arg_count += 1
-            url_length += tmp
-
-        # Run the query
-        while True:
-            data = None
-            batch_list = doi_list[pos:pos+arg_count]
-            url = _crossref_list_url(batch_list)
-            if delay:
-                time.sleep(delay)
-            try:
-                response = requests.get(url)
-                response.raise_for_status()
-                data = response.json()
-                if data['status']!='ok' or data['message-type']!='work-list':
-                    raise RuntimeError('Bad response')
-                break
-            except:
-                # Bisect the DOI list to find and skip the invalid DOI
-                if arg_count > 1:
-                    arg_count = arg_count // 2
-                    continue
-                else:
-                    data = None
-                    pos += len(batch_list)
-                    log_msg = 'Crossref query returned error. DOIs: %(doi)s'
-                    kwargs = dict(doi=str(batch_list))
-                    harvest_logger.warning(log_msg, kwargs, exc_info=True)
-                    break
-
-        # Process the response
-        if data is not None:
-            total = int(data['message']['total-results'])
-            work_list = data['message']['items']
-            if total > len(work_list):
-                log_msg = "Crossref response didn't fit into one page: %(url)s"
-                kwargs = dict(count=batch_count, url=url)
-                harvest_logger.warning(log_msg, kwargs)
-            ret.extend((crossref_parse_work(x) for x in work_list))
-            pos += len(batch_list)
+    def store_batch(batch_list, work_list, failed):
+        if failed:
+            log_msg = 'Crossref query returned error. DOIs: %(doi)s'
+            kwargs = dict(doi=str(batch_list))
+            harvest_logger.warning(log_msg, kwargs)
+            _cache_store(failed_list=batch_list)
+            return
+        # DOIs missing from the response do not exist
+        found = set((x['DOI'].lower() for x in work_list))
+        _cache_store(work_list, [x for x in batch_list if x not in found])
+        ret.extend((crossref_parse_work(x) for x in work_list))
+
+    # Initial rate is replaced by X-Rate-Limit-* headers of the first response
+    client = CrossrefClient(max_workers, 1.0 / delay if delay else 50.0)
+    stats = client.fetch_list(_make_batches(doi_list), store_batch)
+    if doi_list:
+        elapsed = max(stats['time'], 0.001)
+        log_msg = 'Crossref: %(dois)d DOIs in %(time).1fs (%(speed).1f DOIs/s), %(requests)d requests, retry rate %(retry).1f%%, %(failed)d failed DOIs'
+        kwargs = dict(stats, speed=stats['dois'] / elapsed,
+            retry=100.0 * stats['retries'] / max(stats['requests'], 1))
+        harvest_logger.info(log_msg, kwargs)
 
     # DOIs containing comma could result in invalid filter query,
     # fetch them individually
     for doi in bad_dois:
-        if delay:
-            time.sleep(delay)
+        client.bucket.acquire()
         try:
             ret.append(crossref_fetch(doi))
         except:
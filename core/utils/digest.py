@@ -0,0 +1,138 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from django.db.models import aggregates
+from django.db.transaction import atomic, on_commit
+from django.utils import timezone, translation
+from django.utils.translation import ugettext as _
+from ..models import const
+from .cache import invalidate_tags, user_tag
+from .feed import subscription_match
+from .html import absolute_url
+from .mail import build_mail, render_template
+from .utils import fold_or, make_chunks
+from . import sql
+from .. import models
+import datetime
+
+# Number of users processed by one event query
+DIGEST_USER_BATCH = 500
+# Maximum number of events listed in one digest
+DIGEST_MAX_EVENTS = 100
+# Events may get committed out of order, skip the newest ones until the next
+# digest
+DIGEST_SETTLE_DELAY = datetime.timedelta(minutes=5)
+# Tolerance for cron run time jitter
+DIGEST_SLACK = datetime.timedelta(hours=1)
+
+def digest_cursor(now):
+    """Return ID of the newest event which can be included in digests"""
+    table = models.FeedEvent.query_model
+    query = (table.event_date < now - DIGEST_SETTLE_DELAY)
+    qs = models.FeedEvent.objects.filter(query)
+    return qs.aggregate(last=aggregates.Max(table.pk.f()))['last'] or 0
+
+def due_users(now):
+    """Return IDs of users who should receive digest now"""
+    table = models.User.query_model
+    cond_list = []
+    for days in const.digest_frequencies:
+        if days == const.digest_frequencies.NEVER:
+            continue
+        deadline = now - datetime.timedelta(days=days) + DIGEST_SLACK
+        cond_list.append((table.digest_frequency == days) &
+            (table.last_digest_date.isnull() |
+            (table.last_digest_date <= deadline)))
+    qs = models.User.objects.filter_active().filter(fold_or(cond_list))
+    qs = qs.order_by('pk')
+    return list(qs.values_list('pk', flat=True))
+
+def digest_events(user_list, cursor):
+    """Return {user ID: [event IDs]} of new timeline events for all given
+    users in a single query"""
+    evtab = sql.Table(models.FeedEvent)
+    stab = sql.Table(models.FeedSubscription)
+    utab = sql.Table(models.User)
+    postertab = sql.Table(models.Person)
+    papertab = sql.Table(models.Paper)
+    join = evtab.inner_join(stab, subscription_match(evtab, stab))
+    join = join.inner_join(utab, (utab.person_id == stab.follower_id))
+    join = join.inner_join(postertab, (postertab.pk == evtab.person_id))
+    join = join.inner_join(papertab, (papertab.pk == evtab.paper_id))
+    user_ids = [x.pk for x in user_list if x.last_digest_event is not None]
+    where = (utab.pk.belongs(user_ids) &
+        (evtab.pk > utab.last_digest_event) & (evtab.pk <= cursor) &
+        (evtab.person_id != stab.follower_id) & (papertab.public == True) &
+        (postertab.is_active == True))
+    alias = dict(user_id=utab.pk, event_id=evtab.pk)
+    query = join.select(alias=alias, where=where, order_by=[evtab.pk.asc()])
+    ret = dict()
+    for row in query.execute():
+        ret.setdefault(row['user_id'], []).append(row['event_id'])
+    return ret
+
+def group_events(event_list):
+    """Group events by poster and paper in order of first appearance"""
+    posters = OrderedDict()
+    for event in event_list:
+        papers = posters.setdefault(event.person_id,
+            (event.person, OrderedDict()))[1]
+        papers.setdefault(event.paper_id, (event.paper, []))[1].append(event)
+    return [(person, list(papers.values()))
+        for person, papers in posters.values()]
+
+def render_digest(user, event_list):
+    """Render digest e-mail, returns unsaved outbox message"""
+    skipped = max(len(event_list) - DIGEST_MAX_EVENTS, 0)
+    event_list = event_list[skipped:]
+    with translation.override(user.language), timezone.override(user.timezone):
+        subject = _('New activity of people you follow on Sciswarm')
+        context = dict(subject=subject, user=user, skipped=skipped,
+            groups=group_events(event_list), site_url=absolute_url(''))
+        template = 'core/email/digest'
+        text = render_template(template + '.txt', context).strip()
+        html = render_template(template + '.html', context)
+    return build_mail(subject, text, [user.email], html_message=html)
+
+def _send_batch(user_ids, cursor, now):
+    user_list = list(models.User.objects.in_bulk(user_ids).values())
+    event_map = digest_events(user_list, cursor)
+    id_list = [y for x in event_map.values() for y in x]
+    qs = models.FeedEvent.objects.select_related('person', 'paper')
+    events = qs.in_bulk(id_list)
+    mail_list = [render_digest(user, [events[x] for x in event_map[user.pk]])
+        for user in user_list if event_map.get(user.pk)]
+    table = models.User.query_model
+    with atomic():
+        models.MailMessage.objects.bulk_create(mail_list)
+        # Users who just enabled digests start from the current cursor
+        qs = models.User.objects.filter(table.pk.belongs(user_ids))
+        qs.update(last_digest_event=cursor, last_digest_date=now)
+        # QuerySet.update() sends no signals
+        tags = [user_tag(x) for x in user_ids]
+        on_commit(lambda: invalidate_tags(*tags))
+    return len(mail_list)
+
+def send_digests():
+    """Queue digest e-mails for all users who are due. Returns number of
+    e-mails queued."""
+    now = timezone.now()
+    cursor = digest_cursor(now)
+    ret = 0
+    for chunk in make_chunks(due_users(now), DIGEST_USER_BATCH):
+        ret += _send_batch(chunk, cursor, now)
+    return ret
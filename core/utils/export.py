@@ -0,0 +1,179 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from . import pgsql
+from .. import models
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import zlib
+
+# Rows per chunk of streamed output
+EXPORT_CHUNK_SIZE = 2000
+
+_paper_columns = ['id', 'name', 'abstract', 'year_published', 'cite_as',
+    'date_posted', 'last_changed', 'contents_theory', 'contents_survey',
+    'contents_observation', 'contents_experiment', 'contents_metaanalysis',
+    'keywords', 'subfields', 'author_names']
+
+_papers_sql = '''SELECT p.id, p.name, p.abstract, p.year_published, p.cite_as,
+    p.date_posted, p.last_changed, p.contents_theory, p.contents_survey,
+    p.contents_observation, p.contents_experiment, p.contents_metaanalysis,
+    ARRAY(SELECT k.keyword FROM {keyword} k WHERE k.paper_id = p.id
+        ORDER BY k.keyword) AS keywords,
+    ARRAY(SELECT f.sciencesubfield_id FROM {fields} f
+        WHERE f.paper_id = p.id ORDER BY f.sciencesubfield_id) AS subfields,
+    ARRAY(SELECT n.author_name FROM {author_name} n WHERE n.paper_id = p.id
+        ORDER BY n.id) AS author_names
+FROM {paper} p WHERE {where} ORDER BY p.id'''
+
+_aliases_sql = '''SELECT a.target_id AS paper_id, a.scheme, a.identifier
+FROM {alias} a INNER JOIN {paper} p ON p.id = a.target_id
+WHERE {where} ORDER BY a.target_id, a.id'''
+
+_authors_sql = '''SELECT r.paper_id, pa.scheme, pa.identifier,
+    pe.username, r.confirmed
+FROM {author_ref} r INNER JOIN {paper} p ON p.id = r.paper_id
+    INNER JOIN {person_alias} pa ON pa.id = r.author_alias_id
+    LEFT JOIN {person} pe ON pe.id = pa.target_id
+WHERE {where} AND (r.confirmed IS NULL OR r.confirmed)
+ORDER BY r.paper_id, r.id'''
+
+# Citation graph edge list, cited_id is empty for unresolved aliases
+_citations_sql = '''SELECT b.paper_id AS citing_id,
+    CASE WHEN t.public THEN a.target_id END AS cited_id, a.scheme,
+    a.identifier
+FROM {bibliography} b INNER JOIN {paper} p ON p.id = b.paper_id
+    INNER JOIN {alias} a ON a.id = b.paperalias_id
+    LEFT JOIN {paper} t ON t.id = a.target_id
+WHERE {where} ORDER BY b.paper_id, b.id'''
+
+_subfields_sql = '''SELECT s.id, s.field, s.name FROM {subfield} s
+WHERE {where} ORDER BY s.id'''
+
+# name: (format, SQL template, column names, supports incremental export)
+DATASETS = {
+    'papers': ('jsonl', _papers_sql, _paper_columns, True),
+    'aliases': ('csv', _aliases_sql, ['paper_id', 'scheme', 'identifier'],
+        True),
+    'authors': ('csv', _authors_sql, ['paper_id', 'scheme', 'identifier',
+        'username', 'confirmed'], True),
+    'citations': ('csv', _citations_sql, ['citing_id', 'cited_id', 'scheme',
+        'identifier'], True),
+    'subfields': ('csv', _subfields_sql, ['id', 'field', 'name'], False),
+}
+
+def parse_since(value):
+    """Parse date or datetime argument, naive values use current timezone"""
+    ret = parse_datetime(value)
+    if ret is None:
+        date = parse_date(value)
+        if date is None:
+            return None
+        ret = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(ret):
+        ret = timezone.make_aware(ret)
+    return ret
+
+def _table_names():
+    paper_meta = models.Paper._meta
+    model_map = dict(paper=models.Paper, alias=models.PaperAlias,
+        keyword=models.PaperKeyword, author_name=models.PaperAuthorName,
+        author_ref=models.PaperAuthorReference,
+        person_alias=models.PersonAlias, person=models.Person,
+        subfield=models.ScienceSubfield,
+        fields=paper_meta.get_field('fields').remote_field.through,
+        bibliography=paper_meta.get_field('bibliography').remote_field.through)
+    return dict(((k, v._meta.db_table) for k, v in model_map.items()))
+
+def dataset_filename(name):
+    return '{0}.{1}.gz'.format(name, DATASETS[name][0])
+
+def dataset_query(name, since=None):
+    """Return SQL query and params for given dataset.
+
+    Incremental export includes only rows of papers changed since
+    the given date. Papers which were taken down are never exported.
+    """
+    fmt, sql_tpl, columns, incremental = DATASETS[name]
+    where = 'p.public' if incremental else 'TRUE'
+    params = dict()
+    if incremental and since is not None:
+        where += ' AND p.last_changed >= %(since)s'
+        params['since'] = since
+    return sql_tpl.format(where=where, **_table_names()), params
+
+_copy_bool = {True: 't', False: 'f'}
+
+def _text_chunks(name, since=None):
+    fmt, sql_tpl, columns, incremental = DATASETS[name]
+    sql, params = dataset_query(name, since)
+    rows = pgsql.server_cursor(sql, params, EXPORT_CHUNK_SIZE)
+    buf = io.StringIO()
+    # Same output as COPY in export_dataset()
+    writer = csv.writer(buf, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(columns)
+    for idx, row in enumerate(rows, 1):
+        if fmt == 'jsonl':
+            data = dict(zip(columns, row))
+            buf.write(json.dumps(data, cls=DjangoJSONEncoder) + '\n')
+        else:
+            writer.writerow([_copy_bool[x] if isinstance(x, bool) else x
+                for x in row])
+        if idx % EXPORT_CHUNK_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def compressed_stream(name, since=None):
+    """Generate gzip-compressed dataset in constant memory"""
+    # wbits=31 produces gzip container instead of raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in _text_chunks(name, since):
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_dataset(name, path, since=None):
+    """Write gzip-compressed dataset into file.
+
+    CSV datasets are written directly by PostgreSQL COPY.
+    """
+    fmt = DATASETS[name][0]
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            sql, params = dataset_query(name, since)
+            pgsql.copy_to(f, sql, params)
+            return
+        for chunk in _text_chunks(name, since):
+            f.write(chunk)
+
+def export_all(directory, datasets=None, since=None):
+    ret = []
+    for name in datasets or sorted(DATASETS):
+        path = os.path.join(directory, dataset_filename(name))
+        export_dataset(name, path, since)
+        ret.append(path)
+    return ret
@@ -109,6 +109,14 @@ class StringQueryMixin(object):
     def tsquery(self, query, conf='simple'):
         return self._query(tsquery=(conf, query))
 
+    # Trigram matching requires the pg_trgm extension
+    def trigram_similar(self, other):
+        return self._query(trigram_similar=other)
+
+    def similarity(self, other):
+        return models.Func(self.f(), models.Value(other),
+            function='similarity', output_field=models.FloatField())
+
 class NumericQueryMixin(object):
     def __add__(self, other):
         return self.f() + other
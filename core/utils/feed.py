@@ -0,0 +1,177 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db.models import aggregates
+from django.db.transaction import atomic, on_commit
+from ..models import const
+from .cache import invalidate_tags, user_tag
+from .keywords import canonical_keyword
+from .utils import fold_or, generate_token, list_map, make_chunks
+from . import pgsql
+from .. import models
+
+# Number of latest events rechecked on refresh. Events may get committed
+# out of order so the highest indexed event ID is not a reliable cursor.
+REFRESH_WINDOW = 1000
+INDEX_BATCH_SIZE = 1000
+
+# Event types delivered to followers for each subscription type
+subscription_event_types = {
+    const.feed_subscription_types.PAPERS: [
+        const.user_feed_events.PAPER_POSTED,
+        const.user_feed_events.AUTHORSHIP_CONFIRMED],
+    const.feed_subscription_types.REVIEWS: [
+        const.user_feed_events.PAPER_REVIEW],
+    const.feed_subscription_types.RECOMMENDATIONS: [
+        const.user_feed_events.PAPER_RECOMMENDATION],
+}
+
+def subscription_match(evtab, stab):
+    """SQL join condition of FeedEvent and matching FeedSubscription table"""
+    cond_list = [((stab.subscription_type == subtype) &
+        evtab.event_type.belongs(events))
+        for subtype, events in subscription_event_types.items()]
+    return (evtab.person_id == stab.poster_id) & fold_or(cond_list)
+
+def person_channel(person_id, event_type):
+    return 'person:{0}:{1}'.format(person_id, event_type)
+
+def person_channels(person_id, event_types=None):
+    if event_types is None:
+        event_types = const.user_feed_events.keys()
+    return [person_channel(person_id, x) for x in event_types]
+
+def timeline_channels(person_id):
+    """Channels of the person's own events and all their subscriptions"""
+    stab = models.FeedSubscription.query_model
+    query = ((stab.follower.pk == person_id) & (stab.poster.is_active == True))
+    qs = models.FeedSubscription.objects.filter(query)
+    ret = person_channels(person_id)
+    for poster_id, subtype in qs.values_list('poster_id',
+        'subscription_type'):
+        ret.extend(person_channels(poster_id,
+            subscription_event_types.get(subtype, [])))
+    return ret
+
+def user_feed_token(user):
+    """Return secret token of the user's timeline feed URL.
+
+    Feed readers cannot log in so the token authenticates them instead.
+    It gets generated on first use."""
+    if user.feed_token is None:
+        token = generate_token(24)
+        table = models.User.query_model
+        query = ((table.pk == user.pk) & table.feed_token.isnull())
+        if models.User.objects.filter(query).update(feed_token=token):
+            user.feed_token = token
+            # QuerySet.update() sends no signals
+            tag = user_tag(user.pk)
+            on_commit(lambda: invalidate_tags(tag))
+        else:
+            user.refresh_from_db(fields=['feed_token'])
+    return user.feed_token
+
+def subfield_channel(subfield_id):
+    return 'field:{0}'.format(subfield_id)
+
+def keyword_channel(keyword):
+    return 'keyword:' + canonical_keyword(keyword)
+
+def index_events(event_ids):
+    """Create feed entries for given events unless they already exist"""
+    if not event_ids:
+        return
+    evtab = models.FeedEvent.query_model
+    enttab = models.FeedEntry.query_model
+    fieldtab = models.Paper.query_model.fields
+    kwtab = models.PaperKeyword.query_model
+    posted_type = const.user_feed_events.PAPER_POSTED
+    with atomic():
+        pgsql.lock_table(models.FeedEntry, pgsql.LOCK_SHARE_ROW_EXCLUSIVE)
+        qs = models.FeedEntry.objects.filter(enttab.event.belongs(event_ids))
+        done = set(qs.values_list('event_id', flat=True))
+        query = evtab.pk.belongs([x for x in event_ids if x not in done])
+        qs = models.FeedEvent.objects.filter(query)
+        event_list = list(qs.values_list('pk', 'person_id', 'paper_id',
+            'event_type'))
+        paper_ids = [x[2] for x in event_list if x[3] == posted_type]
+        field_map = dict()
+        keyword_map = dict()
+        if paper_ids:
+            query = models.Paper.query_model.pk.belongs(paper_ids)
+            qs = models.Paper.objects.filter(query & fieldtab.notnull())
+            field_map = list_map(qs.values_list('pk', 'fields'))
+            qs = models.PaperKeyword.objects.filter(kwtab.paper.belongs(
+                paper_ids))
+            keyword_map = list_map(qs.values_list('paper_id', 'keyword'))
+
+        create_list = []
+        for pk, person_id, paper_id, event_type in event_list:
+            channels = set([person_channel(person_id, event_type)])
+            if event_type == posted_type:
+                channels.update((subfield_channel(x)
+                    for x in field_map.get(paper_id, [])))
+                channels.update((keyword_channel(x)
+                    for x in keyword_map.get(paper_id, [])))
+            create_list.extend((models.FeedEntry(event_id=pk, channel=x)
+                for x in channels))
+        models.FeedEntry.objects.bulk_create(create_list)
+
+def schedule_indexing(event_list):
+    """Index events after the current transaction commits.
+
+    Paper fields and keywords get saved after the paper posting event so
+    they must not be read earlier."""
+    id_list = [x.pk for x in event_list]
+    on_commit(lambda: index_events(id_list))
+
+def refresh_feed_entries():
+    """Index all events which were missed by schedule_indexing()"""
+    enttab = models.FeedEntry.query_model
+    evtab = models.FeedEvent.query_model
+    result = models.FeedEntry.objects.aggregate(
+        last=aggregates.Max(enttab.event.pk.f()))
+    lower = max((result['last'] or 0) - REFRESH_WINDOW, 0)
+    subq = models.FeedEntry.objects.filter(enttab.event.pk > lower)
+    subq = subq.values_list('event_id')
+    query = ((evtab.pk > lower) & ~evtab.pk.belongs(subq))
+    qs = models.FeedEvent.objects.filter(query).order_by('pk')
+    id_list = list(qs.values_list('pk', flat=True))
+    for chunk in make_chunks(id_list, INDEX_BATCH_SIZE):
+        index_events(chunk)
+    return len(id_list)
+
+def _channel_query(channels):
+    # Person channels are only read for active people but subfield and
+    # keyword channels collect events of all posters
+    enttab = models.FeedEntry.query_model
+    return (enttab.channel.belongs(channels) &
+        (enttab.event.person.is_active == True))
+
+def latest_event_id(channels):
+    enttab = models.FeedEntry.query_model
+    qs = models.FeedEntry.objects.filter(_channel_query(channels))
+    result = qs.aggregate(last=aggregates.Max(enttab.event.pk.f()))
+    return result['last']
+
+def channel_events(channels, since_id=None, limit=50):
+    enttab = models.FeedEntry.query_model
+    query = _channel_query(channels) & (enttab.event.paper.public == True)
+    if since_id is not None:
+        query &= (enttab.event.pk > since_id)
+    qs = models.FeedEntry.objects.filter(query).order_by('-event_id')
+    qs = qs.select_related('event__person', 'event__paper')
+    return [x.event for x in qs[:limit]]
@@ -0,0 +1,155 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import on_commit
+from ..models import const
+from .cache import LocalCache, follow_tag, invalidate_tags
+from .feed import subscription_event_types
+from .utils import fold_or
+from . import sql
+from .. import models
+
+# Follow graph between people built from FeedSubscription records. Person
+# follower_count and following_count hold the number of distinct active
+# people on the other side, regardless of subscription types.
+
+_local_follows = LocalCache(settings.FOLLOW_LOCAL_CACHE_SIZE)
+
+def followed_posters(person_id):
+    """Return {subscription type: frozenset of followed person IDs}.
+
+    The result is cached in process memory until the person changes their
+    subscriptions. Posters are not filtered by Person.is_active."""
+    ret, version = _local_follows.get(person_id, follow_tag(person_id))
+    if ret is not None:
+        return ret
+    tmp = dict(((x, set()) for x in const.feed_subscription_types))
+    subtab = models.FeedSubscription.query_model
+    qs = models.FeedSubscription.objects.filter(subtab.follower.pk ==
+        person_id)
+    for poster_id, subtype in qs.values_list('poster_id', 'subscription_type'):
+        tmp.setdefault(subtype, set()).add(poster_id)
+    ret = dict(((k, frozenset(v)) for k, v in tmp.items()))
+    _local_follows.set(person_id, version, ret)
+    return ret
+
+def followed_events_condition(person_col, type_col, person_id):
+    """Query condition matching own events of the person and subscribed
+    events of followed people. Works with both sql.Table and query_model
+    columns."""
+    cond_list = [(person_col == person_id)]
+    for subtype, poster_ids in followed_posters(person_id).items():
+        if not poster_ids:
+            continue
+        cond_list.append(person_col.belongs(sorted(poster_ids)) &
+            type_col.belongs(subscription_event_types[subtype]))
+    return fold_or(cond_list)
+
+def set_subscriptions(follower, poster, type_set):
+    """Replace subscription types of follower to poster's events.
+
+    Must be called under transaction with the follower record locked."""
+    subtab = models.FeedSubscription.query_model
+    query = ((subtab.poster == poster) & (subtab.follower == follower))
+    qs = models.FeedSubscription.objects.filter(query)
+    old_set = set(qs.values_list('subscription_type', flat=True))
+    del_list = list(old_set - set(type_set))
+    create_list = [models.FeedSubscription(poster=poster, follower=follower,
+        subscription_type=x) for x in set(type_set) - old_set]
+    if del_list:
+        qs.filter(subtab.subscription_type.belongs(del_list)).delete()
+    if create_list:
+        models.FeedSubscription.objects.bulk_create(create_list)
+    # Both sides of the subscription are active at this point
+    delta = int(bool(type_set)) - int(bool(old_set))
+    if delta:
+        ptab = models.Person.query_model
+        models.Person.objects.filter(ptab.pk == poster.pk).update(
+            follower_count=ptab.follower_count.f() + delta)
+        models.Person.objects.filter(ptab.pk == follower.pk).update(
+            following_count=ptab.following_count.f() + delta)
+    if del_list or create_list:
+        tag = follow_tag(follower.pk)
+        on_commit(lambda: invalidate_tags(tag))
+
+_count_sql = '''UPDATE {person} SET
+    follower_count = (SELECT COUNT(DISTINCT s.follower_id)
+        FROM {subscription} s INNER JOIN {person} p ON p.id = s.follower_id
+        WHERE s.poster_id = {person}.id AND p.is_active),
+    following_count = (SELECT COUNT(DISTINCT s.poster_id)
+        FROM {subscription} s INNER JOIN {person} p ON p.id = s.poster_id
+        WHERE s.follower_id = {person}.id AND p.is_active)
+    WHERE id = ANY(%s)'''
+
+def refresh_counts(person_ids, using=None):
+    """Recompute follower and following counts of given people"""
+    if not person_ids:
+        return
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    query = _count_sql.format(person=qn(models.Person._meta.db_table),
+        subscription=qn(models.FeedSubscription._meta.db_table))
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query, [list(person_ids)])
+    finally:
+        cursor.close()
+
+def refresh_neighbor_counts(person_id):
+    """Recompute counts of everyone connected to person whose active state
+    has changed"""
+    subtab = sql.Table(models.FeedSubscription)
+    where = ((subtab.poster_id == person_id) |
+        (subtab.follower_id == person_id))
+    query = subtab.select(subtab.poster_id, subtab.follower_id, where=where)
+    id_set = set()
+    for row in query.execute(using=DEFAULT_DB_ALIAS):
+        id_set.update((row['poster_id'], row['follower_id']))
+    id_set.discard(person_id)
+    refresh_counts(id_set)
+
+def _keyset_page(person_id, after, limit, reverse):
+    subtab = sql.Table(models.FeedSubscription)
+    ptab = sql.Table(models.Person)
+    if reverse:
+        # People followed by person_id
+        own_col, other_col = subtab.follower_id, subtab.poster_id
+    else:
+        own_col, other_col = subtab.poster_id, subtab.follower_id
+    join = subtab.inner_join(ptab, (ptab.pk == other_col))
+    where = (own_col == person_id) & (ptab.is_active == True)
+    # Foreign key columns are not ordered fields, use the joined primary key
+    if after is not None:
+        where &= (ptab.pk > after)
+    query = join.select(alias=dict(person_id=ptab.pk), where=where,
+        order_by=[ptab.pk.asc()], limit=(0, limit + 1), distinct=True)
+    id_list = [x['person_id'] for x in query.execute()]
+    person_map = models.Person.objects.in_bulk(id_list[:limit])
+    next_key = id_list[limit - 1] if len(id_list) > limit else None
+    return [person_map[x] for x in id_list[:limit]], next_key
+
+def followers_page(person_id, after=None, limit=50):
+    """Return (list of active followers ordered by ID, key of next page)"""
+    return _keyset_page(person_id, after, limit, False)
+
+def following_page(person_id, after=None, limit=50):
+    """Return (list of active followed people ordered by ID, key of next
+    page)"""
+    return _keyset_page(person_id, after, limit, True)
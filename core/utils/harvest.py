@@ -21,6 +21,9 @@ from django.db import IntegrityError
 from django.db.models import Count
 from django.db.transaction import atomic
 from . import pgsql
+from .cache import invalidate_papers, CITATIONS_TAG, PAPER_LIST_TAG
+from .keywords import add_paper_keywords
+from .suggest import index_papers
 from .transaction import lock_record
 from .utils import fold_or, list_map, make_chunks
 from ..models import const
@@ -165,6 +168,17 @@ class ImportBridge(object):
     def import_cursor(self):
         return self.record.import_cursor
 
+    def set_import_cursor(self, cursor):
+        with atomic():
+            tmp = lock_record(self.record)
+            if tmp is None:
+                raise RuntimeError('Cannot lock import status record.')
+            elif tmp.import_cursor != self.record.import_cursor:
+                msg = 'Concurrent %s import process detected.'
+                raise RuntimeError(msg % self.record.name)
+            self.record.import_cursor = cursor
+            self.record.save(update_fields=['import_cursor'])
+
     def map_categories(self, subfield_defs):
         name_set = set((s for f,s in subfield_defs.values()))
         fobj = models.ScienceSubfield.objects
@@ -209,6 +223,7 @@ class ImportBridge(object):
         batch_count = (len(paper_list) + batch_size - 1) // batch_size
         new_aliases = []
         new_papers = []
+        updated_papers = []
         with atomic():
             tmp = lock_record(self.record)
             if tmp is None:
@@ -218,11 +233,18 @@ class ImportBridge(object):
                 raise RuntimeError(msg % self.record.name)
             pgsql.lock_table(models.PaperAlias, pgsql.LOCK_SHARE_ROW_EXCLUSIVE)
             for batch_list in make_chunks(paper_list, batch_size):
-                tmp_papers, tmp_aliases = self._import_batch(batch_list)
+                tmp_papers, tmp_updated, tmp_aliases = self._import_batch(
+                    batch_list)
                 new_aliases.extend(tmp_aliases)
                 new_papers.extend(tmp_papers)
+                updated_papers.extend(tmp_updated)
             self.record.import_cursor = cursor
             self.record.save(update_fields=['import_cursor'])
+        # Bulk inserts send no signals and pages cached by concurrent
+        # requests before commit would hide the new papers
+        invalidate_papers(set((x.pk for x in new_papers + updated_papers)),
+            PAPER_LIST_TAG, CITATIONS_TAG)
+        index_papers([x.pk for x in new_papers + updated_papers])
         if query_crossref:
             from .crossref import crossref_fetch_list
             doi_scheme = const.paper_alias_schemes.DOI
@@ -255,6 +277,7 @@ class ImportBridge(object):
                 tmp.append(item.identifier)
 
         created_papers = []
+        updated_papers = []
         linked_aliases = []
         for paper in paper_list:
             primary_alias = paper.get('primary_identifier')
@@ -300,13 +323,14 @@ class ImportBridge(object):
                 for alias in new_alias_set:
                     models.PaperAlias.objects.link_alias(alias[0],alias[1],obj)
                 linked_aliases.extend(new_alias_set)
+                updated_papers.append(obj)
             # Paper not found, create it
             else:
                 tmp = paper.copy()
                 tmp['identifiers'] = new_alias_set
                 created_papers.append(self._create_paper(tmp))
                 linked_aliases.extend(new_alias_set)
-        return (created_papers, linked_aliases)
+        return (created_papers, updated_papers, linked_aliases)
 
     def _create_paper(self, paper):
         id_field = models.PaperAlias._meta.get_field('identifier')
@@ -336,7 +360,7 @@ class ImportBridge(object):
         par_list = [models.PaperAuthorReference(paper=obj, author_alias=x,
             confirmed=None) for x in author_aliases]
         if par_list:
-            models.PaperAuthorReference.bulk_create(par_list)
+            models.PaperAuthorReference.objects.bulk_create(par_list)
 
         # Create author names
         mfield = models.PaperAuthorName._meta.get_field('author_name')
@@ -352,14 +376,10 @@ class ImportBridge(object):
             for s,i in cite_set if len(i) <= max_id_length]
         if create_list:
             cite_list = paobj.bulk_create(create_list)
-            paper.bibliography.add(*cite_list)
+            obj.bibliography.add(*cite_list)
 
         # Create keywords
-        max_len = models.PaperKeyword._meta.get_field('keyword').max_length
-        keyword_list = [models.PaperKeyword(paper=obj, keyword=x[:max_len])
-            for x in paper.get('keywords', [])]
-        if keyword_list:
-            models.PaperKeyword.objects.bulk_create(keyword_list)
+        add_paper_keywords(obj, paper.get('keywords', []))
 
         models.FeedEvent.objects.create(person=bot_profile, paper=obj,
             event_type=const.user_feed_events.PAPER_POSTED)
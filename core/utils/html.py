@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from django.conf import settings
 from django.forms.utils import flatatt
 from django.http import QueryDict
 from django.urls import reverse
@@ -26,6 +27,10 @@ def full_reverse(request, viewname, *args, **kwargs):
     url = reverse(viewname, *args, **kwargs)
     return request.build_absolute_uri(url)
 
+def absolute_url(path):
+    """Build absolute URL without request, using SITE_URL setting"""
+    return settings.SITE_URL.rstrip('/') + path
+
 def query_string(**kwargs):
     ret = QueryDict(mutable=True)
     ret.update(kwargs)
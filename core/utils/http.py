@@ -0,0 +1,70 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.utils import timezone, translation
+from django.utils.encoding import force_bytes
+from django.views.decorators.http import condition
+import hashlib
+
+def make_etag(*values):
+    data = '\n'.join((str(x) for x in values))
+    return hashlib.md5(force_bytes(data)).hexdigest()
+
+def request_etag(request, *values):
+    """Generate ETag which also depends on user-specific page settings"""
+    user = request.user
+    user_data = [translation.get_language(),
+        timezone.get_current_timezone_name(), user.pk]
+    if user.is_authenticated:
+        # Make sure that stale CSRF tokens don't get reused after login
+        user_data.append(request.META.get('CSRF_COOKIE'))
+    return make_etag(*(user_data + list(values)))
+
+class ConditionalGetMixin(object):
+    """Answer conditional GET requests without rendering the page.
+
+    Subclasses must implement get_version() which returns a tuple of
+    (last modification time, list of values describing page version)
+    computed using cheap aggregate queries. Return None to skip validation,
+    e.g. when the object does not exist.
+    """
+
+    def get_version(self):
+        raise NotImplementedError()
+
+    def dispatch(self, request, *args, **kwargs):
+        parent = super(ConditionalGetMixin, self).dispatch
+        if request.method not in ('GET', 'HEAD'):
+            return parent(request, *args, **kwargs)
+        version = self.get_version()
+        if version is None:
+            return parent(request, *args, **kwargs)
+        last_modified, values = version
+        etag = request_etag(request, last_modified, *values)
+        # Last-Modified is not enough to tell apart different user views
+        if request.user.is_authenticated:
+            last_modified = None
+        func = condition(etag_func=lambda *a, **kw: etag,
+            last_modified_func=lambda *a, **kw: last_modified)(parent)
+        return func(request, *args, **kwargs)
+
+def row_version(row, *timestamp_names):
+    """Convert aggregate version query result to get_version() format"""
+    values = [row[x] for x in sorted(row.namemap)]
+    stamps = [row[x] for x in timestamp_names if row[x] is not None]
+    if not stamps:
+        return None, values
+    return max(stamps), values
@@ -0,0 +1,158 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.transaction import atomic
+from django.utils import timezone
+from ..models import const
+from .purge import chunked_delete
+from .utils import generate_token, logger
+from .. import models
+import json
+import threading
+import traceback
+
+_task_registry = dict()
+
+def task(name, max_attempts=None):
+    """Register function as background job task"""
+    def wrapper(func):
+        if name in _task_registry:
+            raise ValueError('Duplicate task name: %s' % name)
+        _task_registry[name] = (func, max_attempts)
+        return func
+    return wrapper
+
+def _load_tasks():
+    # Tasks register themselves on import
+    from .. import tasks
+
+def enqueue(task_name, owner=None, delay=None, **kwargs):
+    """Create new job. The job will be visible to workers after commit."""
+    _load_tasks()
+    if task_name not in _task_registry:
+        raise ValueError('Unknown task: %s' % task_name)
+    max_attempts = _task_registry[task_name][1] or settings.JOB_MAX_ATTEMPTS
+    run_after = timezone.now()
+    if delay is not None:
+        run_after += delay
+    return models.Job.objects.create(task=task_name, owner=owner,
+        arguments=json.dumps(kwargs), token=generate_token(24),
+        max_attempts=max_attempts, run_after=run_after)
+
+_claim_sql = '''UPDATE {table} SET status = %(running)s,
+    attempts = attempts + 1, date_started = %(now)s
+WHERE id IN (SELECT id FROM {table}
+    WHERE (status = %(pending)s AND run_after <= %(now)s) OR
+        (status = %(running)s AND date_started < %(stale)s)
+    ORDER BY run_after, id LIMIT %(limit)s FOR UPDATE SKIP LOCKED)
+RETURNING id'''
+
+def claim_jobs(limit=1):
+    """Mark up to limit runnable jobs as running and return them.
+
+    Jobs left running by a crashed worker become runnable again after
+    JOB_TIMEOUT.
+    """
+    now = timezone.now()
+    table = connection.ops.quote_name(models.Job._meta.db_table)
+    params = dict(running=const.job_statuses.RUNNING,
+        pending=const.job_statuses.PENDING, now=now,
+        stale=now - settings.JOB_TIMEOUT, limit=limit)
+    with atomic():
+        cursor = connection.cursor()
+        try:
+            cursor.execute(_claim_sql.format(table=table), params)
+            id_list = [x[0] for x in cursor.fetchall()]
+        finally:
+            cursor.close()
+    if not id_list:
+        return []
+    query = models.Job.query_model.pk.belongs(id_list)
+    return list(models.Job.objects.filter(query).order_by('run_after', 'pk'))
+
+def retry_delay(attempts):
+    """Exponential backoff"""
+    return settings.JOB_RETRY_DELAY * (2 ** max(attempts - 1, 0))
+
+def run_job(job):
+    _load_tasks()
+    func = _task_registry.get(job.task, (None,))[0]
+    job.date_finished = timezone.now()
+    try:
+        if func is None:
+            raise RuntimeError('Unknown task: %s' % job.task)
+        result = func(**job.get_arguments())
+    except Exception:
+        logger.warning('Job %s failed (attempt %d of %d)', job, job.attempts,
+            job.max_attempts, exc_info=True)
+        job.error = traceback.format_exc()
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = const.job_statuses.PENDING
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            job.date_finished = None
+        else:
+            job.status = const.job_statuses.FAILED
+        job.save(update_fields=['status', 'error', 'run_after',
+            'date_finished'])
+        return False
+    job.status = const.job_statuses.DONE
+    job.result = json.dumps(result)
+    job.error = ''
+    job.date_finished = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'date_finished'])
+    return True
+
+def _worker_loop(stop_event, once):
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+            job_list = claim_jobs(1)
+            if not job_list:
+                if once:
+                    return
+                stop_event.wait(settings.JOB_POLL_INTERVAL)
+                continue
+            run_job(job_list[0])
+    finally:
+        connection.close()
+
+def run_workers(concurrency=None, once=False):
+    """Run job worker threads until interrupted.
+
+    With once=True, workers exit when there are no more runnable jobs.
+    """
+    concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+    stop_event = threading.Event()
+    thread_list = [threading.Thread(target=_worker_loop,
+        args=(stop_event, once)) for x in range(concurrency)]
+    for thread in thread_list:
+        thread.start()
+    try:
+        for thread in thread_list:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in thread_list:
+            thread.join()
+
+def purge_jobs():
+    table = models.Job.query_model
+    deadline = timezone.now() - settings.JOB_RESULT_TTL
+    query = (table.date_finished < deadline)
+    return chunked_delete(models.Job, query)
@@ -0,0 +1,172 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import Counter
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F
+from django.db.transaction import on_commit
+from .utils import fold_or, list_map
+from . import cache
+from .. import models
+
+_insert_keywords_sql = '''INSERT INTO {keyword} (canonical, name, paper_count)
+VALUES {values} ON CONFLICT (canonical) DO NOTHING'''
+
+_add_frequency_sql = '''INSERT INTO {frequency}
+    (subfield_id, keyword_id, paper_count)
+VALUES {values} ON CONFLICT (subfield_id, keyword_id)
+DO UPDATE SET paper_count = {frequency}.paper_count + EXCLUDED.paper_count'''
+
+def canonical_keyword(keyword):
+    """Case insensitive form of keyword with normalized whitespace"""
+    max_len = models.Keyword._meta.get_field('canonical').max_length
+    return ' '.join(keyword.split()).upper()[:max_len]
+
+def _execute_values(sql_tpl, row_list, using=None):
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    tables = dict(keyword=qn(models.Keyword._meta.db_table),
+        frequency=qn(models.KeywordFrequency._meta.db_table))
+    row_tpl = '(' + ','.join(['%s'] * len(row_list[0])) + ')'
+    query = sql_tpl.format(values=','.join([row_tpl] * len(row_list)),
+        **tables)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query, [y for x in row_list for y in x])
+    finally:
+        cursor.close()
+
+def keyword_map(keyword_list, create=False):
+    """Return dict mapping canonical form of given keywords to Keyword IDs.
+    Missing dictionary entries will be created if create is True."""
+    max_len = models.Keyword._meta.get_field('name').max_length
+    name_map = dict()
+    for item in keyword_list:
+        key = canonical_keyword(item)
+        if key:
+            name_map.setdefault(key, ' '.join(item.split())[:max_len])
+    if not name_map:
+        return dict()
+    if create:
+        # Sorted insert avoids deadlocks between concurrent imports
+        row_list = [(k, name_map[k], 0) for k in sorted(name_map)]
+        _execute_values(_insert_keywords_sql, row_list)
+    table = models.Keyword.query_model
+    qs = models.Keyword.objects.filter(table.canonical.belongs(list(name_map)))
+    return dict(qs.values_list('canonical', 'pk'))
+
+def _update_frequencies(counter, delta):
+    """Add delta times the count to KeywordFrequency of each
+    (subfield ID, keyword ID) pair in counter"""
+    if not counter:
+        return
+    if delta > 0:
+        row_list = [(s, k, c * delta) for (s, k), c in sorted(counter.items())]
+        _execute_values(_add_frequency_sql, row_list)
+        return
+    table = models.KeywordFrequency.query_model
+    count_map = list_map(((c, x) for x, c in counter.items()))
+    for count, pair_list in count_map.items():
+        query = fold_or([((table.subfield == s) & (table.keyword == k))
+            for s, k in pair_list])
+        qs = models.KeywordFrequency.objects.filter(query)
+        qs.update(paper_count=F('paper_count') + count * delta)
+    query = fold_or([((table.subfield == s) & (table.keyword == k))
+        for s, k in counter])
+    query &= (table.paper_count <= 0)
+    models.KeywordFrequency.objects.filter(query).delete()
+
+def _update_counts(link_list, delta):
+    """Update keyword counters after adding (delta=1) or removing (delta=-1)
+    list of (paper ID, keyword ID) links"""
+    if not link_list:
+        return
+    table = models.Keyword.query_model
+    counter = Counter((k for p, k in link_list))
+    count_map = list_map(((c, k) for k, c in counter.items()))
+    for count, id_list in count_map.items():
+        qs = models.Keyword.objects.filter(table.pk.belongs(id_list))
+        qs.update(paper_count=F('paper_count') + count * delta)
+    on_commit(lambda: cache.invalidate_tags(cache.KEYWORDS_TAG))
+
+    fields_model = models.Paper.fields.through
+    qs = fields_model.objects.filter(
+        paper_id__in=set((p for p, k in link_list)))
+    field_map = list_map(qs.values_list('paper_id', 'sciencesubfield_id'))
+    counter = Counter(((s, k) for p, k in link_list
+        for s in field_map.get(p, [])))
+    _update_frequencies(counter, delta)
+
+def add_paper_keywords(paper, keyword_list):
+    """Add keywords to paper which has none of them yet"""
+    id_map = keyword_map(keyword_list, True)
+    max_len = models.PaperKeyword._meta.get_field('keyword').max_length
+    create_list = []
+    for item in keyword_list:
+        key = canonical_keyword(item)
+        if key in id_map:
+            create_list.append(models.PaperKeyword(paper=paper,
+                keyword=' '.join(item.split())[:max_len],
+                entry_id=id_map.pop(key)))
+    if create_list:
+        models.PaperKeyword.objects.bulk_create(create_list)
+        _update_counts([(paper.pk, x.entry_id) for x in create_list], 1)
+
+def set_paper_keywords(paper, keyword_list):
+    """Replace paper keywords. Call under transaction with the paper locked."""
+    new_map = dict()
+    for item in keyword_list:
+        new_map.setdefault(canonical_keyword(item), ' '.join(item.split()))
+    new_map.pop('', None)
+    old_list = list(paper.paperkeyword_set.select_related('entry'))
+    old_keys = set((x.entry.canonical for x in old_list))
+    del_list = [x for x in old_list if x.entry.canonical not in new_map]
+    if del_list:
+        table = models.PaperKeyword.query_model
+        query = table.pk.belongs([x.pk for x in del_list])
+        paper.paperkeyword_set.filter(query).delete()
+        _update_counts(list(set(((paper.pk, x.entry_id) for x in del_list))),
+            -1)
+    # Keep the dictionary entry when only the spelling changes
+    for item in old_list:
+        name = new_map.get(item.entry.canonical)
+        if name is not None and name != item.keyword:
+            item.keyword = name
+            item.save(update_fields=['keyword'])
+    add_paper_keywords(paper,
+        [v for k, v in new_map.items() if k not in old_keys])
+
+def remove_paper_keywords(paper):
+    """Remove all paper keywords, e.g. before deleting the paper"""
+    qs = paper.paperkeyword_set.all()
+    entry_ids = set(qs.values_list('entry_id', flat=True))
+    _update_counts([(paper.pk, x) for x in entry_ids], -1)
+    qs.delete()
+
+def update_subfield_counts(pair_list, delta):
+    """Update KeywordFrequency after adding (delta=1) or removing (delta=-1)
+    list of (paper ID, subfield ID) links"""
+    if not pair_list:
+        return
+    table = models.PaperKeyword.query_model
+    query = table.paper.belongs(set((p for p, s in pair_list)))
+    qs = models.PaperKeyword.objects.filter(query)
+    entry_map = list_map(qs.values_list('paper_id', 'entry_id'))
+    counter = Counter(((s, k) for p, s in pair_list
+        for k in entry_map.get(p, [])))
+    _update_frequencies(counter, delta)
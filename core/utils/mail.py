@@ -16,21 +16,143 @@
 
 from django.conf import settings
 from django.core import mail
-from django.template.loader import render_to_string
+from django.db import connection
+from django.db.transaction import atomic
+from django.template.loader import get_template
+from django.utils import timezone
+from ..models import const
+from .purge import chunked_delete
 from .utils import logger
+from .. import models
+import functools
+
+def build_mail(subject, message, recipient_list, from_email=None,
+    html_message=None):
+    """Create unsaved outbox message for bulk_create()"""
+    if from_email is None:
+        from_email = settings.SYSTEM_EMAIL_FROM
+    return models.MailMessage(subject=str(subject), body=message,
+        html_body=html_message or '', from_email=from_email,
+        recipients='\n'.join(recipient_list))
 
 def send_mail(*args, **kwargs):
-    kwargs.setdefault('from_email', settings.SYSTEM_EMAIL_FROM)
-    try:
-        return mail.send_mail(*args, **kwargs)
-    except:
-        logger.error('Error sending e-mail', exc_info=True)
-    return 0
+    """Add e-mail to the outbox. It will be sent by deliver_mail() after
+    the current transaction commits."""
+    ret = build_mail(*args, **kwargs)
+    ret.save()
+    return ret
+
+@functools.lru_cache(maxsize=64)
+def _cached_template(name):
+    return get_template(name)
+
+def render_template(name, context, request=None):
+    # Compiled templates are reused between messages unless debugging
+    if settings.DEBUG:
+        template = get_template(name)
+    else:
+        template = _cached_template(name)
+    return template.render(context, request)
 
 def send_template_mail(request, subject, template, context, recipient_list,
     **kwargs):
-    text = render_to_string(template + '.txt', context, request).strip()
-    html = render_to_string(template + '.html', context, request)
+    text = render_template(template + '.txt', context, request).strip()
+    html = render_template(template + '.html', context, request)
     kwargs['html_message'] = html
-    kwargs['recipient_list'] = recipient_list
-    return send_mail(subject, text, **kwargs)
+    return send_mail(subject, text, recipient_list, **kwargs)
+
+_claim_sql = '''UPDATE {table} SET status = %(sending)s,
+    attempts = attempts + 1, next_attempt = %(stale)s
+WHERE id IN (SELECT id FROM {table}
+    WHERE status IN (%(pending)s, %(sending)s) AND next_attempt <= %(now)s
+    ORDER BY next_attempt, id LIMIT %(limit)s FOR UPDATE SKIP LOCKED)
+RETURNING id'''
+
+def _claim_messages(limit):
+    # Messages left in sending state by a crashed worker will be retried
+    # after MAIL_SEND_TIMEOUT
+    now = timezone.now()
+    table = connection.ops.quote_name(models.MailMessage._meta.db_table)
+    params = dict(sending=const.mail_statuses.SENDING,
+        pending=const.mail_statuses.PENDING, now=now,
+        stale=now + settings.MAIL_SEND_TIMEOUT, limit=limit)
+    with atomic():
+        cursor = connection.cursor()
+        try:
+            cursor.execute(_claim_sql.format(table=table), params)
+            id_list = [x[0] for x in cursor.fetchall()]
+        finally:
+            cursor.close()
+    if not id_list:
+        return []
+    query = models.MailMessage.query_model.pk.belongs(id_list)
+    return list(models.MailMessage.objects.filter(query).order_by('pk'))
+
+def _make_message(obj, conn):
+    ret = mail.EmailMultiAlternatives(obj.subject, obj.body, obj.from_email,
+        obj.get_recipients(), connection=conn)
+    if obj.html_body:
+        ret.attach_alternative(obj.html_body, 'text/html')
+    return ret
+
+def _mark_failed(obj, error):
+    obj.error = error
+    if obj.attempts < settings.MAIL_MAX_ATTEMPTS:
+        obj.status = const.mail_statuses.PENDING
+        delay = settings.MAIL_RETRY_DELAY * (2 ** max(obj.attempts - 1, 0))
+        obj.next_attempt = timezone.now() + delay
+    else:
+        obj.status = const.mail_statuses.FAILED
+    obj.save(update_fields=['status', 'next_attempt', 'error'])
+
+def _deliver_batch(message_list):
+    sent = 0
+    conn = mail.get_connection(fail_silently=False)
+    try:
+        conn.open()
+    except Exception as e:
+        logger.error('Cannot connect to mail server', exc_info=True)
+        for obj in message_list:
+            _mark_failed(obj, str(e))
+        return 0
+    try:
+        for obj in message_list:
+            # Send messages one by one over the shared connection so that
+            # a rejected message does not fail the whole batch
+            try:
+                conn.send_messages([_make_message(obj, conn)])
+            except Exception as e:
+                logger.warning('Error sending e-mail #%d', obj.pk,
+                    exc_info=True)
+                _mark_failed(obj, str(e))
+                continue
+            obj.status = const.mail_statuses.SENT
+            obj.date_sent = timezone.now()
+            obj.error = ''
+            obj.save(update_fields=['status', 'date_sent', 'error'])
+            sent += 1
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return sent
+
+def deliver_mail(batch_size=None):
+    """Send all pending e-mails from the outbox. Returns number of e-mails
+    sent."""
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    ret = 0
+    while True:
+        message_list = _claim_messages(batch_size)
+        if not message_list:
+            return ret
+        ret += _deliver_batch(message_list)
+
+def purge_mail():
+    table = models.MailMessage.query_model
+    deadline = timezone.now() - settings.MAIL_OUTBOX_TTL
+    query = ((table.date_sent < deadline) |
+        ((table.status == const.mail_statuses.FAILED) &
+        (table.next_attempt < deadline)))
+    return chunked_delete(models.MailMessage, query)
@@ -14,6 +14,9 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from django.db.transaction import on_commit
+from .cache import invalidate_papers, CITATIONS_TAG, PAPER_LIST_TAG
+from .follow import followed_posters
 from . import sql
 from .utils import fold_or
 from ..models import const
@@ -30,13 +33,9 @@ def paper_review_rating_subquery(paper_list=None, person_id=None):
     elif paper_list is not None:
         where &= (revtab.paper_id == paper_list)
     if person_id is not None:
-        followtab = sql.Table(models.FeedSubscription)
         subtype = const.feed_subscription_types.REVIEWS
-        cond = ((revtab.posted_by_id == followtab.poster_id) &
-            (followtab.follower_id == person_id) &
-            (followtab.subscription_type == subtype))
-        join = join.left_join(followtab, cond)
-        where &= ((revtab.posted_by_id == person_id) | followtab.pk.notnull())
+        poster_ids = sorted(followed_posters(person_id)[subtype])
+        where &= revtab.posted_by_id.belongs([person_id] + poster_ids)
     fields = [revtab.paper_id]
     # Multiply values by 50 to get percentage
     alias = dict(methodology_avg=sql.avg(50*revtab.methodology),
@@ -62,3 +61,93 @@ def bibcoupling_subquery(alias_list, exclude=[]):
         where &= ~citetab.paper_id.belongs(exclude)
     return join.select(*fields, alias=alias, where=where, group_by=fields,
         order_by=[alias['weight'].desc()])
+
+def invalidate_author_pages(person_id=None, alias_id=None):
+    """Invalidate cached pages which display given person or author alias.
+    Paper lists show author names, too."""
+    papertab = models.Paper.query_model
+    reftab = models.PaperAuthorReference.query_model
+    if alias_id is not None:
+        query = (reftab.author_alias == alias_id)
+    else:
+        query = (reftab.author_alias.target == person_id)
+    qs = models.PaperAuthorReference.objects.filter(query)
+    paper_ids = set(qs.values_list('paper_id', flat=True))
+    if person_id is not None:
+        qs = models.Paper.objects.filter(papertab.posted_by == person_id)
+        paper_ids.update(qs.values_list('pk', flat=True))
+    if paper_ids:
+        invalidate_papers(paper_ids, PAPER_LIST_TAG, CITATIONS_TAG)
+        # Pages and ETags computed before commit would keep the old name
+        on_commit(lambda: invalidate_papers(paper_ids, PAPER_LIST_TAG,
+            CITATIONS_TAG))
+
+def _aggregate(source, expr, where):
+    return sql.scalar(source.select(alias=dict(value=expr), where=where))
+
+def _authorship_version(paper_id):
+    # Authorship confirmation creates events, rejection flags references
+    reftab = sql.Table(models.PaperAuthorReference)
+    evtab = sql.Table(models.FeedEvent)
+    where = (reftab.paper_id == paper_id) & (reftab.confirmed == False)
+    return dict(rejected_count=_aggregate(reftab, sql.count(), where),
+        event_max=_aggregate(evtab, sql.max(evtab.pk),
+            evtab.paper_id == paper_id),
+        event_count=_aggregate(evtab, sql.count(),
+            evtab.paper_id == paper_id))
+
+def _person_version(person_id):
+    subtab = sql.Table(models.FeedSubscription)
+    deltab = sql.Table(models.PaperManagementDelegation)
+    sub_where = (subtab.follower_id == person_id)
+    del_where = (deltab.delegate_id == person_id)
+    return dict(subscription_max=_aggregate(subtab, sql.max(subtab.pk),
+            sub_where),
+        subscription_count=_aggregate(subtab, sql.count(), sub_where),
+        delegation_max=_aggregate(deltab, sql.max(deltab.pk), del_where),
+        delegation_count=_aggregate(deltab, sql.count(), del_where))
+
+# Cheap aggregate queries for HTTP conditional GET. The result is a single
+# row with modification timestamps and row counts of all data displayed
+# on the respective page.
+def paper_version_query(paper_id, person_id=None):
+    papertab = sql.Table(models.Paper)
+    revtab = sql.Table(models.PaperReview)
+    bibfield = models.Paper._meta.get_field('bibliography')
+    citetab = sql.Table(bibfield.remote_field.through)
+    aliastab = sql.Table(models.PaperAlias)
+    srctab = sql.Table(models.Paper)
+    join = citetab.inner_join(aliastab, citetab.paperalias_id == aliastab.pk)
+    join = join.inner_join(srctab, citetab.paper_id == srctab.pk)
+    cite_where = (aliastab.target_id == paper_id) & (srctab.public == True)
+    alias = _authorship_version(paper_id)
+    alias['review_changed'] = _aggregate(revtab, sql.max(revtab.date_changed),
+        revtab.paper_id == paper_id)
+    alias['cite_changed'] = _aggregate(join, sql.max(srctab.last_changed),
+        cite_where)
+    alias['cite_count'] = _aggregate(join, sql.count(), cite_where)
+    if person_id is not None:
+        alias.update(_person_version(person_id))
+    return papertab.select(papertab.last_changed, papertab.public,
+        alias=alias, where=(papertab.pk == paper_id))
+
+def paper_review_version_query(paper_id, review_id=None):
+    revtab = sql.Table(models.PaperReview)
+    resptab = sql.Table(models.PaperReviewResponse)
+    papertab = sql.Table(models.Paper)
+    join = resptab.inner_join(revtab, resptab.parent_id == revtab.pk)
+    cond = (revtab.paper_id == papertab.pk) & (revtab.deleted == False)
+    resp_where = (revtab.paper_id == paper_id)
+    if review_id is not None:
+        cond &= (revtab.pk == review_id)
+        resp_where = (resptab.parent_id == review_id)
+    src = papertab.left_join(revtab, cond)
+    alias = _authorship_version(paper_id)
+    alias['response_changed'] = _aggregate(join, sql.max(resptab.date_changed),
+        resp_where)
+    alias['response_count'] = _aggregate(join, sql.count(), resp_where)
+    alias['review_changed'] = sql.max(revtab.date_changed)
+    alias['review_count'] = sql.count(revtab.pk)
+    fields = [papertab.last_changed, papertab.public]
+    return src.select(*fields, alias=alias, where=(papertab.pk == paper_id),
+        group_by=fields)
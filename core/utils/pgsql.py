@@ -1,4 +1,5 @@
-from django.db import DEFAULT_DB_ALIAS, connections
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+import uuid
 
 LOCK_ACCESS_SHARE = 'ACCESS SHARE'
 LOCK_ROW_SHARE = 'ROW SHARE'
@@ -26,3 +27,108 @@ def lock_table(model, mode=None, nowait=False, using=None):
         cursor.execute(sql)
     finally:
         cursor.close()
+
+def copy_to(file, sql, params=None, using=None):
+    """Write CSV output of a query into file using COPY TO STDOUT"""
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    cursor = connections[using].cursor()
+    try:
+        query = cursor.mogrify(sql, params).decode('utf-8')
+        copy_sql = 'COPY ({0}) TO STDOUT WITH (FORMAT csv, HEADER)'
+        cursor.copy_expert(copy_sql.format(query), file)
+    finally:
+        cursor.close()
+
+def server_cursor(sql, params=None, itersize=2000, using=None):
+    """Iterate over query result without loading it all into memory"""
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    connection = connections[using]
+    # Named cursors exist only inside a transaction
+    with transaction.atomic(using=using):
+        connection.ensure_connection()
+        name = 'sciswarm_' + uuid.uuid4().hex
+        cursor = connection.connection.cursor(name=name)
+        cursor.itersize = itersize
+        try:
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
+def drop_indexes(model, columns, using=None):
+    """Drop non-unique indexes covering only given columns.
+
+    Returns list of (index name, index definition) for create_indexes().
+    """
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    connection = connections[using]
+    sql = '''SELECT i.relname, pg_get_indexdef(x.indexrelid)
+        FROM pg_index x INNER JOIN pg_class i ON i.oid = x.indexrelid
+            INNER JOIN pg_class t ON t.oid = x.indrelid
+        WHERE t.relname = %s AND NOT x.indisunique AND NOT x.indisprimary
+            AND ARRAY(SELECT a.attname::text FROM pg_attribute a
+                WHERE a.attrelid = t.oid AND a.attnum = ANY(x.indkey))
+                <@ %s::text[]'''
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, [model._meta.db_table, list(columns)])
+        ret = cursor.fetchall()
+        for name, definition in ret:
+            cursor.execute('DROP INDEX ' + connection.ops.quote_name(name))
+    finally:
+        cursor.close()
+    return ret
+
+def create_indexes(index_list, using=None):
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    cursor = connections[using].cursor()
+    try:
+        for name, definition in index_list:
+            cursor.execute(definition)
+    finally:
+        cursor.close()
+
+def _advisory_key(name):
+    # Advisory locks are identified by 64bit integer
+    tmp = uuid.uuid5(uuid.NAMESPACE_URL, 'sciswarm:' + name).int >> 64
+    return tmp - (1 << 64) if tmp >= (1 << 63) else tmp
+
+def try_advisory_lock(name, using=None):
+    """Acquire session-level advisory lock without waiting. Returns False
+    if another session holds the lock."""
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    connection = connections[using]
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [_advisory_key(name)])
+        ret = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    # Pooled connection must not keep the lock if the caller fails to unlock
+    if ret:
+        connection.needs_session_reset = True
+    return ret
+
+def advisory_unlock(name, using=None):
+    if using is None:
+        using = DEFAULT_DB_ALIAS
+    cursor = connections[using].cursor()
+    try:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', [_advisory_key(name)])
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+def close_all_connections():
+    """Close all database connections of this process including idle
+    pooled ones. Call before forking worker processes."""
+    for connection in connections.all():
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
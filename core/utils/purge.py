@@ -0,0 +1,47 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db.transaction import atomic
+from .scheduler import budget_exhausted
+import time
+
+def chunked_delete(model, query, chunk_size=None, delay=None):
+    """Delete records matching query in primary key order.
+
+    Each chunk gets deleted in a separate short transaction and the function
+    sleeps between chunks so that lock hold time and replication lag stay
+    bounded regardless of the number of deleted records. Stops early when
+    the cron task time budget runs out. Returns the number of deleted
+    records (not counting cascades).
+    """
+    if chunk_size is None:
+        chunk_size = settings.PURGE_CHUNK_SIZE
+    if delay is None:
+        delay = settings.PURGE_CHUNK_DELAY
+    table = model.query_model
+    ret = 0
+    while True:
+        with atomic():
+            qs = model.objects.filter(query).order_by('pk')
+            id_list = list(qs.values_list('pk', flat=True)[:chunk_size])
+            if id_list:
+                qs = model.objects.filter(table.pk.belongs(id_list))
+                qs.delete()
+        ret += len(id_list)
+        if len(id_list) < chunk_size or budget_exhausted():
+            return ret
+        time.sleep(delay)
@@ -0,0 +1,157 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from contextlib import contextmanager
+from functools import wraps
+import threading
+import time
+
+# Read-only views declared with ReplicaReadMixin or @replica_read send
+# their queries to the 'replica' database alias when it is configured.
+# Sessions which submitted a form in the last DB_PRIMARY_STICKY_TIME seconds
+# keep reading from the primary database so that users see their own edits.
+# Anonymous clients without a session get a short-lived signed cookie instead
+# so that e.g. OAI-PMH harvests do not create a session for each POST.
+
+REPLICA_DB_ALIAS = 'replica'
+PRIMARY_UNTIL_SESSION_KEY = 'db_primary_until'
+PRIMARY_UNTIL_COOKIE = 'db_primary_until'
+_cookie_salt = 'core.utils.routing'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = threading.local()
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+def replica_active():
+    return getattr(_state, 'active', False)
+
+@contextmanager
+def read_from_replica():
+    old_state = replica_active()
+    _state.active = replica_configured()
+    try:
+        yield
+    finally:
+        _state.active = old_state
+
+def _has_session(request):
+    return settings.SESSION_COOKIE_NAME in request.COOKIES
+
+def primary_pinned(request):
+    until = None
+    if _has_session(request):
+        until = request.session.get(PRIMARY_UNTIL_SESSION_KEY)
+    if until is None:
+        until = request.get_signed_cookie(PRIMARY_UNTIL_COOKIE, None,
+            salt=_cookie_salt, max_age=settings.DB_PRIMARY_STICKY_TIME)
+        try:
+            until = float(until)
+        except (TypeError, ValueError):
+            return False
+    return until > time.time()
+
+def _replica_iter(content):
+    # Streamed content is generated after the view returns
+    content = iter(content)
+    while True:
+        with read_from_replica():
+            try:
+                chunk = next(content)
+            except StopIteration:
+                return
+        yield chunk
+
+def _dispatch(request, func, *args, **kwargs):
+    if (request.method not in SAFE_METHODS or not replica_configured() or
+        primary_pinned(request)):
+        return func(request, *args, **kwargs)
+    with read_from_replica():
+        response = func(request, *args, **kwargs)
+        # Template responses would otherwise query the primary database
+        # while rendering
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+    if response.streaming:
+        response.streaming_content = _replica_iter(response.streaming_content)
+    return response
+
+def replica_read(view_func):
+    """Route queries of a function view to the read replica"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return _dispatch(request, view_func, *args, **kwargs)
+    return wrapper
+
+class ReplicaReadMixin(object):
+    """Route queries of a class-based view to the read replica.
+
+    Must come before other mixins which query the database in dispatch().
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        parent = super(ReplicaReadMixin, self).dispatch
+        return _dispatch(request, parent, *args, **kwargs)
+
+class PrimaryStickinessMiddleware(object):
+    """Read from the primary database for a while after any POST"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method in SAFE_METHODS or not replica_configured():
+            return response
+        timeout = settings.DB_PRIMARY_STICKY_TIME
+        until = time.time() + timeout
+        if request.user.is_authenticated or _has_session(request):
+            request.session[PRIMARY_UNTIL_SESSION_KEY] = until
+        else:
+            response.set_signed_cookie(PRIMARY_UNTIL_COOKIE, str(until),
+                salt=_cookie_salt, max_age=timeout,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True)
+        return response
+
+def _primary_only(model):
+    # Sessions and users are cached in process memory until invalidated,
+    # a stale copy from the replica could stay there indefinitely
+    return model._meta.label in (settings.AUTH_USER_MODEL, 'sessions.Session')
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        if (not replica_active() or _primary_only(model) or
+            connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Later reads in the same request must see the change. Objects
+        # loaded from the replica get saved to the primary database.
+        _state.active = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica receives schema changes from the primary database
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -0,0 +1,117 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.utils import timezone
+from ..models import const
+from .utils import logger
+from . import pgsql
+from .. import models
+import time
+import traceback
+
+_task_registry = OrderedDict()
+# Time budget of the task running in this process
+_deadline = None
+
+def register_task(name, func, interval):
+    """Register periodic cron task. The function may return the number of
+    processed items for run history."""
+    interval = settings.CRON_TASK_INTERVALS.get(name, interval)
+    _task_registry[name] = (func, interval)
+
+def budget_exhausted():
+    """Long cron tasks should check this regularly and stop when it returns
+    True. The task will continue in the next cron run."""
+    return _deadline is not None and time.monotonic() >= _deadline
+
+def due_tasks(now=None):
+    if now is None:
+        now = timezone.now()
+    table = models.TaskRun.query_model
+    qs = models.TaskRun.objects.filter(table.task.belongs(list(_task_registry)))
+    qs = qs.order_by('task', '-date_started').distinct('task')
+    last_runs = dict(((x.task, x) for x in qs))
+    ret = []
+    for name, (func, interval) in _task_registry.items():
+        last = last_runs.get(name)
+        # Interrupted tasks continue immediately
+        if (last is None or last.status == const.task_run_statuses.PARTIAL
+            or last.date_started + interval <= now):
+            ret.append(name)
+    return ret
+
+def run_task(name):
+    """Run registered task unless another process is already running it.
+    Returns TaskRun record or None if the task is locked."""
+    global _deadline
+    func = _task_registry[name][0]
+    lock_name = 'cron:' + name
+    if not pgsql.try_advisory_lock(lock_name):
+        logger.info('Cron task %s is already running, skipping', name)
+        return None
+    try:
+        run = models.TaskRun.objects.create(task=name,
+            date_started=timezone.now())
+        _deadline = time.monotonic() + settings.CRON_TIME_BUDGET.total_seconds()
+        try:
+            result = func()
+        except Exception:
+            logger.error('Cron task %s failed', name, exc_info=True)
+            run.status = const.task_run_statuses.FAILED
+            run.error = traceback.format_exc()
+        else:
+            if budget_exhausted():
+                run.status = const.task_run_statuses.PARTIAL
+            else:
+                run.status = const.task_run_statuses.DONE
+            if isinstance(result, int):
+                run.items_processed = result
+        finally:
+            _deadline = None
+        run.date_finished = timezone.now()
+        run.save(update_fields=['status', 'date_finished', 'items_processed',
+            'error'])
+        return run
+    finally:
+        pgsql.advisory_unlock(lock_name)
+
+def _run_task_process(name):
+    try:
+        run = run_task(name)
+        return None if run is None else run.status
+    finally:
+        pgsql.close_all_connections()
+
+def run_scheduler(workers=None):
+    """Run all due tasks in parallel worker processes"""
+    name_list = due_tasks()
+    if not name_list:
+        return
+    workers = min(workers or settings.CRON_WORKERS, len(name_list))
+    # Worker processes must not share database connections with the parent
+    pgsql.close_all_connections()
+    with ProcessPoolExecutor(workers) as pool:
+        future_list = [(x, pool.submit(_run_task_process, x))
+            for x in name_list]
+        for name, future in future_list:
+            try:
+                future.result()
+            except Exception:
+                logger.error('Cron worker for task %s crashed', name,
+                    exc_info=True)
@@ -17,7 +17,7 @@
 from django.db.models.expressions import OrderBy
 from django.db.models.sql import compiler
 from django.db.models import QuerySet
-from django.db import models, DEFAULT_DB_ALIAS, connections
+from django.db import models, router, DEFAULT_DB_ALIAS, connections
 from django.utils import timezone
 from collections import OrderedDict
 
@@ -124,6 +124,10 @@ class Expression(object):
     AND = BinaryOp('AND')
     OR = BinaryOp('OR')
 
+    # pg_trgm similarity operator, escaped for parameter substitution
+    TRIGRAM_SIMILAR = BinaryOp('%%')
+    SIMILARITY = FunctionOp('similarity', 2, 2)
+
     def __init__(self, op, *children):
         self._op = op
         self._children = children
@@ -266,6 +270,13 @@ class StringMixin(OrderedMixin):
     def tsquery(self, query, conf='simple'):
         return TSExpression('to_tsquery', self, query, conf)
 
+    # Trigram matching requires the pg_trgm extension
+    def trigram_similar(self, value):
+        return BooleanExpression(self.TRIGRAM_SIMILAR, self, make_expr(value))
+
+    def similarity(self, value):
+        return NumericExpression(self.SIMILARITY, self, make_expr(value))
+
 class ConstExpression(Expression):
     def __init__(self, value):
         self._value = value
@@ -293,6 +304,12 @@ class SubqueryExpression(Expression):
         comp2 = self._query.get_compiler(connection=connection)
         return comp2.as_sql()
 
+class ScalarSubqueryExpression(OrderedMixin, SubqueryExpression):
+    def as_sql(self, compiler, connection):
+        sql, params = super(ScalarSubqueryExpression, self).as_sql(compiler,
+            connection)
+        return '({0})'.format(sql), list(params)
+
 class BelongsExpression(BooleanExpression):
     def __init__(self, lhs, rhs):
         self._lhs = lhs
@@ -331,8 +348,9 @@ class LikeExpression(BooleanExpression):
         return self._pattern
 
     def as_sql(self, compiler, connection):
+        # ILIKE can use trigram indexes on the plain column
         if self._ignore_case:
-            template = '(UPPER({lhs}) LIKE UPPER(%s))'
+            template = '({lhs} ILIKE %s)'
         else:
             template = '({lhs} LIKE %s)'
         lhs, ret_params = compiler.compile(self._lhs)
@@ -450,6 +468,10 @@ def stddev_samp(expr):
 def all(query):
     return Expression(FunctionOp('ALL'), SubqueryExpression(query))
 
+# Subquery must select exactly one column and return at most one row
+def scalar(query):
+    return ScalarSubqueryExpression(query)
+
 # Note: PostgreSQL ignores NULL values in GREATEST() and LEAST()
 # MySQL returns NULL if any argument is NULL.
 def greatest(*exprs):
@@ -675,14 +697,32 @@ class SelectQuery(Joinable):
         alias = compiler.query.table_aliases[self]
         return '({sql}) AS {alias}'.format(sql=sql, alias=alias), list(params)
 
-    def queryset(self, model, translations=None):
-        sql, params = self.get_compiler(model.objects.db).as_sql()
-        return model.objects.raw(sql, params, translations)
+    def base_model(self):
+        """Return model of the first table in FROM clause"""
+        node = self.from_
+        while not isinstance(node, Table):
+            if isinstance(node, Join):
+                node = node._tbl1
+            else:
+                node = node.from_
+        return node._model
+
+    def db_for_execute(self):
+        """Select database alias using the configured database routers"""
+        if self.select_for_update:
+            return router.db_for_write(self.base_model())
+        return router.db_for_read(self.base_model())
+
+    def queryset(self, model, translations=None, using=None):
+        if using is None:
+            using = model.objects.db
+        sql, params = self.get_compiler(using).as_sql()
+        return model.objects.db_manager(using).raw(sql, params, translations)
 
     def execute(self, using=None, connection=None):
         if using is None and connection is None:
-            using = DEFAULT_DB_ALIAS
-        compiler = self.get_compiler(using=using)
+            using = self.db_for_execute()
+        compiler = self.get_compiler(using=using, connection=connection)
         return SQLResult(compiler, compiler.execute_sql())
 
     def __iter__(self):
@@ -690,8 +730,8 @@ class SelectQuery(Joinable):
 
     def model_result(self, mapping, using=None, connection=None):
         if using is None and connection is None:
-            using = DEFAULT_DB_ALIAS
-        compiler = self.get_compiler(using=using)
+            using = self.db_for_execute()
+        compiler = self.get_compiler(using=using, connection=connection)
         return ModelResult(mapping, compiler, compiler.execute_sql())
 
     # Django QuerySet/SQLCompiler compatibility methods
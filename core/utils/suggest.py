@@ -0,0 +1,311 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import atomic, on_commit
+from ..models import const
+from .scheduler import budget_exhausted
+from .utils import fold_or, make_chunks
+from .. import models
+import json
+import re
+import unicodedata
+
+INDEX_BATCH_SIZE = 1000
+# Name matches below this trigram similarity are dropped (pg_trgm default)
+MIN_SIMILARITY = 0.3
+# Name matches score at most 1.0, e-mail matches always rank above them
+EMAIL_SCORE = 2.0
+# Common names may match thousands of papers, keep only the best ones
+MAX_PERSON_SUGGESTIONS = 1000
+
+_nonword_re = re.compile(r'[\W_]+')
+
+# Concurrent indexing of papers and refresh of people may compute the same
+# (person, paper) pair, the later one wins
+_insert_suggestions_sql = '''INSERT INTO {table}
+    (person_id, paper_id, match_type, score)
+VALUES {values} ON CONFLICT (person_id, paper_id)
+DO UPDATE SET match_type = EXCLUDED.match_type, score = EXCLUDED.score'''
+
+REFRESH_PERSON_TASK = 'refresh_person_suggestions'
+
+def fold_name(name):
+    """Case and accent insensitive form of a name"""
+    name = unicodedata.normalize('NFKD', name.casefold())
+    name = ''.join((x for x in name if not unicodedata.combining(x)))
+    return ' '.join(_nonword_re.sub(' ', name).split())
+
+def name_key(last_name, first_name):
+    """Suggestion lookup key: folded last name and first initial"""
+    max_len = models.Person._meta.get_field('name_key').max_length
+    last_name = fold_name(last_name)
+    if not last_name:
+        return ''
+    return (last_name + ' ' + fold_name(first_name)[:1]).strip()[:max_len]
+
+def author_name_keys(author_name):
+    """Lookup keys of PaperAuthorName. Importers store author names as
+    "Last, First" but names without comma may be in either order, those
+    get a second key for the "First Last" order. Returns the tuple
+    (name_key, name_key_alt)."""
+    if ',' in author_name:
+        last_name, first_name = author_name.split(',', 1)
+        return (name_key(last_name, first_name), None)
+    tokens = author_name.split()
+    key = name_key(' '.join(tokens[:1]), ' '.join(tokens[1:]))
+    if len(tokens) < 2:
+        return (key, None)
+    alt_key = name_key(tokens[-1], ' '.join(tokens[:-1]))
+    return (key, alt_key if alt_key != key else None)
+
+def _trigrams(text):
+    # Same word padding as pg_trgm
+    ret = set()
+    for word in fold_name(text).split():
+        word = '  ' + word + ' '
+        ret.update((word[i:i+3] for i in range(len(word) - 2)))
+    return ret
+
+def similarity(name1, name2):
+    """Trigram similarity of two names, compatible with pg_trgm"""
+    tri1 = _trigrams(name1)
+    tri2 = _trigrams(name2)
+    if not tri1 or not tri2:
+        return 0.0
+    return len(tri1 & tri2) / len(tri1 | tri2)
+
+def _person_name(first_name, last_name):
+    return last_name + ' ' + first_name
+
+def _email_query(field, email_list):
+    return fold_or([field.iexact(x) for x in email_list])
+
+def _save_suggestions(candidates, limit=None):
+    """Store best match for each (person, paper) pair except for papers
+    which the person already claimed or reviewed"""
+    best = dict()
+    for person_id, paper_id, match_type, score in candidates:
+        key = (person_id, paper_id)
+        if key not in best or best[key][1] < score:
+            best[key] = (match_type, score)
+    if not best:
+        return 0
+    person_ids = set((x[0] for x in best))
+    paper_ids = set((x[1] for x in best))
+    reftab = models.PaperAuthorReference.query_model
+    query = (reftab.paper.belongs(paper_ids) &
+        reftab.author_alias.target.belongs(person_ids))
+    qs = models.PaperAuthorReference.objects.filter(query)
+    excluded = set(qs.values_list('author_alias__target_id', 'paper_id'))
+    revtab = models.PaperReview.query_model
+    query = (revtab.paper.belongs(paper_ids) &
+        revtab.posted_by.belongs(person_ids) & (revtab.deleted == False))
+    qs = models.PaperReview.objects.filter(query)
+    excluded.update(qs.values_list('posted_by_id', 'paper_id'))
+    item_list = sorted(((k, v) for k, v in best.items() if k not in excluded),
+        key=lambda x: x[1][1], reverse=True)
+    if limit is not None:
+        item_list = item_list[:limit]
+    if not item_list:
+        return 0
+    # Sorted insert avoids deadlocks between concurrent transactions
+    row_list = sorted((k + v for k, v in item_list))
+    connection = connections[DEFAULT_DB_ALIAS]
+    table = connection.ops.quote_name(
+        models.AuthorshipSuggestion._meta.db_table)
+    for chunk in make_chunks(row_list, INDEX_BATCH_SIZE):
+        query = _insert_suggestions_sql.format(table=table,
+            values=','.join(['(%s,%s,%s,%s)'] * len(chunk)))
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, [y for x in chunk for y in x])
+        finally:
+            cursor.close()
+    return len(row_list)
+
+def _paper_email_candidates(paper_ids):
+    email_type = const.authorship_match_types.EMAIL
+    scheme = const.person_alias_schemes.EMAIL
+    reftab = models.PaperAuthorReference.query_model
+    query = (reftab.paper.belongs(paper_ids) &
+        reftab.author_alias.target.isnull() &
+        (reftab.author_alias.scheme == scheme))
+    qs = models.PaperAuthorReference.objects.filter(query)
+    ref_list = list(qs.values_list('paper_id', 'author_alias__identifier'))
+    if not ref_list:
+        return []
+    # E-mail addresses are matched case insensitively
+    owner_map = dict()
+    email_list = list(set((x[1] for x in ref_list)))
+    usertab = models.User.query_model
+    aliastab = models.PersonAlias.query_model
+    for chunk in make_chunks(email_list, 100):
+        query = _email_query(usertab.email, chunk)
+        qs = models.User.objects.filter_active().filter(query)
+        for email, person_id in qs.values_list('email', 'person_id'):
+            owner_map.setdefault(email.upper(), set()).add(person_id)
+        query = ((aliastab.scheme == scheme) &
+            (aliastab.target.is_active == True) &
+            _email_query(aliastab.identifier, chunk))
+        qs = models.PersonAlias.objects.filter(query)
+        for email, person_id in qs.values_list('identifier', 'target_id'):
+            owner_map.setdefault(email.upper(), set()).add(person_id)
+    return [(person_id, paper_id, email_type, EMAIL_SCORE)
+        for paper_id, email in ref_list
+        for person_id in owner_map.get(email.upper(), [])]
+
+def _person_email_candidates(person):
+    email_type = const.authorship_match_types.EMAIL
+    scheme = const.person_alias_schemes.EMAIL
+    aliastab = models.PersonAlias.query_model
+    qs = models.User.objects.filter_by_person(person)
+    email_set = set((x for x in qs.values_list('email', flat=True) if x))
+    query = (aliastab.scheme == scheme) & (aliastab.target == person)
+    qs = models.PersonAlias.objects.filter(query)
+    email_set.update(qs.values_list('identifier', flat=True))
+    if not email_set:
+        return []
+    query = ((aliastab.scheme == scheme) & aliastab.target.isnull() &
+        _email_query(aliastab.identifier, email_set))
+    subq = models.PersonAlias.objects.filter(query).values_list('pk')
+    reftab = models.PaperAuthorReference.query_model
+    qs = models.PaperAuthorReference.objects.filter(
+        reftab.author_alias.belongs(subq))
+    return [(person.pk, paper_id, email_type, EMAIL_SCORE)
+        for paper_id in qs.values_list('paper_id', flat=True)]
+
+def _index_paper_chunk(paper_ids):
+    name_type = const.authorship_match_types.NAME
+    nametab = models.PaperAuthorName.query_model
+    persontab = models.Person.query_model
+    stab = models.AuthorshipSuggestion.query_model
+    queuetab = models.PendingSuggestionPaper.query_model
+    papertab = models.Paper.query_model
+    with atomic():
+        # Serialize indexing of the same papers
+        qs = models.Paper.objects.filter(papertab.pk.belongs(paper_ids))
+        list(qs.select_for_update().order_by('pk').values_list('pk'))
+        qs = models.PendingSuggestionPaper.objects.filter(
+            queuetab.paper_id.belongs(paper_ids))
+        qs.delete()
+        qs = models.PaperAuthorName.objects.filter(
+            nametab.paper.belongs(paper_ids))
+        name_list = []
+        pending_map = dict()
+        for pk, paper_id, author_name, key, alt_key in qs.values_list('pk',
+            'paper_id', 'author_name', 'name_key', 'name_key_alt'):
+            if key is None:
+                key, alt_key = author_name_keys(author_name)
+                pending_map.setdefault((key, alt_key), []).append(pk)
+            keys = set((x for x in (key, alt_key) if x))
+            name_list.append((paper_id, author_name, keys))
+        for (key, alt_key), id_list in pending_map.items():
+            qs = models.PaperAuthorName.objects.filter(
+                nametab.pk.belongs(id_list))
+            qs.update(name_key=key, name_key_alt=alt_key)
+
+        person_map = dict()
+        key_set = set((y for x in name_list for y in x[2]))
+        if key_set:
+            qs = models.Person.objects.filter_active().filter(
+                persontab.name_key.belongs(key_set))
+            for pk, first_name, last_name, key in qs.values_list('pk',
+                'first_name', 'last_name', 'name_key'):
+                item = (pk, _person_name(first_name, last_name))
+                person_map.setdefault(key, []).append(item)
+        candidates = []
+        for paper_id, author_name, keys in name_list:
+            # Both keys may point to the same person
+            person_set = set((y for x in keys for y in person_map.get(x, [])))
+            for person_id, person_name in person_set:
+                score = similarity(person_name, author_name)
+                if score >= MIN_SIMILARITY:
+                    candidates.append((person_id, paper_id, name_type, score))
+        candidates.extend(_paper_email_candidates(paper_ids))
+        qs = models.AuthorshipSuggestion.objects.filter(
+            stab.paper.belongs(paper_ids))
+        qs.delete()
+        return _save_suggestions(candidates)
+
+def index_papers(paper_ids):
+    """Recompute authorship suggestions for given papers. Returns the number
+    of created suggestions."""
+    paper_ids = sorted(set(paper_ids))
+    return sum((_index_paper_chunk(x)
+        for x in make_chunks(paper_ids, INDEX_BATCH_SIZE)))
+
+def schedule_indexing(paper_ids):
+    """Index papers after the current transaction commits"""
+    id_list = list(paper_ids)
+    on_commit(lambda: index_papers(id_list))
+
+def index_pending_papers():
+    """Index papers queued in PendingSuggestionPaper which were missed by
+    schedule_indexing()"""
+    ret = 0
+    while not budget_exhausted():
+        qs = models.PendingSuggestionPaper.objects.order_by('pk')
+        qs = qs.values_list('paper_id', flat=True)
+        paper_ids = set(qs[:INDEX_BATCH_SIZE])
+        if not paper_ids:
+            break
+        index_papers(paper_ids)
+        ret += len(paper_ids)
+    return ret
+
+def refresh_person(person_id):
+    """Recompute authorship suggestions for given person. Returns the number
+    of created suggestions."""
+    name_type = const.authorship_match_types.NAME
+    persontab = models.Person.query_model
+    nametab = models.PaperAuthorName.query_model
+    stab = models.AuthorshipSuggestion.query_model
+    with atomic():
+        # Serialize refreshes of the same person
+        qs = models.Person.objects.filter(persontab.pk == person_id)
+        person = qs.select_for_update().first()
+        qs = models.AuthorshipSuggestion.objects.filter(
+            stab.person == person_id)
+        qs.delete()
+        if person is None or not person.is_active:
+            return 0
+        candidates = []
+        if person.name_key:
+            person_name = _person_name(person.first_name, person.last_name)
+            query = ((nametab.name_key == person.name_key) |
+                (nametab.name_key_alt == person.name_key))
+            qs = models.PaperAuthorName.objects.filter(query)
+            for paper_id, author_name in qs.values_list('paper_id',
+                'author_name'):
+                score = similarity(person_name, author_name)
+                if score >= MIN_SIMILARITY:
+                    candidates.append((person.pk, paper_id, name_type, score))
+        candidates.extend(_person_email_candidates(person))
+        return _save_suggestions(candidates, MAX_PERSON_SUGGESTIONS)
+
+def schedule_person_refresh(person_id):
+    """Refresh person's suggestions in a background job. The refresh scans
+    all author names with the person's name key, it must not slow down
+    requests."""
+    from .jobs import enqueue
+    jobtab = models.Job.query_model
+    arguments = dict(person_id=person_id)
+    query = ((jobtab.task == REFRESH_PERSON_TASK) &
+        (jobtab.status == const.job_statuses.PENDING) &
+        (jobtab.arguments == json.dumps(arguments)))
+    if not models.Job.objects.filter(query).exists():
+        enqueue(REFRESH_PERSON_TASK, **arguments)
@@ -0,0 +1,209 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from django.db import connection, connections
+from django.urls import reverse
+from .utils import list_map
+from ..models import const
+from .. import models
+
+SYNC_PAGE_SIZE = 1000
+
+# Sequence numbers are assigned before commit so a transaction may become
+# visible after changes with higher sequence numbers were already served.
+# Changes are therefore served ordered by (transaction ID, sequence number)
+# and only from transactions older than any transaction still in progress.
+# No new changes can appear before the cursor that way. Long running
+# transactions delay the feed but nothing gets skipped.
+
+_paper_flags = ('contents_theory', 'contents_survey', 'contents_observation',
+    'contents_experiment', 'contents_metaanalysis')
+
+def _paper_url(request, paper_id):
+    url = reverse('core:paper_detail', kwargs=dict(pk=paper_id))
+    return request.build_absolute_uri(url)
+
+def _serialize_papers(request, id_list):
+    paper_map = models.Paper.objects.filter_public().in_bulk(id_list)
+    public_ids = list(paper_map.keys())
+    aliastab = models.PaperAlias.query_model
+    query = (aliastab.target.belongs(public_ids) &
+        (aliastab.scheme != const.paper_alias_schemes.SCISWARM))
+    qs = models.PaperAlias.objects.filter(query)
+    alias_map = list_map(((x[0], x[1:]) for x in qs.values_list('target_id',
+        'scheme', 'identifier')))
+    qs = models.PaperAuthorReference.objects.filter_unrejected(public_ids)
+    qs = qs.select_related('author_alias__target')
+    author_map = dict()
+    name_map = dict()
+    for item in qs:
+        alias = item.author_alias
+        # Local usernames mean nothing on other servers
+        if alias.scheme == const.person_alias_schemes.SCISWARM:
+            name = alias.target.plain_name if alias.target else None
+            if name:
+                name_map.setdefault(item.paper_id, []).append(str(name))
+            continue
+        tmp = author_map.setdefault(item.paper_id, [])
+        tmp.append((alias.scheme, alias.identifier))
+    antab = models.PaperAuthorName.query_model
+    qs = models.PaperAuthorName.objects.filter(antab.paper.belongs(public_ids))
+    for paper_id, name in qs.values_list('paper_id', 'author_name'):
+        name_map.setdefault(paper_id, []).append(name)
+    kwtab = models.PaperKeyword.query_model
+    qs = models.PaperKeyword.objects.filter(kwtab.paper.belongs(public_ids))
+    keyword_map = list_map(qs.values_list('paper_id', 'keyword'))
+    papertab = models.Paper.query_model
+    qs = models.Paper.objects.filter(papertab.pk.belongs(public_ids) &
+        papertab.bibliography.notnull())
+    bib_map = list_map(((x[0], x[1:]) for x in qs.values_list('pk',
+        'bibliography__scheme', 'bibliography__identifier')))
+    qs = models.Paper.objects.filter(papertab.pk.belongs(public_ids) &
+        papertab.fields.notnull())
+    field_map = list_map(((x[0], x[1:]) for x in qs.values_list('pk',
+        'fields__field', 'fields__name')))
+
+    ret = dict()
+    for pk in id_list:
+        paper = paper_map.get(pk)
+        record = dict(id=_paper_url(request, pk), deleted=(paper is None))
+        ret[pk] = record
+        if paper is None:
+            continue
+        data = dict(((x, getattr(paper, x)) for x in _paper_flags))
+        data.update(name=paper.name, abstract=paper.abstract,
+            year_published=paper.year_published, cite_as=paper.cite_as,
+            identifiers=alias_map.get(pk, []),
+            authors=author_map.get(pk, []),
+            author_names=name_map.get(pk, []),
+            keywords=keyword_map.get(pk, []),
+            bibliography=bib_map.get(pk, []),
+            subfields=field_map.get(pk, []))
+        record['data'] = data
+    return ret
+
+def _serialize_reviews(request, id_list):
+    qs = models.PaperReview.objects.filter_public()
+    review_map = qs.select_related('posted_by').in_bulk(id_list)
+    ret = dict()
+    for pk in id_list:
+        review = review_map.get(pk)
+        record = dict(id=pk, deleted=(review is None))
+        ret[pk] = record
+        if review is None:
+            continue
+        posted_by = review.posted_by and review.posted_by.username
+        record['data'] = dict(paper=_paper_url(request, review.paper_id),
+            posted_by=posted_by, methodology=review.methodology,
+            importance=review.importance, message=review.message,
+            date_posted=review.date_posted, date_changed=review.date_changed)
+    return ret
+
+def _serialize_events(request, id_list):
+    evtab = models.FeedEvent.query_model
+    qs = models.FeedEvent.objects.filter(evtab.paper.public == True)
+    event_map = qs.select_related('person').in_bulk(id_list)
+    ret = dict()
+    for pk in id_list:
+        event = event_map.get(pk)
+        record = dict(id=pk, deleted=(event is None))
+        ret[pk] = record
+        if event is None:
+            continue
+        record['data'] = dict(person=event.person.username,
+            paper=_paper_url(request, event.paper_id),
+            event_type=event.event_type, event_date=event.event_date)
+    return ret
+
+_serializers = dict(paper=_serialize_papers, review=_serialize_reviews,
+    event=_serialize_events)
+
+def format_cursor(cursor):
+    return '{0}.{1}'.format(*cursor)
+
+def parse_cursor(value):
+    """Parse cursor created by format_cursor(). Plain "0" means start."""
+    parts = value.split('.')
+    if len(parts) > 2 or not all((x.isdigit() for x in parts)):
+        raise ValueError('Invalid sync cursor: ' + value)
+    parts = [int(x) for x in parts]
+    return (parts[0], parts[1] if len(parts) > 1 else 0)
+
+def _snapshot_xmin(using):
+    """Return the oldest transaction ID which may still be in progress"""
+    cursor = connections[using].cursor()
+    try:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+def change_batch(request, since, limit=SYNC_PAGE_SIZE):
+    """Return (next cursor, more flag, list of changed records).
+
+    Cursors are (transaction ID, sequence number) pairs. Records are ordered
+    by transaction ID and change sequence number. Each changed object is
+    listed only once, at the position of its latest change in the batch.
+    """
+    table = models.ChangeLogEntry.query_model
+    qs = models.ChangeLogEntry.objects.all()
+    # Must come from the same database as the log entries
+    xmin = _snapshot_xmin(qs.db)
+    since_txid, since_seq = since
+    query = ((table.txid < xmin) & ((table.txid > since_txid) |
+        ((table.txid == since_txid) & (table.pk > since_seq))))
+    qs = qs.filter(query).order_by('txid', 'pk')
+    entries = list(qs.values_list('txid', 'pk', 'kind', 'object_id',
+        'change_date')[:limit])
+    if not entries:
+        return since, False, []
+    latest = OrderedDict()
+    for txid, seq, kind, object_id, change_date in entries:
+        latest.pop((kind, object_id), None)
+        latest[(kind, object_id)] = (seq, change_date)
+    kind_map = list_map(latest.keys())
+    data_map = dict()
+    for kind, id_list in kind_map.items():
+        serializer = _serializers.get(kind)
+        if serializer is None:
+            continue
+        for object_id, record in serializer(request, id_list).items():
+            data_map[(kind, object_id)] = record
+    ret = []
+    for key, (seq, change_date) in latest.items():
+        record = data_map.get(key)
+        if record is None:
+            continue
+        record.update(seq=seq, kind=key[0], date=change_date)
+        ret.append(record)
+    return entries[-1][:2], len(entries) >= limit, ret
+
+def compact_change_log():
+    """Delete log entries superseded by a later change of the same object.
+
+    Later means later in change_batch() order, otherwise a client which
+    already passed the remaining entry could miss the change."""
+    table = connection.ops.quote_name(models.ChangeLogEntry._meta.db_table)
+    sql = '''DELETE FROM {0} AS a USING {0} AS b
+        WHERE a.kind = b.kind AND a.object_id = b.object_id
+        AND (a.txid, a.id) < (b.txid, b.id)'''
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql.format(table))
+        return cursor.rowcount
+    finally:
+        cursor.close()
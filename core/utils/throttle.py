@@ -0,0 +1,118 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+from .. import models
+import hashlib
+import time
+
+THROTTLE_KEY_PREFIX = 'sciswarm.throttle.'
+
+class SlidingWindowThrottle(object):
+    """Approximate sliding window event counter stored in shared cache.
+
+    Events are counted in fixed buckets of window length. The current count
+    is the current bucket plus the part of the previous bucket which still
+    overlaps the sliding window. Each check or hit costs one cache round trip
+    regardless of the number of events.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    def _keys(self, ident, now):
+        bucket = int(now // self.window)
+        digest = hashlib.md5(force_bytes(ident)).hexdigest()
+        prefix = '{0}{1}.{2}.'.format(THROTTLE_KEY_PREFIX, self.name, digest)
+        overlap = 1 - (now % self.window) / self.window
+        return prefix + str(bucket), prefix + str(bucket - 1), overlap
+
+    def count(self, ident, now=None):
+        if now is None:
+            now = time.time()
+        cur_key, prev_key, overlap = self._keys(ident, now)
+        data = self.cache.get_many([cur_key, prev_key])
+        return data.get(cur_key, 0) + data.get(prev_key, 0) * overlap
+
+    def blocked(self, ident, now=None):
+        return self.count(ident, now) >= self.limit
+
+    def hit(self, ident, now=None):
+        """Record event and return the new count"""
+        if now is None:
+            now = time.time()
+        cur_key, prev_key, overlap = self._keys(ident, now)
+        # Buckets must survive until they stop overlapping the window
+        timeout = 2 * self.window
+        cache = self.cache
+        if cache.add(cur_key, 1, timeout):
+            current = 1
+        else:
+            try:
+                current = cache.incr(cur_key)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(cur_key, 1, timeout)
+                current = 1
+        return current + (cache.get(prev_key) or 0) * overlap
+
+    def reset(self, ident, now=None):
+        if now is None:
+            now = time.time()
+        cur_key, prev_key, overlap = self._keys(ident, now)
+        self.cache.delete_many([cur_key, prev_key])
+
+# Failed login attempts per account and per client address within the window
+LOGIN_THROTTLE_WINDOW = 3600
+username_throttle = SlidingWindowThrottle('login_user', 20,
+    LOGIN_THROTTLE_WINDOW)
+client_throttle = SlidingWindowThrottle('login_ip', 10, LOGIN_THROTTLE_WINDOW)
+
+def _clean_username(username):
+    return username[:models.BruteLog._meta.get_field('username').max_length]
+
+def username_blocked(username):
+    return username_throttle.blocked(_clean_username(username))
+
+def client_blocked(request):
+    return client_throttle.blocked(request.META['REMOTE_ADDR'])
+
+def login_failure(request, username):
+    """Record failed login. Only the start of each block is logged to the
+    database for audit."""
+    username = _clean_username(username or '')
+    ip_address = request.META['REMOTE_ADDR']
+    user_count = username_throttle.hit(username)
+    client_count = client_throttle.hit(ip_address)
+    if user_count - 1 < username_throttle.limit <= user_count:
+        models.BruteLog.objects.create(username=username,
+            ip_address=ip_address)
+    elif client_count - 1 < client_throttle.limit <= client_count:
+        models.BruteLog.objects.create(ip_address=ip_address)
+
+def login_success(request, username):
+    """Clear failure count of the account after successful login. Client
+    address count stays, an attacker could otherwise reset it by logging
+    into their own account."""
+    username_throttle.reset(_clean_username(username))
@@ -17,7 +17,7 @@
 from django.conf import settings
 from django.contrib.auth import views, REDIRECT_FIELD_NAME
 from django.contrib.auth.decorators import login_required
-from django.db.transaction import atomic, on_commit
+from django.db.transaction import atomic
 from django.http import HttpResponseRedirect, Http404
 from django.shortcuts import render
 from django.urls import reverse, reverse_lazy
@@ -35,6 +35,7 @@ from ..forms.auth import (LoginForm, RegistrationForm, UserProfileUpdateForm,
     PasswordChangeForm, SetPasswordForm, DeleteAccountForm)
 from ..utils.html import NavigationBar, full_reverse, query_string
 from ..utils.l10n import TIMEZONE_SESSION_KEY
+from ..utils import throttle
 from ..utils.mail import send_template_mail
 from .. import models
 
@@ -45,8 +46,7 @@ from .. import models
 def login(request):
     if request.user.is_authenticated:
         return utils.permission_denied(request)
-    models.BruteBlock.objects.purge_stale()
-    if models.BruteBlock.client_blocked(request):
+    if throttle.client_blocked(request):
         if request.POST:
             return HttpResponseRedirect(request.get_full_path())
         return render(request, 'core/account/tempblock.html', dict())
@@ -139,17 +139,15 @@ class RegistrationView(BaseCreateView):
 
     def form_valid(self, form):
         ret = super(RegistrationView, self).form_valid(form)
-        def callback(request=self.request, form=form):
-            template = 'core/email/registered'
-            subject = _('Welcome to Sciswarm!')
-            uid = urlsafe_base64_encode(force_bytes(form.instance.pk))
-            verify_args = query_string(ref=uid,
-                token=form.instance.verification_key)
-            url = full_reverse(self.request, 'core:verify_user_email')
-            context = dict(verify_url=''.join([url, '?', verify_args]))
-            send_template_mail(self.request, subject, template, context,
-                [form.instance.email])
-        on_commit(callback)
+        template = 'core/email/registered'
+        subject = _('Welcome to Sciswarm!')
+        uid = urlsafe_base64_encode(force_bytes(form.instance.pk))
+        verify_args = query_string(ref=uid,
+            token=form.instance.verification_key)
+        url = full_reverse(self.request, 'core:verify_user_email')
+        context = dict(verify_url=''.join([url, '?', verify_args]))
+        send_template_mail(self.request, subject, template, context,
+            [form.instance.email])
         return ret
 
 @method_decorator(sensitive_post_parameters(), name='dispatch')
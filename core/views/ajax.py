@@ -15,11 +15,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from collections import OrderedDict
-from django.http import JsonResponse
-from django.shortcuts import render
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
 from .base import BaseListView
+from ..utils.autocomplete import SOURCES, autocomplete
 from .. import models
 
 def science_subfields(request):
@@ -30,3 +31,18 @@ def science_subfields(request):
         qs = qs.filter(query)
     ret = [(x.pk, str(x)) for x in qs]
     return JsonResponse(ret, safe=False)
+
+def autocomplete_values(request, source):
+    if source not in SOURCES:
+        raise Http404()
+    value = request.GET.get('value', '')
+    tpl = 'core/utils/autocomplete.html'
+    context = dict(object_list=autocomplete(source, value))
+    return render(request, tpl, context)
+
+def job_status(request, token):
+    qs = models.Job.objects.filter(models.Job.query_model.token == token)
+    job = get_object_or_404(qs)
+    ret = dict(status=job.status, status_display=job.get_status_display(),
+        finished=job.is_finished())
+    return JsonResponse(ret)
@@ -28,11 +28,21 @@ from ..forms.comment import PaperReviewForm, PaperReviewResponseForm
 from .base import (BaseCreateView, BaseUpdateView, BaseListView,
     SearchListView, BaseModelFormsetView, BaseDeleteView, BaseUnlinkAliasView)
 from .utils import paper_navbar, PageNavigator
+from ..utils.http import ConditionalGetMixin, row_version
+from ..utils.paper import paper_review_version_query
 from .. import models
 
-class PaperReviewListView(BaseListView):
+class PaperReviewListView(ConditionalGetMixin, BaseListView):
     template_name = 'core/comment/paperreview_list.html'
 
+    def get_version(self):
+        query = paper_review_version_query(self.kwargs['pk'])
+        row = query.execute().first()
+        if row is None or not row['public']:
+            return None
+        return row_version(row, 'last_changed', 'review_changed',
+            'response_changed')
+
     # TODO: Pin the current user's own review at the top of first page
     def get_queryset(self):
         qs = models.Paper.objects.filter_public()
@@ -54,11 +64,23 @@ class PaperReviewListView(BaseListView):
         ret['navbar'] = paper_navbar(self.request, self.paper)
         return ret
 
-class PaperReviewDetailView(DetailView):
+class PaperReviewDetailView(ConditionalGetMixin, DetailView):
     queryset = models.PaperReview.objects.filter_public().select_related(
         'paper', 'posted_by')
     template_name = 'core/comment/paperreview_detail.html'
 
+    def get_version(self):
+        qs = models.PaperReview.objects.filter(pk=self.kwargs['pk'])
+        paper_id = qs.values_list('paper_id', flat=True).first()
+        if paper_id is None:
+            return None
+        query = paper_review_version_query(paper_id, self.kwargs['pk'])
+        row = query.execute().first()
+        if row is None or not row['review_count']:
+            return None
+        return row_version(row, 'last_changed', 'review_changed',
+            'response_changed')
+
     def get_context_data(self, *args, **kwargs):
         ret = super(PaperReviewDetailView, self).get_context_data(*args,
             **kwargs)
@@ -14,21 +14,47 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
+from django.db.models import aggregates
 from django.db.transaction import atomic
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse, reverse_lazy
+from django.utils import feedgenerator
 from django.utils.decorators import method_decorator
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext_lazy as _, get_language
+from django.views.generic import View
 from .base import BaseListView
 from .utils import person_navbar
+from ..utils.feed import (person_channels, timeline_channels,
+    subfield_channel, keyword_channel, latest_event_id, channel_events)
+from ..utils.html import query_string
+from ..utils.http import ConditionalGetMixin
+from ..utils.routing import ReplicaReadMixin
 from .. import models
 
-class PersonEventFeed(BaseListView):
+class PersonEventFeed(ReplicaReadMixin, ConditionalGetMixin, BaseListView):
     template_name = 'core/event/feed_detail.html'
     paginate_by = 100
 
+    def get_version(self):
+        table = models.Person.query_model
+        qs = models.Person.objects.filter_active()
+        qs = qs.filter_username(self.kwargs['username'])
+        qs = qs.annotate(event_max=aggregates.Max(table.feedevent.pk.f()),
+            event_count=aggregates.Count(table.feedevent.pk.f()),
+            paper_changed=aggregates.Max(
+                table.feedevent.paper.last_changed.f()))
+        person = qs.first()
+        if person is None:
+            return None
+        # Events display paper titles
+        values = [person.pk, person.full_name, person.event_max,
+            person.event_count, person.paper_changed]
+        return None, values
+
     def get_queryset(self):
         qs = models.Person.objects.filter_active()
         qs = qs.filter_username(self.kwargs['username'])
@@ -42,3 +68,128 @@ class PersonEventFeed(BaseListView):
         ret['navbar'] = person_navbar(self.request, self.kwargs['username'],
             self.person)
         return ret
+
+class BaseSyndicationFeed(ReplicaReadMixin, ConditionalGetMixin, View):
+    """Atom, RSS and JSON Feed export of precomputed feed channels.
+
+    The URL pattern must provide "format" keyword argument. Clients may pass
+    "since_id" GET argument to fetch only events newer than the given ID.
+    """
+    page_size = 50
+    feed_classes = dict(atom=feedgenerator.Atom1Feed,
+        rss=feedgenerator.Rss201rev2Feed)
+
+    def get_channels(self):
+        raise NotImplementedError()
+
+    def get_title(self):
+        raise NotImplementedError()
+
+    def get_link(self):
+        return reverse('core:homepage')
+
+    def get_since_id(self):
+        try:
+            return int(self.request.GET.get('since_id'))
+        except (TypeError, ValueError):
+            return None
+
+    def get_version(self):
+        self.channels = self.get_channels()
+        values = [self.kwargs['format'], self.get_since_id(),
+            latest_event_id(self.channels)]
+        return None, values
+
+    def get(self, request, *args, **kwargs):
+        if not hasattr(self, 'channels'):
+            self.channels = self.get_channels()
+        event_list = channel_events(self.channels, self.get_since_id(),
+            self.page_size)
+        if self.kwargs['format'] == 'json':
+            return self.render_json(event_list)
+        return self.render_xml(event_list)
+
+    def event_data(self, event):
+        url = self.request.build_absolute_uri(event.paper.get_absolute_url())
+        return dict(id=str(event.pk), url=url, title=str(event),
+            summary=event.paper.abstract, author=event.person.plain_name,
+            date=event.event_date)
+
+    def render_xml(self, event_list):
+        cls = self.feed_classes[self.kwargs['format']]
+        title = str(self.get_title())
+        link = self.request.build_absolute_uri(self.get_link())
+        feed = cls(title=title, link=link, description=title,
+            language=get_language(),
+            feed_url=self.request.build_absolute_uri())
+        for event in event_list:
+            data = self.event_data(event)
+            unique_id = '{0}#event-{1}'.format(data['url'], data['id'])
+            feed.add_item(title=data['title'], link=data['url'],
+                description=data['summary'], unique_id=unique_id,
+                unique_id_is_permalink=False, pubdate=data['date'],
+                author_name=data['author'])
+        response = HttpResponse(content_type=feed.content_type)
+        feed.write(response, 'utf-8')
+        return response
+
+    def render_json(self, event_list):
+        items = []
+        for event in event_list:
+            data = self.event_data(event)
+            item = OrderedDict(id=data['id'], url=data['url'],
+                title=data['title'], content_text=data['summary'],
+                date_published=data['date'].isoformat(),
+                author=dict(name=data['author']))
+            items.append(item)
+        ret = OrderedDict(version='https://jsonfeed.org/version/1',
+            title=str(self.get_title()),
+            home_page_url=self.request.build_absolute_uri(self.get_link()),
+            feed_url=self.request.build_absolute_uri(), items=items)
+        return JsonResponse(ret, content_type='application/feed+json')
+
+class PersonSyndicationFeed(BaseSyndicationFeed):
+    def get_channels(self):
+        qs = models.Person.objects.filter_active()
+        qs = qs.filter_username(self.kwargs['username'])
+        self.person = get_object_or_404(qs)
+        return person_channels(self.person.pk)
+
+    def get_title(self):
+        return _('Latest Actions of %s') % self.person.full_name
+
+    def get_link(self):
+        kwargs = dict(username=self.kwargs['username'])
+        return reverse('core:person_event_feed', kwargs=kwargs)
+
+class TimelineSyndicationFeed(BaseSyndicationFeed):
+    """Timeline of the user identified by the secret token in the URL"""
+    def get_channels(self):
+        table = models.User.query_model
+        qs = models.User.objects.filter_active()
+        qs = qs.filter(table.feed_token == self.kwargs['token'])
+        user = get_object_or_404(qs)
+        return timeline_channels(user.person_id)
+
+    def get_title(self):
+        return _('Timeline')
+
+class SubfieldSyndicationFeed(BaseSyndicationFeed):
+    def get_channels(self):
+        qs = models.ScienceSubfield.objects.all()
+        self.subfield = get_object_or_404(qs, pk=self.kwargs['pk'])
+        return [subfield_channel(self.subfield.pk)]
+
+    def get_title(self):
+        return _('New Papers in %s') % self.subfield.full_name
+
+class KeywordSyndicationFeed(BaseSyndicationFeed):
+    def get_channels(self):
+        return [keyword_channel(self.kwargs['keyword'])]
+
+    def get_title(self):
+        return _('New Papers with Keyword: %s') % self.kwargs['keyword']
+
+    def get_link(self):
+        url = reverse('core:paper_list')
+        return url + '?' + query_string(keywords=self.kwargs['keyword'])
@@ -0,0 +1,36 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from ..utils import export
+
+@login_required
+@require_safe
+def export_dataset(request, dataset):
+    if dataset not in export.DATASETS:
+        raise Http404()
+    since = request.GET.get('since')
+    if since:
+        since = export.parse_since(since)
+        if since is None:
+            return HttpResponseBadRequest('Invalid "since" argument.')
+    content = export.compressed_stream(dataset, since or None)
+    response = StreamingHttpResponse(content, content_type='application/gzip')
+    filename = export.dataset_filename(dataset)
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
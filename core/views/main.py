@@ -18,11 +18,15 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import Http404
 from django.shortcuts import render
+from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _, get_language
 from .base import BaseListView
-from ..models import const
-from ..utils import sql, utils
+from ..utils import sql
+from ..utils.feed import user_feed_token
+from ..utils.follow import followed_events_condition
+from ..utils.http import ConditionalGetMixin
+from ..utils.routing import ReplicaReadMixin
 from .. import models
 
 def homepage(request):
@@ -45,47 +49,38 @@ def help_page(request, pagename='index'):
     return render(request, template_name, dict())
 
 @method_decorator(login_required, name='dispatch')
-class UserTimelineView(BaseListView):
+class UserTimelineView(ReplicaReadMixin, ConditionalGetMixin, BaseListView):
     template_name = 'core/event/feed_detail.html'
     paginate_by = 100
 
-    def get_queryset(self):
-        evtab = sql.Table(models.FeedEvent)
+    def get_version(self):
         stab = sql.Table(models.FeedSubscription)
-        evtypes = const.user_feed_events
-        subtypes = const.feed_subscription_types
-        person_id = self.request.user.person_id
-        type_map = {
-            subtypes.PAPERS: [evtypes.PAPER_POSTED,
-                evtypes.AUTHORSHIP_CONFIRMED],
-            subtypes.REVIEWS: evtypes.PAPER_REVIEW,
-            subtypes.RECOMMENDATIONS: evtypes.PAPER_RECOMMENDATION,
-        }
-
-        # Subscription subquery
-        cond_list = []
-        for subscription, events in type_map.items():
-            tmp = (stab.subscription_type == subscription)
-            if isinstance(events, (list, tuple)):
-                tmp &= evtab.event_type.belongs(events)
-            else:
-                tmp &= (evtab.event_type == events)
-            cond_list.append(tmp)
-        query = (evtab.person_id == stab.poster_id) & utils.fold_or(cond_list)
-        join = evtab.left_join(stab, query)
-        where = ((evtab.person_id == person_id) |
-            (stab.follower_id == person_id))
-        event_subq = join.select(evtab.pk, where=where)
+        where = (stab.follower_id == self.request.user.person_id)
+        alias = dict(subscription_max=sql.max(stab.pk),
+            subscription_count=sql.count())
+        subscriptions = stab.select(alias=alias, where=where).execute().first()
+        evtab = sql.Table(models.FeedEvent)
+        where = followed_events_condition(evtab.person_id, evtab.event_type,
+            self.request.user.person_id)
+        alias = dict(event_max=sql.max(evtab.pk), event_count=sql.count())
+        events = evtab.select(alias=alias, where=where).execute().first()
+        values = [subscriptions['subscription_max'],
+            subscriptions['subscription_count'], events['event_max'],
+            events['event_count']]
+        return None, values
 
-        # Main queryset
+    def get_queryset(self):
         feedtab = models.FeedEvent.query_model
-        poster_subq = models.Person.objects.filter_active().values_list('pk')
-        query = (feedtab.pk.belongs(event_subq) &
-            feedtab.person.pk.belongs(poster_subq))
+        query = followed_events_condition(feedtab.person.pk,
+            feedtab.event_type, self.request.user.person_id)
+        query &= (feedtab.person.is_active == True)
         return models.FeedEvent.objects.filter(query).select_related('person',
             'paper')
 
     def get_context_data(self, *args, **kwargs):
         ret = super(UserTimelineView, self).get_context_data(*args, **kwargs)
         ret['page_title'] = _('Timeline')
+        kwargs = dict(token=user_feed_token(self.request.user), format='atom')
+        ret['syndication_url'] = reverse('core:timeline_syndication',
+            kwargs=kwargs)
         return ret
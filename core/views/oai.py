@@ -0,0 +1,408 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# OAI-PMH 2.0 data provider, see
+# https://www.openarchives.org/OAI/openarchivesprotocol.html
+
+from django.conf import settings
+from django.db.models import aggregates
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_http_methods
+from xml.sax.saxutils import escape, quoteattr
+from .utils import fetch_authors
+from ..models import const
+from ..utils.routing import replica_read
+from ..utils.utils import list_map
+from .. import models
+import datetime
+import itertools
+import json
+import re
+
+# Records per response, the rest is available through resumption token
+OAI_PAGE_SIZE = 500
+# Records per database query for related data
+OAI_CHUNK_SIZE = 100
+
+OAI_DATE_FORMAT = '%Y-%m-%d'
+OAI_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+OAI_DC_PREFIX = 'oai_dc'
+
+_response_header = '''<?xml version="1.0" encoding="UTF-8"?>
+<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.openarchives.org/OAI/2.0/ http://www.openarchives.org/OAI/2.0/OAI-PMH.xsd">
+<responseDate>{date}</responseDate>
+{request}
+'''
+
+_oai_dc_header = '<oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.openarchives.org/OAI/2.0/oai_dc/ http://www.openarchives.org/OAI/2.0/oai_dc.xsd">'
+
+# verb: (required arguments, optional arguments, exclusive argument)
+_verb_args = {
+    'Identify': (set(), set(), None),
+    'ListMetadataFormats': (set(), set(['identifier']), None),
+    'ListSets': (set(), set(), 'resumptionToken'),
+    'GetRecord': (set(['identifier', 'metadataPrefix']), set(), None),
+    'ListIdentifiers': (set(['metadataPrefix']),
+        set(['from', 'until', 'set']), 'resumptionToken'),
+    'ListRecords': (set(['metadataPrefix']), set(['from', 'until', 'set']),
+        'resumptionToken'),
+}
+
+_alias_url_map = {
+    const.paper_alias_schemes.DOI: 'https://doi.org/{0}',
+    const.paper_alias_schemes.ARXIV: 'https://arxiv.org/abs/{0}',
+    const.paper_alias_schemes.ISBN: 'urn:isbn:{0}',
+    const.paper_alias_schemes.URL: '{0}',
+}
+
+class OaiError(Exception):
+    def __init__(self, code, message=''):
+        super(OaiError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+def _element(name, value, **attrs):
+    attr_str = ''.join((' {0}={1}'.format(k, quoteattr(str(v)))
+        for k, v in attrs.items()))
+    return '<{0}{1}>{2}</{0}>'.format(name, attr_str, escape(str(value)))
+
+def _format_datestamp(value):
+    return value.astimezone(datetime.timezone.utc).strftime(
+        OAI_DATETIME_FORMAT)
+
+def _parse_datestamp(value, until=False):
+    utc = datetime.timezone.utc
+    for fmt, step in ((OAI_DATE_FORMAT, datetime.timedelta(days=1)),
+        (OAI_DATETIME_FORMAT, datetime.timedelta(seconds=1))):
+        try:
+            ret = datetime.datetime.strptime(value, fmt).replace(tzinfo=utc)
+        except ValueError:
+            continue
+        # Until is inclusive, convert to exclusive upper bound
+        return (ret + step if until else ret), fmt
+    raise OaiError('badArgument', 'Invalid datestamp: ' + value)
+
+def _set_spec(subfield_id):
+    return 'subfield-{0}'.format(subfield_id)
+
+def _parse_set_spec(value):
+    match = re.match(r'^subfield-([0-9]+)\Z', value)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+def _record_identifier(request, paper_id):
+    return 'oai:{0}:p/{1}'.format(request.get_host(), paper_id)
+
+def _parse_identifier(request, identifier):
+    prefix = 'oai:{0}:p/'.format(request.get_host())
+    if identifier.startswith(prefix) and identifier[len(prefix):].isdigit():
+        return int(identifier[len(prefix):])
+    raise OaiError('idDoesNotExist', 'Unknown identifier: ' + identifier)
+
+def _encode_token(data):
+    return force_text(urlsafe_base64_encode(force_bytes(json.dumps(data))))
+
+def _decode_token(token):
+    try:
+        data = json.loads(force_text(urlsafe_base64_decode(token)))
+        data['after'] = (parse_datetime(data['after'][0]), int(data['after'][1]))
+        if data['after'][0] is None or data['cursor'] < 0:
+            raise ValueError()
+        return data
+    except Exception:
+        raise OaiError('badResumptionToken', 'Invalid resumption token.')
+
+def _parse_args(request):
+    args = request.POST if request.method == 'POST' else request.GET
+    verb = args.get('verb')
+    if verb not in _verb_args:
+        raise OaiError('badVerb', 'Illegal OAI verb.')
+    required, optional, exclusive = _verb_args[verb]
+    ret = dict(verb=verb)
+    for key in args:
+        value_list = args.getlist(key)
+        if len(value_list) != 1:
+            raise OaiError('badArgument', 'Repeated argument: ' + key)
+        ret[key] = value_list[0]
+    keys = set(ret.keys()) - set(['verb'])
+    if exclusive is not None and exclusive in keys:
+        if len(keys) > 1:
+            msg = '{0} must be the only argument.'.format(exclusive)
+            raise OaiError('badArgument', msg)
+        return ret
+    if not required.issubset(keys):
+        raise OaiError('badArgument', 'Missing required argument.')
+    if keys - required - optional:
+        raise OaiError('badArgument', 'Illegal argument.')
+    return ret
+
+def _check_metadata_prefix(prefix):
+    if prefix != OAI_DC_PREFIX:
+        raise OaiError('cannotDisseminateFormat',
+            'Unsupported metadata format: ' + prefix)
+
+def _list_filter(args):
+    if 'resumptionToken' in args:
+        return _decode_token(args['resumptionToken'])
+    _check_metadata_prefix(args['metadataPrefix'])
+    ret = dict(prefix=args['metadataPrefix'], cursor=0, after=None)
+    granularity = set()
+    for key in ('from', 'until'):
+        if key in args:
+            value, fmt = _parse_datestamp(args[key], key == 'until')
+            ret[key] = value.isoformat()
+            granularity.add(fmt)
+    if len(granularity) > 1:
+        msg = 'Arguments "from" and "until" have different granularity.'
+        raise OaiError('badArgument', msg)
+    if 'set' in args:
+        subfield_id = _parse_set_spec(args['set'])
+        qs = models.ScienceSubfield.objects.filter(pk=subfield_id)
+        if subfield_id is None or not qs.exists():
+            raise OaiError('badArgument', 'Unknown set: ' + args['set'])
+        ret['set'] = subfield_id
+    return ret
+
+def _record_queryset(filters):
+    table = models.Paper.query_model
+    qs = models.Paper.objects.all()
+    if filters.get('from'):
+        qs = qs.filter(table.last_changed >= parse_datetime(filters['from']))
+    if filters.get('until'):
+        qs = qs.filter(table.last_changed < parse_datetime(filters['until']))
+    if filters.get('set') is not None:
+        qs = qs.filter(table.fields == filters['set'])
+    if filters.get('after') is not None:
+        stamp, pk = filters['after']
+        qs = qs.filter((table.last_changed > stamp) |
+            ((table.last_changed == stamp) & (table.pk > pk)))
+    # Keyset pagination is backed by index on (last_changed, id)
+    return qs.order_by('last_changed', 'pk')
+
+def _alias_identifier(alias):
+    tpl = _alias_url_map.get(alias.scheme)
+    if tpl is None:
+        return ':'.join((alias.scheme, alias.identifier))
+    return tpl.format(alias.identifier)
+
+def _render_chunk(request, paper_list, with_metadata):
+    """Render list of records and fetch related data in bulk"""
+    id_list = [x.pk for x in paper_list]
+    fieldtab = models.Paper.query_model
+    qs = models.Paper.objects.filter(fieldtab.pk.belongs(id_list) &
+        fieldtab.fields.notnull())
+    field_map = list_map(qs.values_list('pk', 'fields'))
+    if with_metadata:
+        author_data = fetch_authors([x for x in paper_list if x.public])
+        author_map = dict(((x.pk, (refs, names))
+            for x, refs, names in author_data))
+        kwtab = models.PaperKeyword.query_model
+        qs = models.PaperKeyword.objects.filter(kwtab.paper.belongs(id_list))
+        keyword_map = list_map(qs.values_list('paper_id', 'keyword'))
+        aliastab = models.PaperAlias.query_model
+        qs = models.PaperAlias.objects.filter(aliastab.target.belongs(id_list))
+        alias_map = list_map(((x.target_id, x) for x in qs))
+        subfield_map = models.ScienceSubfield.objects.in_bulk(
+            set(itertools.chain.from_iterable(field_map.values())))
+
+    ret = []
+    for paper in paper_list:
+        tokens = ['<header status="deleted">' if not paper.public
+            else '<header>']
+        tokens.append(_element('identifier',
+            _record_identifier(request, paper.pk)))
+        tokens.append(_element('datestamp',
+            _format_datestamp(paper.last_changed)))
+        tokens.extend((_element('setSpec', _set_spec(x))
+            for x in field_map.get(paper.pk, [])))
+        tokens.append('</header>')
+        if not with_metadata:
+            ret.append(''.join(tokens) + '\n')
+            continue
+        ret.append('<record>' + ''.join(tokens))
+        if paper.public:
+            refs, names = author_map.get(paper.pk, ([], []))
+            url = request.build_absolute_uri(paper.get_absolute_url())
+            if paper.year_published is not None:
+                date = str(paper.year_published)
+            else:
+                date = timezone.localtime(paper.date_posted).date().isoformat()
+            tokens = ['<metadata>', _oai_dc_header,
+                _element('dc:title', paper.name)]
+            tokens.extend((_element('dc:creator', x.author_alias.target.plain_name)
+                for x in refs if x.author_alias.target is not None))
+            tokens.extend((_element('dc:creator', x.author_name)
+                for x in names))
+            tokens.extend((_element('dc:subject', x)
+                for x in keyword_map.get(paper.pk, [])))
+            tokens.extend((_element('dc:subject', subfield_map[x].name)
+                for x in field_map.get(paper.pk, []) if x in subfield_map))
+            tokens.append(_element('dc:description', paper.abstract))
+            tokens.append(_element('dc:date', date))
+            tokens.append(_element('dc:type', 'text'))
+            tokens.append(_element('dc:identifier', url))
+            tokens.extend((_element('dc:identifier', _alias_identifier(x))
+                for x in alias_map.get(paper.pk, [])
+                if x.scheme != const.paper_alias_schemes.SCISWARM))
+            if paper.cite_as:
+                tokens.append(_element('dc:source', paper.cite_as))
+            tokens.append('</oai_dc:dc></metadata>')
+            ret.append(''.join(tokens))
+        ret.append('</record>\n')
+    return ''.join(ret)
+
+def _response_start(request, args):
+    base_url = request.build_absolute_uri(reverse('core:oai_pmh'))
+    date = _format_datestamp(timezone.now())
+    if args is None:
+        req = _element('request', base_url)
+    else:
+        req = _element('request', base_url, **args)
+    return _response_header.format(date=date, request=req)
+
+def _error_response(request, args, error):
+    # Do not echo request arguments on badVerb and badArgument errors
+    if error.code in ('badVerb', 'badArgument'):
+        args = None
+    content = [_response_start(request, args),
+        _element('error', error.message, code=error.code), '\n</OAI-PMH>\n']
+    return HttpResponse(''.join(content), content_type='text/xml')
+
+def _xml_response(request, args, content):
+    content = [_response_start(request, args), content, '</OAI-PMH>\n']
+    return HttpResponse(''.join(content), content_type='text/xml')
+
+def _identify(request, args):
+    result = models.Paper.objects.aggregate(
+        earliest=aggregates.Min('last_changed'))
+    earliest = result['earliest'] or timezone.now()
+    base_url = request.build_absolute_uri(reverse('core:oai_pmh'))
+    tokens = ['<Identify>', _element('repositoryName', 'Sciswarm'),
+        _element('baseURL', base_url),
+        _element('protocolVersion', '2.0'),
+        _element('adminEmail', settings.SYSTEM_EMAIL_ADMIN),
+        _element('earliestDatestamp', _format_datestamp(earliest)),
+        _element('deletedRecord', 'transient'),
+        _element('granularity', 'YYYY-MM-DDThh:mm:ssZ'),
+        _element('compression', 'gzip'), '</Identify>\n']
+    return _xml_response(request, args, ''.join(tokens))
+
+def _list_metadata_formats(request, args):
+    if 'identifier' in args:
+        pk = _parse_identifier(request, args['identifier'])
+        if not models.Paper.objects.filter(pk=pk).exists():
+            raise OaiError('idDoesNotExist',
+                'Unknown identifier: ' + args['identifier'])
+    tokens = ['<ListMetadataFormats><metadataFormat>',
+        _element('metadataPrefix', OAI_DC_PREFIX),
+        _element('schema', 'http://www.openarchives.org/OAI/2.0/oai_dc.xsd'),
+        _element('metadataNamespace',
+            'http://www.openarchives.org/OAI/2.0/oai_dc/'),
+        '</metadataFormat></ListMetadataFormats>\n']
+    return _xml_response(request, args, ''.join(tokens))
+
+def _list_sets(request, args):
+    if 'resumptionToken' in args:
+        raise OaiError('badResumptionToken', 'Invalid resumption token.')
+    tokens = ['<ListSets>']
+    for item in models.ScienceSubfield.objects.all():
+        tokens.append('<set>{0}{1}</set>'.format(
+            _element('setSpec', _set_spec(item.pk)),
+            _element('setName', item.full_name)))
+    tokens.append('</ListSets>\n')
+    return _xml_response(request, args, ''.join(tokens))
+
+def _get_record(request, args):
+    _check_metadata_prefix(args['metadataPrefix'])
+    pk = _parse_identifier(request, args['identifier'])
+    paper = models.Paper.objects.filter(pk=pk).first()
+    if paper is None:
+        raise OaiError('idDoesNotExist',
+            'Unknown identifier: ' + args['identifier'])
+    content = '<GetRecord>{0}</GetRecord>\n'.format(_render_chunk(request,
+        [paper], True))
+    return _xml_response(request, args, content)
+
+def _stream_records(request, args, filters, first, record_iter):
+    with_metadata = (args['verb'] == 'ListRecords')
+    yield _response_start(request, args) + '<{0}>\n'.format(args['verb'])
+    count = 0
+    last = None
+    chunk = [first]
+    more = False
+    for paper in itertools.chain(record_iter, [None]):
+        if paper is None or len(chunk) >= OAI_CHUNK_SIZE:
+            yield _render_chunk(request, chunk, with_metadata)
+            count += len(chunk)
+            last = chunk[-1]
+            chunk = []
+        if paper is None:
+            break
+        if count + len(chunk) >= OAI_PAGE_SIZE:
+            more = True
+            break
+        chunk.append(paper)
+    cursor = filters['cursor']
+    if more:
+        new_filters = dict(filters, cursor=cursor + count,
+            after=(last.last_changed.isoformat(), last.pk))
+        token = _element('resumptionToken', _encode_token(new_filters),
+            cursor=cursor)
+        yield token + '\n'
+    elif 'resumptionToken' in args:
+        # Empty token marks the end of incomplete list
+        yield '<resumptionToken cursor="{0}"/>\n'.format(cursor)
+    yield '</{0}>\n</OAI-PMH>\n'.format(args['verb'])
+
+def _list_records(request, args):
+    filters = _list_filter(args)
+    qs = _record_queryset(filters)
+    # Fetch one extra record to find out whether to send resumption token
+    record_iter = qs[:OAI_PAGE_SIZE + 1].iterator()
+    first = next(record_iter, None)
+    if first is None:
+        raise OaiError('noRecordsMatch', 'No records match the request.')
+    content = _stream_records(request, args, filters, first, record_iter)
+    return StreamingHttpResponse(content, content_type='text/xml')
+
+_verb_map = {
+    'Identify': _identify,
+    'ListMetadataFormats': _list_metadata_formats,
+    'ListSets': _list_sets,
+    'GetRecord': _get_record,
+    'ListIdentifiers': _list_records,
+    'ListRecords': _list_records,
+}
+
+@csrf_exempt
+@gzip_page
+@require_http_methods(['GET', 'HEAD', 'POST'])
+@replica_read
+def oai_pmh(request):
+    args = None
+    try:
+        args = _parse_args(request)
+        return _verb_map[args['verb']](request, args)
+    except OaiError as e:
+        return _error_response(request, args, e)
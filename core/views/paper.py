@@ -14,18 +14,18 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.db import IntegrityError
 from django.db.models import prefetch_related_objects
 from django.db.transaction import atomic
-from django.forms import ValidationError
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
-from django.views.generic import DetailView, FormView
+from django.views.generic import DetailView, FormView, View
 from .base import (BaseCreateView, BaseUpdateView, BaseListView,
     SearchListView, BaseModelFormsetView, BaseDeleteView, BaseUnlinkAliasView)
 from .utils import (fetch_authors, person_navbar, paper_navbar,
@@ -36,9 +36,16 @@ from ..forms.paper import (PaperSearchForm, PaperForm, PaperAliasForm,
 from ..forms.user import (PaperAuthorForm, PersonAliasForm, PersonAliasFormset,
     AuthorshipConfirmationForm)
 from ..models import const
-from ..utils.crossref import crossref_fetch, crossref_import_bridge
+from ..tasks import find_paper_by_doi
+from ..utils.cache import (AnonymousPageCacheMixin, tag_version_string,
+    paper_tag, PAPER_LIST_TAG, CITATIONS_TAG)
 from ..utils.html import NavigationBar
-from ..utils.paper import paper_review_rating_subquery, bibcoupling_subquery
+from ..utils.http import ConditionalGetMixin, row_version
+from ..utils.jobs import enqueue
+from ..utils.paper import (paper_review_rating_subquery, bibcoupling_subquery,
+    paper_version_query)
+from ..utils.routing import ReplicaReadMixin
+from ..utils import suggest
 from ..utils.utils import list_map, logger, remove_duplicates, fold_or
 from .. import models
 
@@ -74,10 +81,17 @@ class BasePaperListView(SearchListView):
         ret['navbar'] = ''
         return ret
 
-class PaperListView(BasePaperListView):
+class PaperListView(ReplicaReadMixin, AnonymousPageCacheMixin,
+    BasePaperListView):
     ordering = ('-date_posted',)
 
-class CitedByPaperListView(BasePaperListView):
+    def get_cache_tags(self):
+        return [PAPER_LIST_TAG]
+
+class CitedByPaperListView(AnonymousPageCacheMixin, BasePaperListView):
+    def get_cache_tags(self):
+        return [paper_tag(self.kwargs['pk']), CITATIONS_TAG]
+
     def get_base_queryset(self):
         table = models.Paper.query_model
         qs = models.Paper.objects.filter_public()
@@ -161,9 +175,13 @@ class RejectedAuthorshipPaperListView(BasePaperListView):
         ret['navbar'] = manage_authorship_navbar(self.request)
         return ret
 
-class SimilarPaperListView(BaseListView):
+class SimilarPaperListView(ReplicaReadMixin, AnonymousPageCacheMixin,
+    BaseListView):
     template_name = 'core/paper/similar_paper_list.html'
 
+    def get_cache_tags(self):
+        return [paper_tag(self.kwargs['pk']), CITATIONS_TAG]
+
     def get_queryset(self):
         qs = models.Paper.objects.filter_public()
         self.paper = get_object_or_404(qs, pk=self.kwargs['pk'])
@@ -185,10 +203,29 @@ class SimilarPaperListView(BaseListView):
         ret['page_title'] = _('Papers Similar to %s') % self.paper.name
         return ret
 
-class PaperDetailView(DetailView):
+class PaperDetailView(ReplicaReadMixin, ConditionalGetMixin,
+    AnonymousPageCacheMixin, DetailView):
     queryset = models.Paper.objects.select_related('posted_by', 'changed_by')
     template_name = 'core/paper/paper_detail.html'
 
+    def get_cache_tags(self):
+        return [paper_tag(self.kwargs['pk']), CITATIONS_TAG]
+
+    def get_version(self):
+        person_id = None
+        if self.request.user.is_authenticated:
+            person_id = self.request.user.person_id
+        query = paper_version_query(self.kwargs['pk'], person_id)
+        row = query.execute().first()
+        if row is None or not row['public']:
+            return None
+        last_changed, values = row_version(row, 'last_changed',
+            'review_changed', 'cite_changed')
+        # Names of linked people have no timestamp in the database but
+        # their changes invalidate the paper cache tag
+        values.append(tag_version_string(self.get_cache_tags()))
+        return last_changed, values
+
     def get_object(self, *args, **kwargs):
         ret = super(PaperDetailView, self).get_object(*args, **kwargs)
         if not ret.public:
@@ -209,6 +246,9 @@ class PaperDetailView(DetailView):
         ret['alias_list'] = obj.paperalias_set.all()
         ret['suplink_list'] = obj.papersupplementallink_set.all()
         ret['field_list'] = obj.fields.all()
+        # Version of template fragments shared by all users
+        ret['cache_version'] = tag_version_string(self.get_cache_tags())
+        ret['fragment_timeout'] = settings.PAGE_CACHE_TIMEOUT
         query = (papertab.bibliography.target == obj)
         cite_count = models.Paper.objects.filter_public().filter(query).count()
         ret['citation_count'] = cite_count
@@ -287,6 +327,7 @@ class CreatePaperView(BaseCreateView):
         self.subforms['author_names'].save()
         biblio = self.subforms['bibliography'].save()
         self.object.bibliography.add(*biblio)
+        suggest.schedule_indexing([self.object.pk])
         return ret
 
     def get_success_url(self):
@@ -336,6 +377,7 @@ class AddPaperAuthorView(BaseCreateView):
         ret = super(AddPaperAuthorView, self).form_valid(form)
         self.parent.changed_by = self.request.user.person
         self.parent.save(update_fields=['last_changed', 'changed_by'])
+        suggest.schedule_indexing([self.parent.pk])
         return ret
 
     def get_success_url(self):
@@ -366,6 +408,7 @@ class DeletePaperAuthorView(BaseDeleteView):
         obj = self.object
         obj.paper.changed_by = self.request.user.person
         obj.paper.save(update_fields=['last_changed', 'changed_by'])
+        suggest.schedule_indexing([obj.paper_id])
 
         # Delete obsolete authorship confirmation events
         if obj.author_alias.target is not None:
@@ -399,6 +442,7 @@ class DeletePaperAuthorNameView(BaseDeleteView):
         super(DeletePaperAuthorNameView, self).perform_delete()
         self.object.paper.changed_by = self.request.user.person
         self.object.paper.save(update_fields=['last_changed', 'changed_by'])
+        suggest.schedule_indexing([self.object.paper_id])
 
     def get_success_url(self):
         return self.object.paper.get_absolute_url()
@@ -663,54 +707,55 @@ class FindSimilarPapersView(FormView):
     form_class = DoiInputForm
     template_name = 'core/paper/find_similar_form.html'
 
-    def _find_paper(self, doi):
-        doi_scheme = const.paper_alias_schemes.DOI
-        table = models.PaperAlias.query_model
-        query = ((table.scheme == doi_scheme) & (table.identifier == doi))
-        qs = models.PaperAlias.objects.filter(query).select_related('target')
-        alias = qs.first()
-        if alias is not None:
-            return alias.target
-        return None
-
     def form_valid(self, form):
         doi = form.cleaned_data['doi']
-        paper = self._find_paper(doi)
+        paper = find_paper_by_doi(doi)
 
         # Paper found and is public => Redirect to the standard page
         if paper is not None and paper.public:
             return redirect('core:similar_paper_list', pk=paper.pk)
 
-        # If the paper is non-public, request data from Crossref anyway
-        try:
-            data = crossref_fetch(doi)
-        except:
-            logger.info('Find similar papers: Crossref query failed. DOI: %s',
-                doi, exc_info=True)
+        # Crossref query and paper import run in background job
+        owner = None
+        if self.request.user.is_authenticated:
+            owner = self.request.user
+        job = enqueue('find_similar_papers', owner=owner, doi=doi)
+        return redirect('core:find_similar_papers_result', token=job.token)
+
+    def get_context_data(self, *args, **kwargs):
+        ret = super(FindSimilarPapersView, self).get_context_data(*args,
+            **kwargs)
+        ret['page_title'] = _('Find Similar Papers')
+        return ret
+
+class FindSimilarPapersResultView(View):
+    def get(self, *args, **kwargs):
+        table = models.Job.query_model
+        query = ((table.task == 'find_similar_papers') &
+            (table.token == self.kwargs['token']))
+        job = get_object_or_404(models.Job.objects.filter(query))
+        page_title = _('Find Similar Papers')
+        if job.status == const.job_statuses.FAILED:
             msg = _('Crossref query failed. Please make sure that the DOI is valid and try again later.')
-            form.add_error('doi', ValidationError(msg, 'remote'))
-            return self.form_invalid(form)
+            context = dict(page_title=page_title, error=msg)
+            return render(self.request, 'core/utils/job_status.html', context)
+        elif job.status != const.job_statuses.DONE:
+            context = dict(page_title=page_title, refresh=3)
+            return render(self.request, 'core/utils/job_status.html', context)
 
-        # Import paper (unless it already exists and is non-public)
-        if paper is None and data['name'] is not None:
-            bridge = crossref_import_bridge()
-            paper_list = bridge.import_papers('', [data], query_crossref=False)
-            # The paper may have been created by another process while we were
-            # waiting for Crossref response
-            if paper_list:
-                paper = paper_list[0]
-            else:
-                paper = self.find_paper(doi)
-            if paper is not None and paper.public:
-                return redirect('core:similar_paper_list', pk=paper.pk)
+        result = job.get_result()
+        if result.get('paper_id') is not None:
+            return redirect('core:similar_paper_list', pk=result['paper_id'])
 
         # Paper cannot be imported, generate one-off result page
+        doi = job.get_arguments()['doi']
         paper_list = []
+        id_list = []
         max_results = 100
-        if data['bibliography']:
+        if result['bibliography']:
             table = models.PaperAlias.query_model
             cond_list = [((table.scheme == s) & (table.identifier == i))
-                for s,i in data['bibliography']]
+                for s,i in result['bibliography']]
             subqs = models.PaperAlias.objects.filter(fold_or(cond_list))
             subqs = subqs.values_list('pk')
             # Limit to 100 best results
@@ -721,7 +766,7 @@ class FindSimilarPapersView(FormView):
                 paper = paper_map[pk]
                 paper.weight = weight
                 paper_list.append(paper)
-        paper_name = data['name'] or doi
+        paper_name = result['name'] or doi
         context = dict()
         context['object_list'] = fetch_authors(paper_list[:max_results])
         context['navbar'] = ''
@@ -734,9 +779,3 @@ class FindSimilarPapersView(FormView):
         context['page_title'] = page_title
         template_name = 'core/paper/similar_paper_list.html'
         return render(self.request, template_name, context)
-
-    def get_context_data(self, *args, **kwargs):
-        ret = super(FindSimilarPapersView, self).get_context_data(*args,
-            **kwargs)
-        ret['page_title'] = _('Find Similar Papers')
-        return ret
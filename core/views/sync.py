@@ -0,0 +1,45 @@
+# This file is part of Sciswarm, a scientific social network
+# Copyright (C) 2018-2019 Martin Doucha
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+from ..utils.routing import replica_read
+from ..utils.sync import change_batch, format_cursor, parse_cursor
+import json
+
+@gzip_page
+@require_safe
+@replica_read
+def change_feed(request):
+    """Incremental replication feed in JSON-lines format.
+
+    Clients pass the last received cursor in "since" argument, "0" on first
+    request. The next cursor value is returned in X-Sync-Cursor header,
+    X-Sync-More header tells whether more changes are immediately available.
+    """
+    try:
+        since = parse_cursor(request.GET.get('since', '0'))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid "since" argument.')
+    cursor, more, record_list = change_batch(request, since)
+    content = ''.join((json.dumps(x, cls=DjangoJSONEncoder) + '\n'
+        for x in record_list))
+    response = HttpResponse(content, content_type='application/x-ndjson')
+    response['X-Sync-Cursor'] = format_cursor(cursor)
+    response['X-Sync-More'] = '1' if more else '0'
+    return response
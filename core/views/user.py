@@ -14,10 +14,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.db import IntegrityError
-from django.db.models import aggregates
 from django.db.transaction import atomic
 from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
@@ -25,56 +25,72 @@ from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import DetailView, FormView
-from .base import BaseCreateView, BaseListView, BaseUnlinkAliasView
+from .base import (BaseCreateView, BaseListView, BaseUnlinkAliasView,
+    SearchListView)
 from .utils import (fetch_authors, person_navbar, manage_authorship_navbar,
-    PageNavigator)
+    PageNavigator, KeysetNavigator)
 from ..models import const
+from ..utils import follow
 from ..utils.html import NavigationBar
-from ..utils.utils import logger, fold_or
-from ..forms.user import (PersonAliasForm, MassAuthorshipConfirmationForm,
+from ..utils.jobs import enqueue
+from ..utils.paper import invalidate_author_pages
+from ..utils.routing import ReplicaReadMixin
+from ..utils.utils import logger
+from ..forms.user import (PersonSearchForm, AuthorNameSearchForm,
+    PersonAliasForm, MassAuthorshipConfirmationForm,
     MassAuthorshipClaimForm, FeedSubscriptionForm,
     PaperManagementDelegationForm)
 from .. import models
-import unicodedata
 
-class PersonFollowerListView(BaseListView):
+class PersonListView(ReplicaReadMixin, SearchListView):
+    queryset = models.Person.objects.filter_active()
+    form_class = PersonSearchForm
+    template_name = 'core/person/person_search.html'
+
+    def get_context_data(self, *args, **kwargs):
+        ret = super(PersonListView, self).get_context_data(*args, **kwargs)
+        ret['page_title'] = _('People')
+        return ret
+
+class BaseFollowListView(BaseListView):
     template_name = 'core/person/person_list.html'
+    # Function returning (person list, next page key), see utils.follow
+    page_function = None
 
     def get_queryset(self):
-        ptab = models.Person.query_model
         qs = models.Person.objects.filter_username(self.kwargs['username'])
         self.person = get_object_or_404(qs.filter_active())
-        query = (ptab.feedsubscription.poster == self.person)
-        order = aggregates.Min(ptab.feedsubscription.pk.f())
-        qs = models.Person.objects.filter_active().filter(query).distinct()
-        return qs.annotate(order=order).order_by('order')
+        return []
+
+    def paginate_queryset(self, queryset, page_size):
+        pagenav = KeysetNavigator(self.request)
+        object_list, pagenav.next_key = self.page_function(self.person.pk,
+            pagenav.key, page_size)
+        return (pagenav, None, object_list, pagenav.has_other_pages())
 
     def get_context_data(self, *args, **kwargs):
-        ret = super(PersonFollowerListView, self).get_context_data(*args,
+        ret = super(BaseFollowListView, self).get_context_data(*args,
             **kwargs)
-        ret['page_title'] = _('Followers of %s') % self.person.full_name
         ret['navbar'] = person_navbar(self.request, self.kwargs['username'],
             self.person)
         return ret
 
-class PersonSubscriptionListView(BaseListView):
-    template_name = 'core/person/person_list.html'
+class PersonFollowerListView(BaseFollowListView):
+    page_function = staticmethod(follow.followers_page)
 
-    def get_queryset(self):
-        ptab = models.Person.query_model
-        qs = models.Person.objects.filter_username(self.kwargs['username'])
-        self.person = get_object_or_404(qs.filter_active())
-        query = (ptab.follower.follower == self.person)
-        order = aggregates.Min(ptab.follower.pk.f())
-        qs = models.Person.objects.filter_active().filter(query).distinct()
-        return qs.annotate(order=order).order_by('order')
+    def get_context_data(self, *args, **kwargs):
+        ret = super(PersonFollowerListView, self).get_context_data(*args,
+            **kwargs)
+        ret['page_title'] = _('Followers of %s') % self.person.full_name
+        return ret
+
+class PersonSubscriptionListView(BaseFollowListView):
+    page_function = staticmethod(follow.following_page)
 
     def get_context_data(self, *args, **kwargs):
         ret = super(PersonSubscriptionListView, self).get_context_data(*args,
             **kwargs)
         ret['page_title'] = _('People Followed by %s') % self.person.full_name
-        ret['navbar'] = person_navbar(self.request, self.kwargs['username'],
-            self.person)
         return ret
 
 class PersonDetailView(DetailView):
@@ -156,6 +172,7 @@ class UnlinkPersonAliasView(BaseUnlinkAliasView):
         # Unlink alias
         super(UnlinkPersonAliasView, self).perform_delete()
         self.object.paperauthorreference_set.update(confirmed=None)
+        invalidate_author_pages(alias_id=self.object.pk)
 
         # Delete obsolete authorship confirmation events
         evtype = const.user_feed_events.AUTHORSHIP_CONFIRMED
@@ -172,6 +189,19 @@ class UnlinkPersonAliasView(BaseUnlinkAliasView):
         kwargs = dict(username=self.request.user.username)
         return reverse('core:person_detail', kwargs=kwargs)
 
+def queue_mass_authorship(request, form, claim):
+    """Save authorship changes in background job"""
+    if not form.selected_papers:
+        return
+    buttons = [x for x,y in form.get_buttons() if x in form.data]
+    data = dict(('select_%d' % x.pk, 'on') for x in form.selected_papers)
+    data[buttons[0]] = '1'
+    enqueue('mass_authorship', owner=request.user, person_id=form.person.pk,
+        paper_ids=[x.pk for x in form.selected_papers], data=data,
+        claim=claim)
+    msg = _('Your changes will be saved in a few moments.')
+    messages.info(request, msg)
+
 @method_decorator(login_required, name='dispatch')
 @method_decorator(atomic(), name='post')
 class MassAuthorshipConfirmationView(FormView):
@@ -201,7 +231,7 @@ class MassAuthorshipConfirmationView(FormView):
         return ret
 
     def form_valid(self, form):
-        form.save()
+        queue_mass_authorship(self.request, form, False)
         return super(MassAuthorshipConfirmationView, self).form_valid(form)
 
     def get_context_data(self, *args, **kwargs):
@@ -225,26 +255,9 @@ class MassAuthorshipClaimView(FormView):
     def get_form_kwargs(self, *args, **kwargs):
         ret = super(MassAuthorshipClaimView, self).get_form_kwargs(*args,
             **kwargs)
-        # Prepare name variants to search for
         person = self.request.user.person
-        last_name = person.last_name.strip()
-        first_name = person.first_name.split()
-        search_names = set()
-        if first_name:
-            first_name = first_name[0]
-            search_names.add(last_name + ' ' + first_name)
-            search_names.add(last_name + ' ' + first_name[:1])
-        else:
-            search_names.add(last_name)
-        tmp = [x.casefold() for x in search_names]
-        search_names.update(tmp)
-        tmp = [unicodedata.normalize('NFKD', x).encode('ascii',
-            'ignore').decode('ascii') for x in search_names]
-        search_names.update((x for x in tmp if x))
-
-        # Search query
         papertab = models.Paper.query_model
-        nametab = papertab.paperauthorname
+        stab = models.AuthorshipSuggestion.query_model
         reftab = models.PaperAuthorReference.query_model
         query = (models.PaperReview.query_model.deleted == False)
         subqs = models.PaperReview.objects.filter_by_author(person)
@@ -254,20 +267,31 @@ class MassAuthorshipClaimView(FormView):
         subqs2 = models.PaperAuthorReference.objects.filter(query)
         subqs2 = subqs2.values_list('paper_id')
 
-        query = (~papertab.pk.belongs(subqs) & ~papertab.pk.belongs(subqs2) &
-            fold_or([nametab.author_name.tsphrase(x) for x in search_names]))
-        qs = models.Paper.objects.filter_public().filter(query).distinct()
-        qs = qs.order_by('pk')
-        pagenav = PageNavigator(self.request, qs, 50)
-        page = pagenav.page
+        # Name search is a fallback for papers missed by suggestions
+        query = ~papertab.pk.belongs(subqs) & ~papertab.pk.belongs(subqs2)
+        qs = models.Paper.objects.filter_public().filter(query)
+        self.search_form = AuthorNameSearchForm(data=self.request.GET or None,
+            queryset=qs)
+        if self.search_form.is_valid() and self.search_form.filter:
+            pagenav = PageNavigator(self.request, self.search_form.queryset,
+                50)
+            self.object_list = pagenav.page.object_list
+        else:
+            # Suggestions are precomputed by utils.suggest but the person
+            # may have claimed or reviewed some of the papers since then
+            query = ((stab.person == person) & (stab.paper.public == True) &
+                ~stab.paper.belongs(subqs) & ~stab.paper.belongs(subqs2))
+            qs = models.AuthorshipSuggestion.objects.filter(query)
+            qs = qs.select_related('paper').order_by('-score', 'paper_id')
+            pagenav = PageNavigator(self.request, qs, 50)
+            self.object_list = [x.paper for x in pagenav.page.object_list]
         self.paginator = pagenav
-        self.object_list = page.object_list
-        ret['paper_list'] = page.object_list
+        ret['paper_list'] = self.object_list
         ret['person'] = self.request.user.person
         return ret
 
     def form_valid(self, form):
-        form.save()
+        queue_mass_authorship(self.request, form, True)
         return super(MassAuthorshipClaimView, self).form_valid(form)
 
     def get_context_data(self, *args, **kwargs):
@@ -278,6 +302,7 @@ class MassAuthorshipClaimView(FormView):
         field_map = dict((p.pk, f) for p,f in ret['form'].paper_fields)
         ret['object_list'] = [(p,a,n,field_map[p.pk]) for p,a,n in paper_list]
         ret['navbar'] = manage_authorship_navbar(self.request)
+        ret['search_form'] = self.search_form
         ret['page_title'] = _('Claim Authorship')
         return ret
 
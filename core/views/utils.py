@@ -80,8 +80,10 @@ def person_navbar(request, username, person):
     links = [
         (_('User profile'), 'core:person_detail', tuple(), kwargs),
         (_('Feed'), 'core:person_event_feed', tuple(), kwargs),
-        (_('Following'), 'core:person_subscription_list', tuple(), kwargs),
-        (_('Followers'), 'core:person_follower_list', tuple(), kwargs),
+        (_('Following (%d)') % person.following_count,
+            'core:person_subscription_list', tuple(), kwargs),
+        (_('Followers (%d)') % person.follower_count,
+            'core:person_follower_list', tuple(), kwargs),
         (_('Posted papers'), 'core:person_posted_paper_list', tuple(), kwargs),
         (_('Authored papers'), 'core:person_authored_paper_list', tuple(),
             kwargs),
@@ -187,3 +189,41 @@ class PageNavigator(object):
             tokens.append(format_html(linktpl, **kwargs))
         tokens.append('</div>')
         return mark_safe(' '.join(tokens))
+
+class KeysetNavigator(object):
+    """Page navigation for lists ordered by a unique integer key. Pages are
+    selected by the last key of the previous page instead of page number."""
+
+    def __init__(self, request, arg_name=None):
+        self.request = request
+        self.arg_name = arg_name or 'after'
+        self.next_key = None
+        self.key = None
+        value = request.GET.get(self.arg_name)
+        if value is not None:
+            try:
+                self.key = int(value)
+            except ValueError:
+                raise Http404()
+
+    def has_other_pages(self):
+        return self.key is not None or self.next_key is not None
+
+    def __str__(self):
+        if not self.has_other_pages():
+            return ''
+        urlargs = self.request.GET.copy()
+        tokens = ['<div class="pagenav">']
+        linktpl = '<a href="?{url}">{title}</a>'
+        if self.key is not None:
+            urlargs.pop(self.arg_name, None)
+            title = pgettext('navigation', 'First')
+            kwargs = dict(url=urlencode(urlargs, True), title=title)
+            tokens.append(format_html(linktpl, **kwargs))
+        if self.next_key is not None:
+            urlargs[self.arg_name] = self.next_key
+            title = pgettext('navigation', 'Next')
+            kwargs = dict(url=urlencode(urlargs, True), title=title)
+            tokens.append(format_html(linktpl, **kwargs))
+        tokens.append('</div>')
+        return mark_safe(' '.join(tokens))
@@ -1,7 +1,10 @@
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
 from django.forms import ValidationError
 from core.models import const
 from core.utils.harvest import ImportBridge
+from core.utils.scheduler import budget_exhausted
+from core.utils.utils import make_chunks
 from core.utils.validators import doi_validator
 from .oai import OaiRepository, format_datestamp
 import datetime
@@ -227,8 +230,18 @@ _category_defs = {
     'econ.TH': (const.science_fields.SOCIAL, 'Theoretical Economics'),
 }
 
+# Precompiled XPath queries for parse_arxiv_meta()
+_xp_id = etree.XPath('a:id', namespaces=_nsmap)
+_xp_title = etree.XPath('a:title', namespaces=_nsmap)
+_xp_abstract = etree.XPath('a:abstract', namespaces=_nsmap)
+_xp_doi = etree.XPath('a:doi', namespaces=_nsmap)
+_xp_categories = etree.XPath('a:categories', namespaces=_nsmap)
+_xp_author = etree.XPath('a:authors/a:author', namespaces=_nsmap)
+_xp_keyname = etree.XPath('a:keyname', namespaces=_nsmap)
+_xp_forenames = etree.XPath('a:forenames', namespaces=_nsmap)
+
 def _optional_node(node, xpath):
-    ret = node.xpath(xpath, namespaces=_nsmap)
+    ret = xpath(node)
     if len(ret) > 1:
         err = 'XPath query returned too many results: {0}'
         raise RuntimeError(err.format(len(ret)))
@@ -237,7 +250,7 @@ def _optional_node(node, xpath):
     return None
 
 def _single_node(node, xpath):
-    ret = node.xpath(xpath, namespaces=_nsmap)
+    ret = xpath(node)
     if len(ret) != 1:
         err = 'XPath query returned unexpected number of results: {0}'
         raise RuntimeError(err.format(len(ret)))
@@ -245,30 +258,28 @@ def _single_node(node, xpath):
 
 def parse_arxiv_meta(record):
     ret = dict()
-    arxiv_id = _single_node(record, 'a:id').text.strip()
+    arxiv_id = _single_node(record, _xp_id).text.strip()
     ret['id'] = arxiv_id
     ret['primary_identifier'] = (const.paper_alias_schemes.ARXIV, arxiv_id)
     ret['identifiers'] = [ret['primary_identifier']]
-    ret['name'] = _single_node(record, 'a:title').text.strip()
-    ret['abstract'] = _single_node(record, 'a:abstract').text.strip()
+    ret['name'] = _single_node(record, _xp_title).text.strip()
+    ret['abstract'] = _single_node(record, _xp_abstract).text.strip()
 
-    nodeset = record.xpath('a:doi', namespaces=_nsmap)
-    for node in nodeset:
+    for node in _xp_doi(record):
         try:
             doi = doi_validator(node.text.strip())
             ret['identifiers'].append((const.paper_alias_schemes.DOI, doi))
         except ValidationError:
             pass
 
-    subfields = []
-    node = _optional_node(record, 'a:categories')
+    node = _optional_node(record, _xp_categories)
     if node is not None:
         ret['categories'] = node.text.strip().split()
 
     author_list = []
-    for node in record.xpath('a:authors/a:author', namespaces=_nsmap):
-        name = _single_node(node, 'a:keyname').text.strip()
-        subnode = _optional_node(node, 'a:forenames')
+    for node in _xp_author(record):
+        name = _single_node(node, _xp_keyname).text.strip()
+        subnode = _optional_node(node, _xp_forenames)
         if subnode is not None:
             tmp = subnode.text.strip()
             if tmp:
@@ -277,6 +288,54 @@ def parse_arxiv_meta(record):
     ret['author_names'] = author_list
     return ret
 
+def _parse_arxiv_chunk(xml_list):
+    return [parse_arxiv_meta(etree.fromstring(x)) for x in xml_list]
+
+def parse_arxiv_records(record_list, pool=None, chunk_size=200):
+    """Convert list of OAI records to list of dicts for ImportBridge.
+
+    Pass concurrent.futures executor in pool argument to parse records
+    in parallel. Records are sent to worker processes as serialized XML
+    because lxml elements cannot be pickled.
+    """
+    xml_list = [etree.tostring(x.metadata) for x in record_list
+        if x.metadata is not None]
+    if pool is None:
+        return _parse_arxiv_chunk(xml_list)
+    ret = []
+    for data in pool.map(_parse_arxiv_chunk, make_chunks(xml_list,
+        chunk_size)):
+        ret.extend(data)
+    return ret
+
+# Parse record from arXiv metadata snapshot in JSON format
+def parse_arxiv_json(data):
+    ret = dict()
+    arxiv_id = data['id'].strip()
+    ret['id'] = arxiv_id
+    ret['primary_identifier'] = (const.paper_alias_schemes.ARXIV, arxiv_id)
+    ret['identifiers'] = [ret['primary_identifier']]
+    ret['name'] = ' '.join(data['title'].split())
+    ret['abstract'] = data['abstract'].strip()
+
+    for doi in (data.get('doi') or '').split():
+        try:
+            doi = doi_validator(doi)
+            ret['identifiers'].append((const.paper_alias_schemes.DOI, doi))
+        except ValidationError:
+            pass
+
+    if data.get('categories'):
+        ret['categories'] = data['categories'].split()
+
+    author_list = []
+    for item in data.get('authors_parsed', []):
+        tokens = [x.strip() for x in item[:2] if x and x.strip()]
+        if tokens:
+            author_list.append(', '.join(tokens))
+    ret['author_names'] = author_list
+    return ret
+
 def harvest():
     repo = OaiRepository('http://export.arxiv.org/oai2')
     bridge = ImportBridge('arxiv', repo.repositoryName, 'arXiv Bot')
@@ -287,11 +346,16 @@ def harvest():
         cursor = repo.parse_datestamp(cursor)
     else:
         cursor = repo.earliestDatestamp
-    while cursor <= datetime.date.today():
-        data = repo.list_records('arXiv', cursor, cursor)
-        paper_list = [parse_arxiv_meta(x.metadata) for x in data
-            if x.metadata is not None]
-        del data
-        bridge.import_papers(format_datestamp(cursor), paper_list,
-            query_crossref=True)
-        cursor += day
+    total = 0
+    # Parsing runs in worker processes, database writes in this process
+    with ProcessPoolExecutor() as pool:
+        # Backfill continues in the next cron run when out of time
+        while cursor <= datetime.date.today() and not budget_exhausted():
+            data = repo.list_records('arXiv', cursor, cursor)
+            paper_list = parse_arxiv_records(data, pool)
+            del data
+            bridge.import_papers(format_datestamp(cursor), paper_list,
+                query_crossref=True)
+            total += len(paper_list)
+            cursor += day
+    return total
@@ -0,0 +1,180 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from core.utils import pgsql
+from core.utils.crossref import crossref_parse_work
+from core.utils.harvest import ImportBridge, harvest_logger
+from core import models
+from .arxiv import parse_arxiv_json, _category_defs
+import gzip
+import json
+import os
+
+__all__ = ['DUMP_FORMATS', 'import_dump']
+
+# Lines parsed by a single worker task
+PARSE_CHUNK_SIZE = 1000
+
+# Indexes which are not used while importing papers
+_deferred_index_columns = [
+    (models.Paper, ['name', 'year_published', 'date_posted', 'last_changed',
+        'contents_theory', 'contents_survey', 'contents_observation',
+        'contents_experiment', 'contents_metaanalysis',
+        'incomplete_metadata']),
+    (models.PaperKeyword, ['keyword']),
+    (models.PaperAuthorName, ['author_name']),
+]
+
+def _crossref_items(data):
+    # Crossref snapshot files contain {"items": [...]} objects
+    if 'items' in data:
+        return data['items']
+    return [data]
+
+def _arxiv_items(data):
+    return [data]
+
+# format: (bridge code, repository name, bot name, item splitter, parser)
+DUMP_FORMATS = {
+    'crossref': ('crossref-dump', 'Crossref', 'Crossref Bot', _crossref_items,
+        crossref_parse_work),
+    'arxiv': ('arxiv-dump', 'arXiv', 'arXiv Bot', _arxiv_items,
+        parse_arxiv_json),
+}
+
+def _parse_chunk(fmt, line_list):
+    """Parse chunk of JSON lines in worker process"""
+    split_items, parse = DUMP_FORMATS[fmt][3:]
+    ret = []
+    errors = 0
+    for line in line_list:
+        if not line.strip():
+            continue
+        try:
+            for item in split_items(json.loads(line)):
+                ret.append(parse(item))
+        except Exception:
+            errors += 1
+    # Papers without title cannot be imported
+    return [x for x in ret if x.get('name')], errors
+
+def _open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def _read_chunks(path, skip_lines):
+    with _open_dump(path) as f:
+        chunk = []
+        for lineno, line in enumerate(f, 1):
+            if lineno <= skip_lines:
+                continue
+            chunk.append(line)
+            if len(chunk) >= PARSE_CHUNK_SIZE:
+                yield lineno, chunk
+                chunk = []
+        if chunk:
+            yield lineno, chunk
+
+def _parse_cursor(cursor, file_list):
+    """Return (index of file to continue with, lines already imported)"""
+    if not cursor or ':' not in cursor:
+        return 0, 0
+    name, lineno = cursor.rsplit(':', 1)
+    names = [os.path.basename(x) for x in file_list]
+    if name not in names:
+        return 0, 0
+    return names.index(name), int(lineno)
+
+def _defer_indexes():
+    ret = []
+    for model, columns in _deferred_index_columns:
+        ret.extend(pgsql.drop_indexes(model, columns))
+    return ret
+
+def import_dump(fmt, file_list, workers=None, batch_size=5000,
+    defer_indexes=False):
+    """Import papers from local JSON-lines dump files.
+
+    Progress is saved to the import cursor after each batch so an interrupted
+    import continues where it stopped when called with the same file list.
+    """
+    code, reponame, botname = DUMP_FORMATS[fmt][:3]
+    bridge = ImportBridge(code, reponame, botname)
+    if fmt == 'arxiv':
+        bridge.map_categories(_category_defs)
+    for path in file_list:
+        if len(os.path.basename(path)) > 100:
+            raise ValueError('File name too long: %s' % path)
+    start_idx, skip_lines = _parse_cursor(bridge.import_cursor(), file_list)
+    index_list = _defer_indexes() if defer_indexes else []
+    if index_list:
+        harvest_logger.info('Dropped %d indexes for bulk import',
+            len(index_list))
+    workers = workers or os.cpu_count() or 1
+    total = 0
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            for idx in range(start_idx, len(file_list)):
+                path = file_list[idx]
+                skip = skip_lines if idx == start_idx else 0
+                total += _import_file(bridge, pool, workers, fmt, path, skip,
+                    batch_size)
+                if idx + 1 < len(file_list):
+                    next_name = os.path.basename(file_list[idx + 1])
+                    bridge.set_import_cursor('%s:%d' % (next_name, 0))
+    finally:
+        if index_list:
+            pgsql.create_indexes(index_list)
+            harvest_logger.info('Rebuilt %d indexes', len(index_list))
+    return total
+
+def _import_file(bridge, pool, workers, fmt, path, skip_lines, batch_size):
+    name = os.path.basename(path)
+    # Limit the number of queued chunks to keep memory usage bounded
+    max_pending = workers * 2
+    pending = deque()
+    batch = []
+    errors = 0
+    total = 0
+    # Last consumed line and last line saved to the import cursor
+    last_line = flushed_line = skip_lines
+
+    def flush(lineno):
+        cursor = '%s:%d' % (name, lineno)
+        if not batch:
+            bridge.set_import_cursor(cursor)
+            return 0
+        bridge.import_papers(cursor, batch)
+        log_msg = 'Imported %(count)d papers from %(file)s, line %(line)d'
+        kwargs = dict(count=len(batch), file=name, line=lineno)
+        harvest_logger.info(log_msg, kwargs)
+        return len(batch)
+
+    for lineno, chunk in _read_chunks(path, skip_lines):
+        pending.append((lineno, pool.submit(_parse_chunk, fmt, chunk)))
+        # Results are consumed in file order so that the cursor is exact
+        while pending and (len(pending) >= max_pending or
+            pending[0][1].done()):
+            last_line, future = pending.popleft()
+            paper_list, err_count = future.result()
+            batch.extend(paper_list)
+            errors += err_count
+            if len(batch) >= batch_size:
+                total += flush(last_line)
+                flushed_line = last_line
+                batch = []
+    while pending:
+        last_line, future = pending.popleft()
+        paper_list, err_count = future.result()
+        batch.extend(paper_list)
+        errors += err_count
+        if len(batch) >= batch_size:
+            total += flush(last_line)
+            flushed_line = last_line
+            batch = []
+    # The main loop may have consumed all results already
+    if last_line != flushed_line:
+        total += flush(last_line)
+    if errors:
+        harvest_logger.warning('%d unparseable records in %s', errors, name)
+    return total
@@ -1,6 +1,7 @@
 from lxml import etree
 import requests
 import datetime
+import functools
 import math
 import re
 import time
@@ -9,8 +10,13 @@ __all__ = ['OaiError', 'OaiRepository', 'format_datestamp']
 
 _nsmap = dict(oai='http://www.openarchives.org/OAI/2.0/')
 
+# Compiling XPath expressions is more expensive than evaluating them
+@functools.lru_cache(maxsize=None)
+def _xpath(query):
+    return etree.XPath(query, namespaces=_nsmap)
+
 def _optional_node(node, xpath):
-    ret = node.xpath(xpath, namespaces=_nsmap)
+    ret = _xpath(xpath)(node)
 
     if len(ret) > 1:
         err = 'XPath query returned too many results: {0}'
@@ -20,7 +26,7 @@ def _optional_node(node, xpath):
     return None
 
 def _single_node(node, xpath):
-    ret = node.xpath(xpath, namespaces=_nsmap)
+    ret = _xpath(xpath)(node)
     if len(ret) != 1:
         err = 'XPath query returned unexpected number of results: {0}'
         raise RuntimeError(err.format(len(ret)))
@@ -80,7 +86,7 @@ class OaiSet(object):
     def __init__(self, xml_node):
         self.code = _single_node(xml_node, 'oai:setSpec').text
         self.name = _single_node(xml_node, 'oai:setName').text
-        nodeset = xml_node.xpath('oai:setDescription/*', namespaces=_nsmap)
+        nodeset = _xpath('oai:setDescription/*')(xml_node)
         self.description = list(nodeset)
 
 class OaiRecord(object):
@@ -93,11 +99,11 @@ class OaiRecord(object):
         else:
             header = _single_node(xml_node, 'oai:header')
             self.metadata = _optional_node(xml_node, 'oai:metadata/*')
-            self.about = list(xml_node.xpath('oai:about/*', namespaces=_nsmap))
+            self.about = list(_xpath('oai:about/*')(xml_node))
         self.id = _single_node(header, 'oai:identifier').text
         node = _single_node(header, 'oai:datestamp')
         self.datestamp = repo.parse_datestamp(node.text)
-        nodeset = header.xpath('oai:setSpec', namespaces=_nsmap)
+        nodeset = _xpath('oai:setSpec')(header)
         self.setSpec = [x.text for x in nodeset]
         self.deleted = (header.attrib.get('status') == 'deleted')
 
@@ -124,12 +130,12 @@ class OaiRepository(object):
         self.earliestDatestamp = self.parse_datestamp(tmp)
 
         self.adminEmails = []
-        for tmp in node.xpath('oai:adminEmail', namespaces=_nsmap):
+        for tmp in _xpath('oai:adminEmail')(node):
             self.adminEmails.append(tmp.text)
         self.compression = []
-        for tmp in node.xpath('oai:compression', namespaces=_nsmap):
+        for tmp in _xpath('oai:compression')(node):
             self.compression.append(tmp.text)
-        nodelist = node.xpath('oai:description/*', namespaces=_nsmap)
+        nodelist = _xpath('oai:description/*')(node)
         self.description = list(nodelist)
 
     def _query(self, verb, args=dict()):
@@ -159,7 +165,7 @@ class OaiRepository(object):
                 return []
             raise
         query = '/oai:OAI-PMH/oai:ListMetadataFormats/oai:metadataFormat'
-        nodeset = xml.xpath(query, namespaces=_nsmap)
+        nodeset = _xpath(query)(xml)
         return [OaiMetadataFormat(x) for x in nodeset]
 
     def list_sets(self):
@@ -173,7 +179,7 @@ class OaiRepository(object):
                     return data
                 raise
             node = _single_node(xml, '/oai:OAI-PMH/oai:ListSets')
-            nodeset = node.xpath('oai:set', namespaces=_nsmap)
+            nodeset = _xpath('oai:set')(node)
             data.extend((OaiSet(x) for x in nodeset))
             token = _optional_node(node, 'oai:resumptionToken')
             if token is None or not token.text:
@@ -203,7 +209,7 @@ class OaiRepository(object):
                     return data
                 raise
             node = _single_node(xml, '/oai:OAI-PMH/oai:ListIdentifiers')
-            nodeset = node.xpath('oai:header', namespaces=_nsmap)
+            nodeset = _xpath('oai:header')(node)
             data.extend((OaiRecord(self, x) for x in nodeset))
             token = _optional_node(node, 'oai:resumptionToken')
             if token is None or not token.text:
@@ -227,7 +233,7 @@ class OaiRepository(object):
                     return data
                 raise
             node = _single_node(xml, '/oai:OAI-PMH/oai:ListRecords')
-            nodeset = node.xpath('oai:record', namespaces=_nsmap)
+            nodeset = _xpath('oai:record')(node)
             data.extend((OaiRecord(self, x) for x in nodeset))
             token = _optional_node(node, 'oai:resumptionToken')
             if token is None or not token.text:
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.models import const
+from core.utils.harvest import ImportBridge, harvest_logger
+from core.utils.scheduler import budget_exhausted
+import json
+import requests
+import time
+
+__all__ = ['SciswarmPeer', 'pull_peer', 'harvest']
+
+_paper_flags = ('contents_theory', 'contents_survey', 'contents_observation',
+    'contents_experiment', 'contents_metaanalysis')
+
+class SciswarmPeer(object):
+    def __init__(self, base_url, timeout=60):
+        self.url = base_url.rstrip('/') + '/sync/changes'
+        self.timeout = timeout
+
+    def fetch_changes(self, since):
+        """Return (next cursor, more flag, list of changed records)"""
+        # requests asks for gzip compression and decodes it transparently
+        response = requests.get(self.url, params=dict(since=since),
+            timeout=self.timeout)
+        response.raise_for_status()
+        record_list = [json.loads(x) for x in response.text.splitlines()
+            if x.strip()]
+        # Opaque string, see core.utils.sync.format_cursor()
+        cursor = response.headers['X-Sync-Cursor']
+        more = response.headers.get('X-Sync-More') == '1'
+        return cursor, more, record_list
+
+def parse_paper_record(record):
+    """Convert paper record to ImportBridge.import_papers() format"""
+    data = record['data']
+    primary_identifier = (const.paper_alias_schemes.URL, record['id'])
+    ret = dict(id=record['id'], primary_identifier=primary_identifier)
+    ret['identifiers'] = [primary_identifier]
+    ret['identifiers'].extend((tuple(x) for x in data['identifiers']))
+    ret['authors'] = [tuple(x) for x in data['authors']]
+    ret['bibliography'] = [tuple(x) for x in data['bibliography']]
+    ret['categories'] = [name for field, name in data['subfields']]
+    for key in ('name', 'abstract', 'year_published', 'cite_as',
+        'author_names', 'keywords') + _paper_flags:
+        ret[key] = data[key]
+    return ret
+
+def pull_peer(code, base_url, max_batches=None):
+    """Apply changes from another Sciswarm server.
+
+    Only paper records are applied. New papers get created, existing papers
+    get new aliases through the usual import machinery. Reviews, feed events
+    and deleted papers are skipped because they refer to local accounts.
+    """
+    peer = SciswarmPeer(base_url)
+    bridge = ImportBridge('sync-' + code, base_url, code + ' Sync Bot')
+    cursor = bridge.import_cursor() or '0'
+    batch_count = 0
+    more = True
+    while more and (max_batches is None or batch_count < max_batches) and \
+        not budget_exhausted():
+        start = time.monotonic()
+        cursor, more, record_list = peer.fetch_changes(cursor)
+        paper_list = [parse_paper_record(x) for x in record_list
+            if x['kind'] == 'paper' and not x['deleted']]
+        subfield_defs = dict(((name, (field, name)) for p in record_list
+            if p['kind'] == 'paper' and not p['deleted']
+            for field, name in p['data']['subfields']))
+        bridge.map_categories(subfield_defs)
+        if paper_list:
+            bridge.import_papers(cursor, paper_list)
+        else:
+            bridge.set_import_cursor(cursor)
+        batch_count += 1
+
+        elapsed = time.monotonic() - start
+        lag = None
+        if record_list:
+            lag = timezone.now() - parse_datetime(record_list[-1]['date'])
+        log_msg = 'Sync %(code)s: %(count)d records (%(papers)d papers) in %(time).2fs, cursor %(cursor)s, lag %(lag)s'
+        kwargs = dict(code=code, count=len(record_list),
+            papers=len(paper_list), time=elapsed, cursor=cursor, lag=lag)
+        harvest_logger.info(log_msg, kwargs)
+    return cursor
+
+def harvest():
+    for code, base_url in getattr(settings, 'SYNC_PEERS', {}).items():
+        pull_peer(code, base_url)
@@ -28,6 +28,7 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 
 from .settings_private import *
 from django.utils.translation import ugettext_lazy as _
+import datetime
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.utils.routing.PrimaryStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -108,7 +110,90 @@ SECURE_SSL_REDIRECT = True
 #SECURE_HSTS_SECONDS = 31536000
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = True
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = 'core.backends.session'
+# Unmodified sessions only refresh expiry, see core.backends.session
+SESSION_SAVE_EVERY_REQUEST = True
+# Extend session expiry at most once per interval
+SESSION_REFRESH_INTERVAL = datetime.timedelta(hours=1)
+# Expiry updates are written in batches of this size or after this
+# many seconds
+SESSION_TOUCH_BATCH_SIZE = 100
+SESSION_TOUCH_FLUSH_INTERVAL = 60
+# Number of sessions and users cached in each server process
+SESSION_LOCAL_CACHE_SIZE = 10000
+USER_LOCAL_CACHE_SIZE = 10000
+# Number of people whose followed poster sets are cached in each process
+FOLLOW_LOCAL_CACHE_SIZE = 10000
+
+AUTHENTICATION_BACKENDS = ['core.backends.auth.CachedModelBackend']
+
+# Read-only views use the 'replica' database alias if it is configured,
+# see core.utils.routing
+DATABASE_ROUTERS = ['core.utils.routing.ReplicaRouter']
+# Clients read from the primary database for this many seconds after
+# a POST request. Pages rendered from the replica are cached at most this long.
+DB_PRIMARY_STICKY_TIME = 10
+
+# Cache backend for login throttling counters. The backend must be shared
+# by all server processes.
+THROTTLE_CACHE = 'default'
+
+# Lifetime of cached anonymous pages and shared template fragments (seconds)
+PAGE_CACHE_TIMEOUT = 600
+
+# Lifetime of cached Crossref responses and failed lookups
+CROSSREF_CACHE_TTL = datetime.timedelta(days=30)
+CROSSREF_NEGATIVE_CACHE_TTL = datetime.timedelta(days=1)
+
+# Periodic tasks (cron.py)
+# Number of tasks running in parallel
+CRON_WORKERS = 4
+# Long tasks stop after this time and continue in the next cron run
+CRON_TIME_BUDGET = datetime.timedelta(minutes=50)
+# Override run intervals of tasks, {task name: timedelta}
+CRON_TASK_INTERVALS = {}
+# How long to keep task run history
+CRON_HISTORY_TTL = datetime.timedelta(days=30)
+# Stale records are deleted in chunks of this size...
+PURGE_CHUNK_SIZE = 1000
+# ...with a pause between chunks (seconds)
+PURGE_CHUNK_DELAY = 0.1
+
+# Background job queue (manage.py run_jobs)
+JOB_WORKER_CONCURRENCY = 2
+JOB_MAX_ATTEMPTS = 5
+# Delay before the first retry, doubled after each failed attempt
+JOB_RETRY_DELAY = datetime.timedelta(seconds=30)
+# Seconds between queue checks when there is nothing to do
+JOB_POLL_INTERVAL = 5
+# Running jobs older than this are assumed to be abandoned by dead workers
+JOB_TIMEOUT = datetime.timedelta(hours=1)
+# How long to keep finished jobs
+JOB_RESULT_TTL = datetime.timedelta(days=7)
+
+# Outgoing e-mail queue (manage.py deliver_mail)
+# Number of e-mails sent over one SMTP connection
+MAIL_BATCH_SIZE = 100
+MAIL_MAX_ATTEMPTS = 5
+# Delay before the first retry, doubled after each failed attempt
+MAIL_RETRY_DELAY = datetime.timedelta(minutes=1)
+# E-mails left in sending state longer than this will be sent again
+MAIL_SEND_TIMEOUT = datetime.timedelta(minutes=15)
+# How long to keep sent and failed e-mails
+MAIL_OUTBOX_TTL = datetime.timedelta(days=7)
+
+# Autocomplete (core.utils.autocomplete)
+# Sources kept in a per-process prefix index, the rest is always looked up
+# in the database. The paper title index needs roughly 200 bytes of memory
+# per public paper.
+AUTOCOMPLETE_MEMORY_SOURCES = ('keywords', 'subfields', 'people', 'papers')
+# Seconds between checks for changed records. Requires a WSGI server
+# which allows background threads.
+AUTOCOMPLETE_REFRESH_INTERVAL = 30
+# Papers are indexed incrementally, full rebuild drops deleted papers
+AUTOCOMPLETE_REBUILD_INTERVAL = datetime.timedelta(hours=1)
+# Number of index entries ranked for a single prefix
+AUTOCOMPLETE_SCAN_LIMIT = 500
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.10/topics/i18n/
@@ -29,12 +29,42 @@ ALLOWED_HOSTS = []
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
 
+# The pooled backend keeps up to pool_size open connections in each server
+# or cron process. Size the pools so that all processes together stay below
+# max_connections of the PostgreSQL server. Leave CONN_MAX_AGE at 0.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql_pool',
         'NAME': '',
         'USER': '',
-        'PASSWORD': ''
+        'PASSWORD': '',
+        'OPTIONS': {
+            'pool_size': 10,
+            'pool_timeout': 10,
+            'pool_max_age': 3600,
+            'pool_check_idle': 30,
+            'pool_stats_interval': 300,
+        },
+    },
+    # Optional streaming replica for read-only views. Tests read replica
+    # queries from the test copy of the default database.
+    #'replica': {
+    #    'ENGINE': 'core.backends.postgresql_pool',
+    #    'NAME': '',
+    #    'HOST': '',
+    #    'USER': '',
+    #    'PASSWORD': '',
+    #    'TEST': {'MIRROR': 'default'},
+    #},
+}
+
+# Page cache invalidation, login throttling and local session/user caches
+# rely on a cache shared by all server processes. Local memory cache is only
+# suitable for single-process deployments.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/sciswarm_cache',
     }
 }
 
@@ -82,8 +112,14 @@ SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 EMAIL_TIMEOUT = 10
 SYSTEM_EMAIL_FROM = 'no-reply@example.com'
 SYSTEM_EMAIL_ADMIN = 'admin@example.com'
+# Public address of this server for links in e-mails sent outside requests
+SITE_URL = 'https://example.com'
 ADMINS = [('Example', 'admin@example.com')]
+# Add 'harvest.sciswarm' to pull papers from SYNC_PEERS during cron runs
 HARVEST_SCRIPTS = ['harvest.arxiv']
+# Other Sciswarm servers to replicate papers from, {code: base URL}
+# e.g. {'example': 'https://sciswarm.example.com'}
+SYNC_PEERS = {}
 USER_COUNT_LIMIT = None
 
 LANGUAGE_CODE = 'en'